@@ -0,0 +1,163 @@
+"""An utility to run the scaling benchmarks of the labeling pipeline."""
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from typing import Iterator, List, Optional, Tuple
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.benchmarks.diff_agreement import (
+    compare_diff_engines,
+    format_agreement,
+)
+from sql_ast_dataset.benchmarks.import_benchmark import (
+    format_import_report,
+    run_import_benchmarks,
+)
+from sql_ast_dataset.benchmarks.pipeline_benchmark import (
+    format_report,
+    run_benchmarks,
+)
+from sql_ast_dataset.benchmarks.query_generator import generate_pairs
+from sql_ast_dataset.dataset.dataset_io import infer_input_format, read_records
+
+enabled_kinds: List[str] = [
+    "joins",
+    "subqueries",
+    "case",
+    "in_list",
+    "mixed",
+]
+default_sizes: List[int] = [1, 2, 4, 8, 16, 32]
+
+
+def perform_benchmarks(
+    kinds: List[str],
+    sizes: List[int],
+    repeat: int = 3,
+    config: Optional[dict] = None,
+    json_path: Optional[str] = None,
+):
+    """Performs the benchmarks and prints the report.
+
+    Args:
+        kinds: The kinds of query pairs.
+        sizes: The sizes of the query pairs.
+        repeat: The number of timed repetitions per pair.
+        config: The QueryProcessor configuration.
+        json_path: If set, the measurements are also written as JSON.
+    """
+    processor = Factory().build("QueryProcessor", config_dict=config or {})
+    if processor is None:
+        sys.exit(-1)
+    results = run_benchmarks(
+        processor=processor, kinds=kinds, sizes=sizes, repeat=repeat
+    )
+    print(format_report(results))
+    if json_path is not None:
+        with open(json_path, "w", encoding="utf-8") as stream:
+            json.dump([asdict(result) for result in results], stream, indent=2)
+
+
+def corpus_items(
+    corpus: Optional[str], kinds: List[str], sizes: List[int]
+) -> Iterator[Tuple[str, str, int]]:
+    """Yields the query pairs of a JSONL/CSV corpus or the generated pairs.
+
+    Args:
+        corpus: The corpus file with query, gold_query and label fields.
+        kinds: The kinds of generated query pairs, if no corpus is given.
+        sizes: The sizes of generated query pairs, if no corpus is given.
+
+    Returns:
+        An iterator over (sql_query_1, sql_query_2, label).
+    """
+    if corpus is None:
+        for kind in kinds:
+            for pair in generate_pairs(kind=kind, sizes=sizes):
+                yield pair.query, pair.gold_query, pair.label
+        return
+    input_format = infer_input_format(corpus) or "jsonl"
+    for record in read_records(corpus, input_format):
+        yield str(record["query"]), str(record["gold_query"]), int(record["label"])
+
+
+def perform_agreement(
+    engine: str,
+    items: Iterator[Tuple[str, str, int]],
+    config: Optional[dict] = None,
+    json_path: Optional[str] = None,
+):
+    """Compares the labels of a diff engine with the sqlglot engine.
+
+    Args:
+        engine: The diff_engine to evaluate.
+        items: The query pairs.
+        config: The other settings of the QueryProcessor.
+        json_path: If set, the report is also written as JSON.
+    """
+    report = compare_diff_engines(items=items, engine=engine, config=config)
+    print(format_agreement(report))
+    if json_path is not None:
+        with open(json_path, "w", encoding="utf-8") as stream:
+            json.dump(asdict(report), stream, indent=2)
+
+
+def perform_import_benchmarks(repeat: int = 5, json_path: Optional[str] = None):
+    """Measures the start-up times and prints the report.
+
+    Args:
+        repeat: The number of fresh interpreters per statement.
+        json_path: If set, the measurements are also written as JSON.
+    """
+    results = run_import_benchmarks(repeat=repeat)
+    print(format_import_report(results))
+    if json_path is not None:
+        with open(json_path, "w", encoding="utf-8") as stream:
+            json.dump([asdict(result) for result in results], stream, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kinds", nargs="+", default=enabled_kinds)
+    parser.add_argument("--sizes", nargs="+", type=int, default=default_sizes)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--config", default="{}", help="The QueryProcessor configuration as JSON."
+    )
+    parser.add_argument("--json", default=None, help="Write the results as JSON.")
+    parser.add_argument(
+        "--agreement",
+        default=None,
+        help="Compare the labels of this diff_engine with sqlglot instead.",
+    )
+    parser.add_argument(
+        "--corpus",
+        default=None,
+        help="The JSONL/CSV query pairs of --agreement, generated by default.",
+    )
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="Measure the start-up times of the imports instead.",
+    )
+    args = parser.parse_args()
+    if args.import_time:
+        perform_import_benchmarks(repeat=args.repeat, json_path=args.json)
+        sys.exit(0)
+    if args.agreement is not None:
+        perform_agreement(
+            engine=args.agreement,
+            items=corpus_items(args.corpus, kinds=args.kinds, sizes=args.sizes),
+            config=json.loads(args.config),
+            json_path=args.json,
+        )
+        sys.exit(0)
+    perform_benchmarks(
+        kinds=args.kinds,
+        sizes=args.sizes,
+        repeat=args.repeat,
+        config=json.loads(args.config),
+        json_path=args.json,
+    )
@@ -0,0 +1,7 @@
+"""Runs the command line interface, see sql_ast_dataset.dataset.cli."""
+
+import sys
+
+from sql_ast_dataset.dataset.cli import main
+
+sys.exit(main())
@@ -1,10 +1,12 @@
 """Datacalasses and types for the AST diff."""
 
-from dataclasses import dataclass
-from typing import Any, List, Optional
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from sqlglot import Expression
 
+from sql_ast_dataset.ast_processing.char_spans import CharSpans
+
 
 @dataclass
 class QueryASTWord:
@@ -15,7 +17,71 @@ class QueryASTWord:
     expr_depth: int = 0
     expr: Optional[Expression] = None
     edit: Optional[Any] = None
-    char_index_list: Optional[List[int]] = None  # Indices based on the processed_query
+    char_index_list: Optional[CharSpans] = None  # Indices based on the processed_query
+
+    def __post_init__(self):
+        # Lists are accepted and stored compactly
+        if self.char_index_list is not None and not isinstance(
+            self.char_index_list, CharSpans
+        ):
+            self.char_index_list = CharSpans(
+                sorted(set(self.char_index_list))  # type: ignore[arg-type]
+            )
+
+
+class SlimQueryASTWord:
+    """A QueryASTWord without references to the expression and the edit.
+
+    Uses __slots__, so a result keeps neither the sqlglot trees nor the
+    diff alive and needs less memory per node. expr and edit are always
+    None.
+    """
+
+    __slots__ = ("expr_name", "label", "expr_depth", "char_index_list")
+
+    def __init__(
+        self,
+        expr_name: str,
+        label: int,
+        expr_depth: int = 0,
+        char_index_list: Optional[CharSpans] = None,
+    ):
+        """Initializes the record, see QueryASTWord."""
+        self.expr_name = expr_name
+        self.label = label
+        self.expr_depth = expr_depth
+        if char_index_list is not None and not isinstance(char_index_list, CharSpans):
+            char_index_list = CharSpans(sorted(set(char_index_list)))
+        self.char_index_list = char_index_list
+
+    @property
+    def expr(self) -> Optional[Expression]:
+        return None
+
+    @property
+    def edit(self) -> Optional[Any]:
+        return None
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SlimQueryASTWord):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+AnyQueryASTWord = Union[QueryASTWord, SlimQueryASTWord]
 
 
 @dataclass
@@ -26,15 +92,58 @@ class ASTDiffInput:
     query: str
     label: int
     processed_query: str = ""
-    query_subwords: Optional[List[QueryASTWord]] = None
+    query_subwords: Optional[List[AnyQueryASTWord]] = None
     query_ast_diff_subwords: Optional[str] = None
     metadata: Optional[Any] = None
+    # Index into query_subwords per char, set by the NumPy char map
+    char_subword_map: Optional[Any] = None
+
+    def slim(self) -> "ASTDiffInput":
+        """Returns the pair with SlimQueryASTWord query subwords.
+
+        The copy references neither the sqlglot trees nor the edits, so
+        it is cheap to pickle, also for very deep queries.
+        """
+        if self.query_subwords is None or all(
+            isinstance(qs, SlimQueryASTWord) for qs in self.query_subwords
+        ):
+            return self
+        return replace(
+            self,
+            query_subwords=[
+                SlimQueryASTWord(
+                    expr_name=qs.expr_name,
+                    label=qs.label,
+                    expr_depth=qs.expr_depth,
+                    char_index_list=qs.char_index_list,
+                )
+                for qs in self.query_subwords
+            ],
+        )
 
     def query_subword_indices_as_list(self) -> List[List[int]]:
-        """Extracts the char indices from the query_subwords."""
+        """Extracts the char indices from the query_subwords.
+
+        The lists are expanded from the compact spans on every call.
+        """
         return (
             [
-                qsi.char_index_list if qsi.char_index_list is not None else []
+                (
+                    qsi.char_index_list.to_list()
+                    if qsi.char_index_list is not None
+                    else []
+                )
+                for qsi in self.query_subwords
+            ]
+            if self.query_subwords is not None
+            else []
+        )
+
+    def query_subword_spans(self) -> List[List[Tuple[int, int]]]:
+        """Extracts the half-open (start, end) char spans from the query_subwords."""
+        return (
+            [
+                (qsi.char_index_list.spans() if qsi.char_index_list is not None else [])
                 for qsi in self.query_subwords
             ]
             if self.query_subwords is not None
@@ -51,3 +160,17 @@ class ASTDiffInput:
         if include_final:
             labels.append(self.label)
         return labels
+
+
+@dataclass
+class ASTDiffFailure:
+    """Class for keeping track of a query pair that could not be processed."""
+
+    index: int  # Position of the pair in the processed batch
+    gold_query: str
+    query: str
+    label: int
+    error_type: str
+    error_message: str
+    # For pairs over a limit of the method, see LimitExceeded.as_dict
+    skip_reason: Optional[Dict[str, Any]] = None
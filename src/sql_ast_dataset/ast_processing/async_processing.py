@@ -0,0 +1,361 @@
+"""An asyncio facade that labels query pairs on a managed worker pool."""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Set
+
+from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+from sql_ast_dataset.ast_processing.batch_processing import (
+    BatchItem,
+    BatchResult,
+    init_worker,
+    process_chunk,
+    process_chunk_in_worker,
+)
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class LatencyTracker:
+    """Keeps the latencies of the latest requests for percentiles."""
+
+    def __init__(self, window: int = 10000):
+        """Initializes an empty tracker.
+
+        Args:
+            window: The number of latest latencies that are kept.
+        """
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        """Records the latency of a request."""
+        self._latencies.append(seconds)
+        self.count += 1
+
+    def percentiles(
+        self, percentiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, float]:
+        """Returns the nearest-rank percentiles of the kept latencies.
+
+        Args:
+            percentiles: The percentiles between 0 and 100.
+
+        Returns:
+            The latency in seconds per percentile, e.g. {"p50": 0.01}, or
+            an empty dict if nothing was recorded.
+        """
+        if not self._latencies:
+            return {}
+        latencies = sorted(self._latencies)
+        return {
+            f"p{p:g}": latencies[
+                min(len(latencies) - 1, max(0, math.ceil(p / 100 * len(latencies)) - 1))
+            ]
+            for p in percentiles
+        }
+
+
+class _Request:
+    """A query pair waiting for its result."""
+
+    __slots__ = ("index", "item", "future", "start")
+
+    def __init__(self, index: int, item: BatchItem, future: "asyncio.Future[Any]"):
+        self.index = index
+        self.item = item
+        self.future = future
+        self.start = time.perf_counter()
+
+
+class AsyncQueryProcessor:
+    """Labels query pairs from asyncio code without blocking the event loop.
+
+    Concurrent requests are collected into micro-batches, which are
+    processed on a process pool. The pool and the batching task are
+    started on the first request and bound to its event loop.
+
+    Backpressure: at most max_pending requests wait for a batch and at
+    most max_in_flight batches are processed at once, further calls of
+    aprocess wait until there is room.
+
+    Cancellation: a cancelled request is dropped if its batch was not
+    dispatched yet, otherwise its result is discarded.
+
+    Example:
+        async with AsyncQueryProcessor(config_dict={}, num_workers=4) as labeler:
+            ast_diff = await labeler.aprocess(sql_query_1, sql_query_2, 0)
+    """
+
+    def __init__(
+        self,
+        method: Optional[BaseMethod] = None,
+        config_dict: Optional[Dict[str, Any]] = None,
+        num_workers: Optional[int] = None,
+        max_batch_size: int = 16,
+        max_batch_delay: float = 0.002,
+        max_pending: int = 1024,
+        max_in_flight: Optional[int] = None,
+        latency_window: int = 10000,
+    ):
+        """Configures the processor, the pool is started lazily.
+
+        Args:
+            method: The configured method, it has to be picklable. If not
+                set, a QueryProcessor is built with config_dict.
+            config_dict: The configuration of the QueryProcessor.
+            num_workers: The number of worker processes. None uses all
+                cores, 0 processes the batches in a single thread of the
+                current process.
+            max_batch_size: The maximal number of pairs per batch.
+            max_batch_delay: The seconds a batch waits for more requests
+                if fewer than max_batch_size are queued.
+            max_pending: The maximal number of queued requests.
+            max_in_flight: The maximal number of batches processed at
+                once. Defaults to twice the number of workers.
+            latency_window: The number of latest latencies kept for the
+                percentiles.
+        """
+        if method is None:
+            method = Factory().build("QueryProcessor", config_dict=config_dict or {})
+            if method is None:
+                raise ValueError(f"Invalid QueryProcessor config {config_dict}.")
+        if max_batch_size < 1:
+            raise ValueError(
+                f"max_batch_size has to be positive, got {max_batch_size}."
+            )
+        self.method = method
+        self.num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight or 2 * max(1, self.num_workers)
+        self.latencies = LatencyTracker(window=latency_window)
+
+        self._executor: Optional[Executor] = None
+        self._queue: Optional["asyncio.Queue[Optional[_Request]]"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batch_task: Optional["asyncio.Task[None]"] = None
+        # The requests taken from the queue but not dispatched yet
+        self._collecting: List[_Request] = []
+        self._batch_error: Optional[BaseException] = None
+        self._in_flight: Set["asyncio.Task[None]"] = set()
+        self._closed = False
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_batched_requests = 0
+        self.num_cancelled = 0
+
+    async def __aenter__(self) -> "AsyncQueryProcessor":
+        self._start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def _start(self) -> None:
+        """Starts the pool and the batching task on the running loop."""
+        if self._closed:
+            raise RuntimeError("The processor is closed.")
+        if self._batch_task is not None:
+            if self._batch_task.done():
+                raise RuntimeError("The batching task stopped.") from self._batch_error
+            return
+        if self.num_workers >= 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                initializer=init_worker,
+                initargs=(self.method,),
+            )
+            # Starts the workers now, so that the first request does not
+            # wait for them and forked workers do not inherit the file
+            # descriptors opened later, e.g. the connections of a server
+            self._executor.submit(int)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._batch_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def aprocess(
+        self, sql_query_1: str, sql_query_2: str, label: int
+    ) -> BatchResult:
+        """Processes a query pair on the pool.
+
+        Args:
+            sql_query_1: The original/wrong query.
+            sql_query_2: The ideal/gold query.
+            label: The label if the query is correct.
+
+        Returns:
+            The ASTDiffInput, or an ASTDiffFailure if the pair could not
+            be processed, like process_batch. Results of pool workers are
+            slim, see ASTDiffInput.slim.
+        """
+        self._start()
+        assert self._queue is not None
+        request = _Request(
+            index=self.num_requests,
+            item=(sql_query_1, sql_query_2, label),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self.num_requests += 1
+        try:
+            # Waits while max_pending requests are queued
+            await self._queue.put(request)
+            if self._batch_error is not None:
+                # The batching task stopped while this request waited
+                self._fail_pending()
+            return await request.future
+        except asyncio.CancelledError:
+            request.future.cancel()
+            self.num_cancelled += 1
+            raise
+
+    async def aprocess_many(self, items: Iterable[BatchItem]) -> List[BatchResult]:
+        """Processes many query pairs, they are batched with other requests.
+
+        Args:
+            items: An iterable over (sql_query_1, sql_query_2, label).
+
+        Returns:
+            An ASTDiffInput or ASTDiffFailure per item, in input order.
+        """
+        return list(
+            await asyncio.gather(
+                *(self.aprocess(*item) for item in items)  # type: ignore[misc]
+            )
+        )
+
+    async def _batch_loop(self) -> None:
+        """Runs the batching, pending requests fail if it stops unexpectedly."""
+        try:
+            await self._collect_batches()
+        except BaseException as ex:
+            self._batch_error = ex
+            self._fail_pending()
+            raise
+
+    def _fail_pending(self) -> None:
+        """Resolves the queued requests with the error of the batching task."""
+        assert self._queue is not None and self._batch_error is not None
+        pending = self._collecting
+        self._collecting = []
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+            if request is not None:
+                pending.append(request)
+        for request in pending:
+            if request.future.done():
+                continue
+            if isinstance(self._batch_error, asyncio.CancelledError):
+                request.future.cancel()
+            else:
+                request.future.set_exception(self._batch_error)
+
+    async def _collect_batches(self) -> None:
+        """Collects the queued requests into batches and dispatches them."""
+        assert self._queue is not None and self._slots is not None
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            request = await self._queue.get()
+            if request is None:
+                break
+            batch = self._collecting = [request]
+            if (
+                self.max_batch_delay > 0
+                and self._queue.qsize() < self.max_batch_size - 1
+            ):
+                # Gives concurrent callers the chance to join the batch
+                await asyncio.sleep(self.max_batch_delay)
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                request = self._queue.get_nowait()
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+
+            batch = [r for r in batch if not r.future.cancelled()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            self._collecting = []
+            task = loop.create_task(self._run_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, batch: List[_Request]) -> None:
+        """Processes a batch in the executor and resolves its requests."""
+        assert self._slots is not None
+        loop = asyncio.get_running_loop()
+        chunk = [(request.index, request.item) for request in batch]
+        self.num_batches += 1
+        self.num_batched_requests += len(batch)
+        try:
+            if isinstance(self._executor, ProcessPoolExecutor):
+                results, stats = await loop.run_in_executor(
+                    self._executor, process_chunk_in_worker, chunk
+                )
+                if stats is not None and self.method.stats is not None:
+                    self.method.stats.merge(stats)
+            else:
+                results = await loop.run_in_executor(
+                    self._executor, process_chunk, self.method, chunk
+                )
+        except Exception as ex:  # pylint: disable=broad-except
+            # E.g. a broken pool, every request of the batch fails
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(ex)
+            return
+        finally:
+            self._slots.release()
+
+        now = time.perf_counter()
+        for request, result in zip(batch, results):
+            if not request.future.done():
+                request.future.set_result(result)
+                self.latencies.add(now - request.start)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns the request, batch and latency metrics.
+
+        Returns:
+            A JSON serializable dict.
+        """
+        return {
+            "num_requests": self.num_requests,
+            "num_completed": self.latencies.count,
+            "num_cancelled": self.num_cancelled,
+            "num_batches": self.num_batches,
+            "mean_batch_size": (
+                self.num_batched_requests / self.num_batches
+                if self.num_batches
+                else 0.0
+            ),
+            "num_pending": self._queue.qsize() if self._queue is not None else 0,
+            "num_in_flight_batches": len(self._in_flight),
+            "latency_seconds": self.latencies.percentiles(),
+        }
+
+    async def close(self) -> None:
+        """Processes the queued requests and shuts the pool down."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._batch_task is None:
+            return
+        assert self._queue is not None and self._executor is not None
+        if not self._batch_task.done():
+            await self._queue.put(None)
+        await asyncio.gather(self._batch_task, return_exceptions=True)
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        executor = self._executor
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )
@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure, ASTDiffInput
+from sql_ast_dataset.ast_processing.async_processing import (
+    AsyncQueryProcessor,
+    LatencyTracker,
+)
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentiles(self):
+        tracker = LatencyTracker(window=100)
+        self.assertEqual(tracker.percentiles(), {})
+        for latency in range(1, 101):
+            tracker.add(latency / 1000)
+        self.assertEqual(
+            tracker.percentiles(), {"p50": 0.05, "p90": 0.09, "p99": 0.099}
+        )
+        tracker.add(1.0)
+        self.assertEqual(tracker.count, 101)
+        self.assertEqual(tracker.percentiles((100,)), {"p100": 1.0})
+
+
+class TestAsyncQueryProcessor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.items = [
+            ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+            ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+            # Can not be labeled as correct
+            ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+        ]
+
+    def test_in_thread(self):
+        async def run():
+            async with AsyncQueryProcessor(config_dict={}, num_workers=0) as labeler:
+                result = await labeler.aprocess(*self.items[0])
+                results = await labeler.aprocess_many(self.items * 4)
+                return result, results, labeler.metrics()
+
+        result, results, metrics = asyncio.run(run())
+        self.assertIsInstance(result, ASTDiffInput)
+        self.assertEqual(result.get_labels(), [1, 0, 1, 1, 1, 1])
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[1].get_labels(), [1, 1, 1, 1, 1])
+        self.assertIsInstance(results[2], ASTDiffFailure)
+        self.assertEqual(results[2].error_type, "ValueError")
+        self.assertEqual(metrics["num_requests"], 13)
+        self.assertEqual(metrics["num_completed"], 13)
+        # The concurrent requests are batched together
+        self.assertLess(metrics["num_batches"], 13)
+        self.assertEqual(set(metrics["latency_seconds"]), {"p50", "p90", "p99"})
+
+    def test_process_pool(self):
+        method = Factory().build("QueryProcessor", config_dict={})
+        expected = method.process_batch(self.items, num_workers=0)
+
+        async def run():
+            async with AsyncQueryProcessor(
+                method=method, num_workers=2, max_batch_size=2
+            ) as labeler:
+                return await labeler.aprocess_many(self.items * 3)
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 9)
+        for index, result in enumerate(results):
+            reference = expected[index % len(self.items)]
+            self.assertIs(type(result), type(reference))
+            if isinstance(result, ASTDiffInput):
+                self.assertEqual(result.get_labels(), reference.get_labels())
+
+    def test_deep_query_in_batch(self):
+        # The result of the deep pair is too deep to pickle with its trees
+        where = " AND ".join(f"c{i} = {i}" for i in range(200))
+        deep_pair = (f"SELECT a FROM t WHERE {where}",) * 2 + (1,)
+
+        async def run():
+            async with AsyncQueryProcessor(
+                config_dict={}, num_workers=2, max_batch_size=2, max_batch_delay=1.0
+            ) as labeler:
+                results = await asyncio.gather(
+                    labeler.aprocess(*self.items[0]), labeler.aprocess(*deep_pair)
+                )
+                return results, labeler.num_batches
+
+        (result, deep_result), num_batches = asyncio.run(run())
+        self.assertEqual(num_batches, 1)
+        self.assertEqual(result.get_labels(), [1, 0, 1, 1, 1, 1])
+        self.assertIsInstance(deep_result, ASTDiffInput)
+        self.assertEqual(set(deep_result.get_labels()), {1})
+
+    def test_backpressure_and_cancellation(self):
+        async def run():
+            labeler = AsyncQueryProcessor(
+                config_dict={},
+                num_workers=0,
+                max_batch_size=1,
+                max_pending=1,
+                max_in_flight=1,
+            )
+            tasks = [
+                asyncio.ensure_future(labeler.aprocess(*self.items[0]))
+                for _ in range(5)
+            ]
+            await asyncio.sleep(0)
+            tasks[-1].cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            await labeler.close()
+            return results, labeler.metrics()
+
+        results, metrics = asyncio.run(run())
+        self.assertIsInstance(results[-1], asyncio.CancelledError)
+        self.assertTrue(all(isinstance(r, ASTDiffInput) for r in results[:-1]))
+        self.assertEqual(metrics["num_cancelled"], 1)
+        self.assertEqual(metrics["num_completed"], 4)
+        self.assertEqual(metrics["num_batches"], 4)
+
+    def test_closed(self):
+        async def run():
+            labeler = AsyncQueryProcessor(config_dict={}, num_workers=0)
+            await labeler.close()
+            await labeler.aprocess(*self.items[0])
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(run())
+
+    def test_batch_loop_failure(self):
+        async def run():
+            labeler = AsyncQueryProcessor(config_dict={}, num_workers=0)
+            labeler._start()
+            # The batching task dies before it dispatches a batch
+            labeler._slots.acquire = mock.AsyncMock(side_effect=KeyError("boom"))
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(labeler.aprocess(*item) for item in self.items),
+                    return_exceptions=True,
+                ),
+                timeout=10,
+            )
+            with self.assertRaises(RuntimeError) as context:
+                await labeler.aprocess(*self.items[0])
+            await labeler.close()
+            return results, context.exception
+
+        results, error = asyncio.run(run())
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIsInstance(result, KeyError)
+        self.assertIsInstance(error.__cause__, KeyError)
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            AsyncQueryProcessor(config_dict={"diff_engine": "unknown"})
+
+
+if __name__ == "__main__":
+    unittest.main()
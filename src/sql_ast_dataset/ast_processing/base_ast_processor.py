@@ -1,17 +1,41 @@
 """A base refiner."""
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Iterable, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from sqlglot.diff import Insert, Keep, Move, Remove, Update
 from sqlglot.expressions import Column, Expression, Identifier, Join, Table, TableAlias
 
 from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffInput
+from sql_ast_dataset.ast_processing.batch_processing import (
+    BatchItem,
+    BatchResult,
+    iter_process_batch,
+)
+from sql_ast_dataset.ast_processing.edit_index import EditIndex
+from sql_ast_dataset.ast_processing.instrumentation import CallStats, ProcessingStats
 
 
 class BaseMethod(ABC):
     """A base method to create ASTDiffInputs."""
 
+    # Instrumentation, off unless enable_stats was called
+    stats: Optional[ProcessingStats] = None
+    stats_callback: Optional[Callable[[CallStats], None]] = None
+    # The description of each configuration parameter, see get_parms
+    PARMS: Dict[str, Any] = {}
+
     @abstractmethod
     def set_config(self, config_dict: Dict[str, Any]) -> Tuple[bool, str]:
         """Set the configuration.
@@ -27,13 +51,13 @@ class BaseMethod(ABC):
     def get_name(self) -> str:
         """Get the name of the method."""
 
-    @abstractmethod
     def get_parms(self) -> Dict[str, Any]:
         """Get the configuration parameters for the method.
 
         Return:
             The configuration parameters as a dictionary.
         """
+        return dict(self.PARMS)
 
     @abstractmethod
     def process(
@@ -53,6 +77,135 @@ class BaseMethod(ABC):
             An instance of ASTDiffInput.
         """
 
+    def process_candidates(
+        self,
+        sql_gold_query: str,
+        sql_queries: Sequence[str],
+        labels: Sequence[int],
+    ) -> List[ASTDiffInput]:
+        """Constructs the QuerySubword lists of many queries for one gold query.
+
+        Methods can override this to share the work on the gold query.
+
+        Args:
+            sql_gold_query: The ideal/gold query.
+            sql_queries: The original/wrong queries.
+            labels: For each query the label if it is correct.
+
+        Returns:
+            An instance of ASTDiffInput for each query.
+        """
+        if len(sql_queries) != len(labels):
+            raise ValueError(
+                f"Got {len(sql_queries)} queries but {len(labels)} labels."
+            )
+        return [
+            self.process(
+                sql_query_1=sql_query_1, sql_query_2=sql_gold_query, label=label
+            )
+            for sql_query_1, label in zip(sql_queries, labels)
+        ]
+
+    def iter_process_batch(
+        self,
+        items: Iterable[BatchItem],
+        num_workers: Optional[int] = None,
+        chunk_size: int = 64,
+        max_pending_chunks: Optional[int] = None,
+    ) -> Iterator[BatchResult]:
+        """Processes many query pairs lazily over a process pool.
+
+        Args:
+            items: An iterable over (sql_query_1, sql_query_2, label).
+            num_workers: The number of worker processes. None uses all
+                cores, 0 or 1 processes the items in the current process.
+            chunk_size: The number of pairs sent to a worker at once.
+            max_pending_chunks: The maximal number of chunks in flight.
+
+        Returns:
+            An iterator that yields, in input order, an ASTDiffInput or an
+            ASTDiffFailure if the pair could not be processed. Results of
+            pool workers are slim, see ASTDiffInput.slim.
+        """
+        return iter_process_batch(
+            method=self,
+            items=items,
+            num_workers=num_workers,
+            chunk_size=chunk_size,
+            max_pending_chunks=max_pending_chunks,
+        )
+
+    def process_batch(
+        self,
+        items: Iterable[BatchItem],
+        num_workers: Optional[int] = None,
+        chunk_size: int = 64,
+    ) -> List[BatchResult]:
+        """Processes many query pairs over a process pool.
+
+        Args:
+            items: An iterable over (sql_query_1, sql_query_2, label).
+            num_workers: The number of worker processes. None uses all
+                cores, 0 or 1 processes the items in the current process.
+            chunk_size: The number of pairs sent to a worker at once.
+
+        Returns:
+            A list with, in input order, an ASTDiffInput or an
+            ASTDiffFailure if the pair could not be processed. Results of
+            pool workers are slim, see ASTDiffInput.slim.
+        """
+        return list(
+            self.iter_process_batch(
+                items=items, num_workers=num_workers, chunk_size=chunk_size
+            )
+        )
+
+    def enable_stats(
+        self, callback: Optional[Callable[[CallStats], None]] = None
+    ) -> ProcessingStats:
+        """Starts to record the statistics of every process call.
+
+        The statistics of batches processed over a process pool are
+        merged into the stats of this instance. A callback runs in the
+        process that processes the pair, i.e. in the pool workers for
+        batches.
+
+        Args:
+            callback: If set, called with the CallStats of every call.
+
+        Returns:
+            The (new) aggregated statistics, also available as stats.
+        """
+        self.stats = ProcessingStats()
+        self.stats_callback = callback
+        return self.stats
+
+    def disable_stats(self) -> Optional[ProcessingStats]:
+        """Stops recording statistics.
+
+        Returns:
+            The statistics recorded so far.
+        """
+        stats = self.stats
+        self.stats = None
+        self.stats_callback = None
+        return stats
+
+    def _start_call(self) -> Optional[CallStats]:
+        """Returns the CallStats of a new call, or None if stats are disabled."""
+        if self.stats is None and self.stats_callback is None:
+            return None
+        return CallStats()
+
+    def _finish_call(self, call_stats: Optional[CallStats]) -> None:
+        """Records the CallStats of a finished call."""
+        if call_stats is None:
+            return
+        if self.stats is not None:
+            self.stats.add_call(call_stats)
+        if self.stats_callback is not None:
+            self.stats_callback(call_stats)
+
     def overwrite_hash_of_expression(
         self, expression_itr: Iterable[Expression]
     ) -> None:
@@ -133,44 +286,7 @@ class BaseMethod(ABC):
                 continue
             elif isinstance(edit, Update):
                 if edit.source == expr:
-                    # We check if the column names and table names are the same
-                    if (
-                        (
-                            (
-                                isinstance(edit.source, Column)
-                                and isinstance(edit.target, Column)
-                            )
-                            or (
-                                isinstance(edit.source, Table)
-                                and isinstance(edit.target, Table)
-                            )
-                        )
-                        and isinstance(edit.source.this, Identifier)
-                        and isinstance(edit.target.this, Identifier)
-                    ):
-                        # It is not a perfect check since the tablename of
-                        # the columns could be wrong, but with the aliases
-                        # there is no easy way to check.
-                        if (
-                            edit.source.this.quoted is True
-                            or edit.target.this.quoted is True
-                        ):
-                            # If one of them is quoted we assume case sensitivity.
-                            if edit.source.this.this == edit.target.this.this:
-                                label = 1
-                            else:
-                                label = 0
-                        else:
-                            # If none of them are quoted we assume case insensitivty.
-                            if (
-                                str(edit.source.this.this).lower()
-                                == str(edit.target.this.this).lower()
-                            ):
-                                label = 1
-                            else:
-                                label = 0
-                    else:
-                        label = 0
+                    label = self._get_update_label(edit=edit)
                     ret = edit
                     query_diff[index] = None
                     break
@@ -181,6 +297,74 @@ class BaseMethod(ABC):
                 break
         return label, ret
 
+    def get_indexed_label_and_edit(
+        self, expr: Expression, edit_index: EditIndex
+    ) -> Tuple[int, Optional[Any]]:
+        """Extracts possible label and edit corresponding to expression.
+
+        Gives the same result as get_unchanged_label_and_edit but looks
+        the edit up in an index instead of scanning the whole diff.
+
+        Args:
+            expr: The expression to check which operation is associated
+                in the AST difference.
+            edit_index: The index over the AST difference between two
+                SQL queries.
+
+        Returns:
+            A Tuple with the label as its first entry and optionally the
+            AST difference of expr.
+        """
+        edit = edit_index.pop(expr)
+        if edit is None:
+            return 1, None
+        # label is 0 when the epxpression has been removed
+        if isinstance(edit, Remove):
+            return 0, edit
+        if isinstance(edit, Update):
+            return self._get_update_label(edit=edit), edit
+        return 1, edit
+
+    def _get_update_label(self, edit: Update) -> int:
+        """Labels an expression that got updated.
+
+        Args:
+            edit: The Update edit of the expression.
+
+        Returns:
+            1 if only the case of an unquoted column or table name
+            changed, 0 otherwise.
+        """
+        # We check if the column names and table names are the same
+        if (
+            (
+                (isinstance(edit.source, Column) and isinstance(edit.target, Column))
+                or (isinstance(edit.source, Table) and isinstance(edit.target, Table))
+            )
+            and isinstance(edit.source.this, Identifier)
+            and isinstance(edit.target.this, Identifier)
+        ):
+            # It is not a perfect check since the tablename of
+            # the columns could be wrong, but with the aliases
+            # there is no easy way to check.
+            if edit.source.this.quoted is True or edit.target.this.quoted is True:
+                # If one of them is quoted we assume case sensitivity.
+                if edit.source.this.this == edit.target.this.this:
+                    return 1
+                else:
+                    return 0
+            else:
+                # If none of them are quoted we assume case insensitivty.
+                if (
+                    str(edit.source.this.this).lower()
+                    == str(edit.target.this.this).lower()
+                ):
+                    return 1
+                else:
+                    return 0
+        else:
+            return 0
+
     def get_label_and_edit(
         self, expr: Expression, query_diff: Any
     ) -> Tuple[int, Optional[Any]]:
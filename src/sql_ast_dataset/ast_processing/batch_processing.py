@@ -0,0 +1,197 @@
+"""Batch execution of AST processing methods over a process pool."""
+
+import os
+from collections import deque
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure, ASTDiffInput
+from sql_ast_dataset.ast_processing.instrumentation import ProcessingStats
+from sql_ast_dataset.ast_processing.limits import LimitExceeded
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+
+# (sql_query_1, sql_query_2, label) as passed to BaseMethod.process
+BatchItem = Tuple[str, str, int]
+BatchResult = Union[ASTDiffInput, ASTDiffFailure]
+
+# The configured method of the current pool worker
+_WORKER_METHOD: Optional["BaseMethod"] = None
+
+
+def init_worker(method: "BaseMethod") -> None:
+    """Stores the configured method in the pool worker.
+
+    The initializer of the process pools, see process_chunk_in_worker.
+
+    Args:
+        method: The configured method, pickled once per worker.
+    """
+    global _WORKER_METHOD  # pylint: disable=global-statement
+    _WORKER_METHOD = method
+
+
+def _chunked(
+    items: Iterable[BatchItem], chunk_size: int
+) -> Iterator[List[Tuple[int, BatchItem]]]:
+    """Splits the items into enumerated chunks without materializing them.
+
+    Args:
+        items: The query pairs.
+        chunk_size: The maximal number of pairs per chunk.
+
+    Returns:
+        An iterator over lists of (index, item).
+    """
+    iterator = enumerate(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def process_chunk(
+    method: "BaseMethod", chunk: List[Tuple[int, BatchItem]]
+) -> List[BatchResult]:
+    """Processes a chunk of query pairs and records failures per pair.
+
+    Args:
+        method: The configured method.
+        chunk: A list of (index, (sql_query_1, sql_query_2, label)).
+
+    Returns:
+        For each pair either an ASTDiffInput or an ASTDiffFailure.
+    """
+    results: List[BatchResult] = []
+    for index, (sql_query_1, sql_query_2, label) in chunk:
+        try:
+            results.append(
+                method.process(
+                    sql_query_1=sql_query_1, sql_query_2=sql_query_2, label=label
+                )
+            )
+        except Exception as ex:  # pylint: disable=broad-except
+            results.append(
+                ASTDiffFailure(
+                    index=index,
+                    gold_query=sql_query_2,
+                    query=sql_query_1,
+                    label=label,
+                    error_type=type(ex).__name__,
+                    error_message=str(ex),
+                    skip_reason=(
+                        ex.as_dict() if isinstance(ex, LimitExceeded) else None
+                    ),
+                )
+            )
+    return results
+
+
+def process_chunk_in_worker(
+    chunk: List[Tuple[int, BatchItem]],
+) -> Tuple[List[BatchResult], Optional[ProcessingStats]]:
+    """Processes a chunk with the method of the pool worker.
+
+    Runs in a pool that was started with init_worker as initializer.
+    The results are returned slim, see ASTDiffInput.slim, pickling the
+    sqlglot trees of a deep query could fail the whole chunk.
+
+    Args:
+        chunk: The (input index, item) pairs of the chunk.
+
+    Returns:
+        The results and, if enabled, the statistics of the chunk.
+    """
+    assert _WORKER_METHOD is not None
+    if _WORKER_METHOD.stats is not None:
+        _WORKER_METHOD.stats = ProcessingStats()
+    results = [
+        result.slim() if isinstance(result, ASTDiffInput) else result
+        for result in process_chunk(method=_WORKER_METHOD, chunk=chunk)
+    ]
+    return results, _WORKER_METHOD.stats
+
+
+def _chunk_results(
+    method: "BaseMethod",
+    future: "Future[Tuple[List[BatchResult], Optional[ProcessingStats]]]",
+) -> List[BatchResult]:
+    """Returns the results of a worker and merges its statistics."""
+    results, stats = future.result()
+    if stats is not None and method.stats is not None:
+        method.stats.merge(stats)
+    return results
+
+
+def iter_process_batch(
+    method: "BaseMethod",
+    items: Iterable[BatchItem],
+    num_workers: Optional[int] = None,
+    chunk_size: int = 64,
+    max_pending_chunks: Optional[int] = None,
+) -> Iterator[BatchResult]:
+    """Processes query pairs over a process pool and yields results in order.
+
+    The items are consumed lazily, at most max_pending_chunks chunks are
+    in flight at any time, which keeps the memory bounded for large inputs.
+
+    Args:
+        method: The configured method, it has to be picklable.
+        items: An iterable over (sql_query_1, sql_query_2, label).
+        num_workers: The number of worker processes. None uses all cores,
+            0 or 1 processes the items in the current process.
+        chunk_size: The number of pairs sent to a worker at once.
+        max_pending_chunks: The maximal number of submitted but not yet
+            yielded chunks. Defaults to twice the number of workers.
+
+    Returns:
+        An iterator with an ASTDiffInput or ASTDiffFailure per item. The
+        query subwords of results from worker processes keep no
+        expressions or edits.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size has to be positive, got {chunk_size}.")
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    chunks = _chunked(items=items, chunk_size=chunk_size)
+    if num_workers <= 1:
+        for chunk in chunks:
+            yield from process_chunk(method=method, chunk=chunk)
+        return
+
+    if max_pending_chunks is None:
+        max_pending_chunks = 2 * num_workers
+
+    # Imported here, it loads multiprocessing which sequential runs do not need
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(
+        max_workers=num_workers, initializer=init_worker, initargs=(method,)
+    )
+    pending: Deque["Future[Tuple[List[BatchResult], Optional[ProcessingStats]]]"] = (
+        deque()
+    )
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(process_chunk_in_worker, chunk))
+            if len(pending) >= max_pending_chunks:
+                yield from _chunk_results(method, pending.popleft())
+        while pending:
+            yield from _chunk_results(method, pending.popleft())
+    finally:
+        # Also reached if the consumer stops early
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,84 @@
+import pickle
+import unittest
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure, ASTDiffInput
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class TestBatchProcessing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.items = [
+            ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+            ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+            # Can not be labeled as correct
+            ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+            ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+        ]
+
+    def test_sequential(self):
+        results = self.instance.process_batch(self.items, num_workers=0)
+        self.assertEqual(len(results), len(self.items))
+        self.assertEqual(results[0].get_labels(), [1, 0, 1, 1, 1, 1])
+        self.assertEqual(results[1].get_labels(), [1, 1, 1, 1, 1])
+        self.assertIsInstance(results[2], ASTDiffFailure)
+        self.assertEqual(results[2].index, 2)
+        self.assertEqual(results[2].error_type, "ValueError")
+        self.assertEqual(results[3].get_labels(), [1, 0, 0, 1, 1])
+
+    def test_process_pool(self):
+        expected = self.instance.process_batch(self.items, num_workers=0)
+        results = self.instance.process_batch(
+            iter(self.items * 3), num_workers=2, chunk_size=1
+        )
+        self.assertEqual(len(results), 3 * len(self.items))
+        for index, result in enumerate(results):
+            reference = expected[index % len(self.items)]
+            self.assertIs(type(result), type(reference))
+            if isinstance(result, ASTDiffInput):
+                self.assertEqual(result.get_labels(), reference.get_labels())
+                self.assertEqual(
+                    result.query_subword_indices_as_list(),
+                    reference.query_subword_indices_as_list(),
+                )
+            else:
+                self.assertEqual(result.index, index)
+
+    def test_deep_query(self):
+        # Pickling the sqlglot trees of the pair would exceed the recursion limit
+        where = " AND ".join(f"c{i} = {i}" for i in range(200))
+        deep_pair = (f"SELECT a FROM t WHERE {where}",) * 2 + (1,)
+        results = self.instance.process_batch(
+            [self.items[0], deep_pair], num_workers=2, chunk_size=2
+        )
+        self.assertIsInstance(results[1], ASTDiffInput)
+        self.assertEqual(set(results[1].get_labels()), {1})
+        self.assertIsNone(results[1].query_subwords[0].expr)
+        self.assertEqual(results[0].get_labels(), [1, 0, 1, 1, 1, 1])
+
+    def test_slim(self):
+        result = self.instance.process(*self.items[0])
+        slim = result.slim()
+        self.assertIsNotNone(result.query_subwords[0].expr)
+        self.assertEqual(
+            [(qs.expr_name, qs.expr_depth) for qs in slim.query_subwords],
+            [(qs.expr_name, qs.expr_depth) for qs in result.query_subwords],
+        )
+        self.assertEqual(
+            slim.query_subword_indices_as_list(),
+            result.query_subword_indices_as_list(),
+        )
+        self.assertIs(slim.slim(), slim)
+
+    def test_pickle(self):
+        result = self.instance.process_batch(self.items[:1], num_workers=0)[0]
+        loaded = pickle.loads(pickle.dumps(result))
+        self.assertEqual(loaded.get_labels(), result.get_labels())
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            self.instance.process_batch(self.items, num_workers=0, chunk_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
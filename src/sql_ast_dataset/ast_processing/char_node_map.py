@@ -0,0 +1,171 @@
+"""A per-char map of AST node ordinals backed by a NumPy array."""
+
+import importlib.util
+from typing import Any, Dict, List, Optional, Union
+
+from sqlglot.expressions import Expression
+
+from sql_ast_dataset.ast_processing.char_spans import CharSpans
+
+# NumPy is imported by require_numpy on first use, importing this module
+# stays cheap for the "list" char map
+np: Any = None
+
+
+def numpy_available() -> bool:
+    """Returns if the optional NumPy dependency is installed."""
+    return np is not None or importlib.util.find_spec("numpy") is not None
+
+
+def require_numpy() -> Any:
+    """Returns the NumPy module, importing it on first use.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError as ex:  # pragma: no cover
+            raise ImportError(
+                "NumPy is required for this feature, install sql-ast-dataset[numpy]."
+            ) from ex
+        np = numpy
+    return np
+
+
+class CharNodeMap:
+    """Stores for each char of a query the ordinal of its AST node.
+
+    The ordinal is the position of the node in nodes (usually the DFS
+    order of the AST), -1 marks chars without a node. It can be used in
+    place of the char_list of QueryProcessor, i.e. reading it yields the
+    expressions, but the grouping into per-node char spans is vectorized
+    and the ordinals can be handed to training code as they are.
+    """
+
+    def __init__(self, nodes: List[Expression], length: int):
+        """Initializes the map with no node assigned.
+
+        Args:
+            nodes: The AST nodes that can be assigned, the ordinals index
+                into this list.
+            length: The number of chars.
+        """
+        require_numpy()
+        self.nodes = nodes
+        self.ordinals = np.full(length, -1, dtype=np.int32)
+        self._ordinal_by_id = {id(node): ordinal for ordinal, node in enumerate(nodes)}
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def _node(self, ordinal: int) -> Optional[Expression]:
+        return self.nodes[ordinal] if ordinal >= 0 else None
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[Optional[Expression], List[Optional[Expression]]]:
+        if isinstance(index, slice):
+            return [self._node(ordinal) for ordinal in self.ordinals[index].tolist()]
+        return self._node(int(self.ordinals[index]))
+
+    def assign(self, left: int, right: int, node: Expression) -> None:
+        """Assigns the chars from left to right (exclusive) to the node."""
+        self.ordinals[left:right] = self._ordinal_by_id[id(node)]
+
+    def group(self) -> List[Optional[CharSpans]]:
+        """Groups the char indices by node.
+
+        Like QueryProcessor.map_node_to_char_index_list, expressions that
+        are equal (same type and structure) share their chars.
+
+        Returns:
+            For each node its char indices, or None if it has no chars.
+        """
+        # One representative ordinal for every group of equal expressions
+        representative_by_node: Dict[Expression, int] = {}
+        representatives = np.array(
+            [
+                representative_by_node.setdefault(node, ordinal)
+                for ordinal, node in enumerate(self.nodes)
+            ]
+            + [-1],  # For the unassigned chars
+            dtype=np.int32,
+        )
+        keys = representatives[self.ordinals]
+
+        # Runs of equal keys, ordered by key and then by position
+        boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = np.concatenate(([0], boundaries)).astype(np.int32)
+        ends = np.concatenate((boundaries, [len(keys)])).astype(np.int32)
+        if len(keys) == 0:
+            starts, ends = starts[:0], ends[:0]
+        run_keys = keys[starts]
+        order = np.argsort(run_keys, kind="stable")
+        run_keys = run_keys[order]
+        bounds = np.stack((starts[order], ends[order]), axis=1)
+
+        unique_keys, first_runs = np.unique(run_keys, return_index=True)
+        last_runs = np.append(first_runs[1:], len(run_keys))
+        spans_by_key: Dict[int, CharSpans] = {
+            key: CharSpans.from_bytes(bounds[first:last].tobytes())
+            for key, first, last in zip(
+                unique_keys.tolist(), first_runs.tolist(), last_runs.tolist()
+            )
+            if key >= 0
+        }
+        return [spans_by_key.get(key, None) for key in representatives[:-1].tolist()]
+
+    def subword_map(self, subword_indices: List[int]) -> Any:
+        """Translates the node ordinals of the chars into other indices.
+
+        Args:
+            subword_indices: For each node the new index, plus a last
+                entry for the chars without a node.
+
+        Returns:
+            A NumPy int32 array with the new index of every char.
+        """
+        return np.asarray(subword_indices, dtype=np.int32)[self.ordinals]
+
+
+def char_label_map(ast_diff: Any, fill_value: int = -1) -> Any:
+    """Returns the label of the AST node of every char of the processed query.
+
+    Args:
+        ast_diff: An instance of ASTDiffInput.
+        fill_value: The label of chars that belong to no node.
+
+    Returns:
+        A NumPy int32 array with one label per char.
+    """
+    require_numpy()
+    subword_map = char_subword_map(ast_diff)
+    labels = np.array(ast_diff.get_labels() + [fill_value], dtype=np.int32)
+    return labels[subword_map]
+
+
+def char_subword_map(ast_diff: Any) -> Any:
+    """Returns the index of the query subword of every char of the processed query.
+
+    If the ASTDiffInput was created with the NumPy char map, the stored
+    map is returned. Otherwise it is built from the char indices, where
+    a char shared by equal expressions maps to the last of them.
+
+    Args:
+        ast_diff: An instance of ASTDiffInput.
+
+    Returns:
+        A NumPy int32 array with one query_subwords index per char, -1
+        for chars that belong to no node.
+    """
+    require_numpy()
+    if ast_diff.char_subword_map is not None:
+        return ast_diff.char_subword_map
+    subword_map = np.full(len(ast_diff.processed_query), -1, dtype=np.int32)
+    for index, spans in enumerate(ast_diff.query_subword_spans()):
+        for start, end in spans:
+            subword_map[start:end] = index
+    return subword_map
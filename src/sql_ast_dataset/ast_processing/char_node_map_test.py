@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from sql_ast_dataset.ast_processing.char_node_map import (
+    char_label_map,
+    char_subword_map,
+)
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class TestCharNodeMap(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.numpy_instance = Factory().build(
+            "QueryProcessor", config_dict={"char_map": "numpy"}
+        )
+        self.gold = "SELECT COUNT(*) FROM singer WHERE age > 20"
+        self.queries = [
+            "SELECT * FROM A",
+            "SELECT a, a, a FROM t WHERE a = a",
+            "SELECT E FROM T WHERE E = 1",
+            "/* 1 */ SELECT COUNT(*) FROM ship WHERE lost_in_battle IS NULL",
+            (
+                "SELECT *, NOT COUNT(CASE WHEN SourceAirport IN ('CVO', 'APG') "
+                "THEN 1 ELSE NULL END) IS NULL AS has_CVO_or_APG FROM flights "
+                "WHERE DestAirport = 'CVO' GROUP BY Airline"
+            ),
+            (
+                "SELECT s.Name, s.Song_release_year FROM "
+                "singer AS s, singer_in_concert AS sc "
+                "WHERE s.Singer_ID = sc.Singer_ID "
+                "ORDER BY s.Age ASC LIMIT 1"
+            ),
+        ]
+
+    def test_same_as_list(self):
+        for span_mapping in ("generator", "search"):
+            self.instance.set_config({"span_mapping": span_mapping})
+            self.numpy_instance.set_config(
+                {"span_mapping": span_mapping, "char_map": "numpy"}
+            )
+            for query in self.queries:
+                expected = self.instance.process(query, self.gold, 0)
+                result = self.numpy_instance.process(query, self.gold, 0)
+                self.assertEqual(result.get_labels(), expected.get_labels())
+                self.assertEqual(
+                    result.query_subword_indices_as_list(),
+                    expected.query_subword_indices_as_list(),
+                )
+                self.assertIsNone(expected.char_subword_map)
+                self.assertEqual(
+                    result.char_subword_map.shape, (len(result.processed_query),)
+                )
+
+    def test_char_maps(self):
+        query = "SELECT name, age FROM singer WHERE age > 20"
+        expected = self.instance.process(query, self.gold, 0)
+        result = self.numpy_instance.process(query, self.gold, 0)
+        # "age" is shared by two equal expressions
+        subword_map = char_subword_map(result)
+        self.assertTrue(np.all(subword_map >= 0))
+        for index, indices in enumerate(result.query_subword_indices_as_list()):
+            self.assertTrue(
+                np.all(np.isin(np.flatnonzero(subword_map == index), indices))
+            )
+
+        labels = np.array(result.get_labels())
+        np.testing.assert_array_equal(char_label_map(result), labels[subword_map])
+        # Without the map each shared char goes to the last equal expression
+        self.assertEqual(
+            "".join(map(str, char_label_map(expected).tolist())),
+            "1111111000011111111111111111111111111111111",
+        )
+        self.assertEqual(
+            "".join(map(str, char_label_map(result).tolist())),
+            "1111111000011000111111111111111111111111111",
+        )
+
+    def test_config(self):
+        self.assertIsNone(
+            Factory().build("QueryProcessor", config_dict={"char_map": "array"})
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""A compact representation of sorted char indices."""
+
+from array import array
+from bisect import bisect_right
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple, Union, overload
+
+
+class CharSpans(Sequence[int]):
+    """Sorted, distinct char indices stored as run-length spans.
+
+    The chars of an AST node are mostly contiguous, so the indices are
+    kept as half-open (start, end) runs, packed as 32 bit integers into
+    one immutable bytes object instead of one Python int per char. The
+    class behaves like a read-only list of the indices, e.g. it can be
+    iterated, indexed and compared with a list.
+    """
+
+    __slots__ = ("_bounds",)
+
+    def __init__(self, indices: Iterable[int] = ()):
+        """Initializes the spans.
+
+        Args:
+            indices: Ascending, distinct char indices.
+        """
+        bounds = array("i")
+        for index in indices:
+            if bounds and index == bounds[-1]:
+                bounds[-1] = index + 1
+            elif not bounds or index > bounds[-1]:
+                bounds.append(index)
+                bounds.append(index + 1)
+            else:
+                raise ValueError(f"The index {index} is not ascending.")
+        self._bounds = bounds.tobytes()
+
+    @classmethod
+    def from_spans(cls, spans: Iterable[Tuple[int, int]]) -> "CharSpans":
+        """Creates the instance from ascending (start, end) spans.
+
+        Args:
+            spans: Half-open spans, adjacent spans get merged and empty
+                spans are dropped.
+
+        Returns:
+            An instance of CharSpans.
+        """
+        bounds = array("i")
+        for start, end in spans:
+            if end <= start:
+                continue
+            if bounds and start < bounds[-1]:
+                raise ValueError(f"The span ({start}, {end}) is not ascending.")
+            if bounds and start == bounds[-1]:
+                bounds[-1] = end
+            else:
+                bounds.append(start)
+                bounds.append(end)
+        return cls.from_bytes(bounds.tobytes())
+
+    @classmethod
+    def from_bytes(cls, bounds: bytes) -> "CharSpans":
+        """Creates the instance from packed spans without validating them.
+
+        Args:
+            bounds: Ascending, non-adjacent and non-empty half-open spans
+                as native 32 bit integers (start_0, end_0, start_1, ...),
+                e.g. from array("i") or a NumPy int32 array.
+
+        Returns:
+            An instance of CharSpans.
+        """
+        instance = cls()
+        instance._bounds = bytes(bounds)
+        return instance
+
+    def to_bytes(self) -> bytes:
+        """Returns the packed spans, see from_bytes."""
+        return self._bounds
+
+    def _view(self) -> Sequence[int]:
+        return memoryview(self._bounds).cast("i")
+
+    def spans(self) -> List[Tuple[int, int]]:
+        """Returns the half-open (start, end) spans."""
+        bounds = self._view()
+        return [(bounds[i], bounds[i + 1]) for i in range(0, len(bounds), 2)]
+
+    def to_list(self) -> List[int]:
+        """Returns the indices as a list."""
+        return list(self)
+
+    def __iter__(self) -> Iterator[int]:
+        bounds = self._view()
+        for i in range(0, len(bounds), 2):
+            yield from range(bounds[i], bounds[i + 1])
+
+    def __len__(self) -> int:
+        bounds = self._view()
+        return sum(bounds[i + 1] - bounds[i] for i in range(0, len(bounds), 2))
+
+    def __contains__(self, index: Any) -> bool:
+        if not isinstance(index, int):
+            return False
+        # Odd positions are inside a span
+        return bisect_right(self._view(), index) % 2 == 1
+
+    @overload
+    def __getitem__(self, index: int) -> int:
+        pass
+
+    @overload
+    def __getitem__(self, index: slice) -> List[int]:
+        pass
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, List[int]]:
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("CharSpans index out of range")
+        bounds = self._view()
+        for i in range(0, len(bounds), 2):
+            size = bounds[i + 1] - bounds[i]
+            if index < size:
+                return bounds[i] + index
+            index -= size
+        raise IndexError("CharSpans index out of range")
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CharSpans):
+            return self._bounds == other._bounds
+        if isinstance(other, (list, tuple)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._bounds)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}.from_spans({self.spans()})"
+
+    def __getstate__(self) -> bytes:
+        return self._bounds
+
+    def __setstate__(self, state: bytes) -> None:
+        self._bounds = state
@@ -0,0 +1,54 @@
+import pickle
+import unittest
+
+from sql_ast_dataset.ast_processing.ast_diff_types import QueryASTWord
+from sql_ast_dataset.ast_processing.char_spans import CharSpans
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class TestCharSpans(unittest.TestCase):
+    def test_sequence(self):
+        indices = [0, 1, 2, 5, 7, 8]
+        char_spans = CharSpans(indices)
+        self.assertEqual(char_spans.spans(), [(0, 3), (5, 6), (7, 9)])
+        self.assertEqual(char_spans.to_list(), indices)
+        self.assertEqual(char_spans, indices)
+        self.assertEqual(len(char_spans), len(indices))
+        self.assertEqual([char_spans[i] for i in range(-6, 6)], indices + indices)
+        self.assertEqual(char_spans[1:4], indices[1:4])
+        self.assertIn(5, char_spans)
+        self.assertNotIn(6, char_spans)
+        self.assertNotIn(9, char_spans)
+        with self.assertRaises(IndexError):
+            char_spans[6]
+        with self.assertRaises(ValueError):
+            CharSpans([2, 1])
+
+        self.assertEqual(CharSpans.from_spans([(0, 2), (2, 3)]).spans(), [(0, 3)])
+        self.assertEqual(pickle.loads(pickle.dumps(char_spans)), char_spans)
+
+    def test_query_ast_word(self):
+        word = QueryASTWord(expr_name="a", label=1, char_index_list=[3, 1, 2])
+        self.assertIsInstance(word.char_index_list, CharSpans)
+        self.assertEqual(word.char_index_list, [1, 2, 3])
+
+    def test_processor(self):
+        instance = Factory().build("QueryProcessor", config_dict={})
+        ast_diff = instance.process(
+            "SELECT a, b FROM t WHERE c = 1", "SELECT a FROM t", 0
+        )
+        spans = ast_diff.query_subword_spans()
+        indices = ast_diff.query_subword_indices_as_list()
+        self.assertEqual(
+            [[i for start, end in s for i in range(start, end)] for s in spans],
+            indices,
+        )
+        # Every char belongs to exactly one node
+        self.assertEqual(
+            sorted(i for s in indices for i in s),
+            list(range(len(ast_diff.processed_query))),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+"""Collates processed query pairs into padded NumPy arrays for training.
+
+The per node values of the whole batch are gathered into flat arrays
+once and scattered into the padded arrays, the char spans are read from
+their packed bytes. Batches of similar length are formed by
+bucket_batches, which limits the padding.
+"""
+
+import random
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, List, Optional, Sequence
+
+from sql_ast_dataset.ast_processing.char_node_map import require_numpy
+
+SUPPORTED_MASKS = ("dense", "sparse", "none")
+
+
+@dataclass
+class CollatedBatch:
+    """Class for keeping track of the padded arrays of a batch."""
+
+    # (batch, nodes) int32, the labels of the nodes, pad_label for padding
+    labels: Any
+    # (batch, nodes) int32, the expr_depth of the nodes, 0 for padding
+    depths: Any
+    # (batch, nodes) bool, True for the nodes that are not padding
+    node_mask: Any
+    # (batch,) int32, the number of nodes of each query
+    num_nodes: Any
+    # (batch,) int32, the number of chars of each processed query
+    num_chars: Any
+    # (batch, nodes, chars) bool if the mask is "dense", True if the char
+    # belongs to the node. (entries, 3) int32 (batch, node, char) indices if
+    # the mask is "sparse", None otherwise
+    char_mask: Optional[Any] = None
+
+
+def _round_up(value: int, multiple: Optional[int]) -> int:
+    if not multiple:
+        return value
+    return -(-value // multiple) * multiple
+
+
+def collate(
+    ast_diffs: Sequence[Any],
+    include_final: bool = False,
+    mask: str = "dense",
+    pad_label: int = -1,
+    pad_to_multiple_of: Optional[int] = None,
+) -> CollatedBatch:
+    """Collates a batch of processed query pairs.
+
+    Args:
+        ast_diffs: The instances of ASTDiffInput.
+        include_final: If set, the label of the query is appended as a
+            last node, like get_labels(include_final=True). It has depth 0
+            and no chars.
+        mask: The node x char membership mask, "dense", "sparse" or
+            "none".
+        pad_label: The label of the padding nodes.
+        pad_to_multiple_of: Rounds the padded number of nodes and chars up
+            to a multiple, so fewer distinct shapes are compiled.
+
+    Returns:
+        The padded arrays of the batch.
+    """
+    np = require_numpy()
+    if mask not in SUPPORTED_MASKS:
+        raise ValueError(f"Unsupported mask {mask}, use one of {SUPPORTED_MASKS}.")
+
+    subwords = [ast_diff.query_subwords or [] for ast_diff in ast_diffs]
+    batch_size = len(ast_diffs)
+    extra = 1 if include_final else 0
+    num_nodes = np.array([len(nodes) + extra for nodes in subwords], dtype=np.int32)
+    num_chars = np.array(
+        [len(ast_diff.processed_query) for ast_diff in ast_diffs], dtype=np.int32
+    )
+    max_nodes = _round_up(int(num_nodes.max(initial=0)), pad_to_multiple_of)
+    max_chars = _round_up(int(num_chars.max(initial=0)), pad_to_multiple_of)
+
+    # The batch row and node column of every node
+    total = int(num_nodes.sum())
+    rows = np.repeat(np.arange(batch_size, dtype=np.int32), num_nodes)
+    node_starts = np.cumsum(num_nodes) - num_nodes
+    columns = np.arange(total, dtype=np.int32) - np.repeat(node_starts, num_nodes)
+
+    def gather(attribute: str, final: List[int]) -> Any:
+        values = chain.from_iterable(
+            chain(
+                (getattr(node, attribute) for node in nodes), final[index : index + 1]
+            )
+            for index, nodes in enumerate(subwords)
+        )
+        return np.fromiter(values, dtype=np.int32, count=total)
+
+    final_labels = [ast_diff.label for ast_diff in ast_diffs] if include_final else []
+    labels = np.full((batch_size, max_nodes), pad_label, dtype=np.int32)
+    labels[rows, columns] = gather("label", final_labels)
+    depths = np.zeros((batch_size, max_nodes), dtype=np.int32)
+    depths[rows, columns] = gather("expr_depth", [0] * len(final_labels))
+    node_mask = np.zeros((batch_size, max_nodes), dtype=bool)
+    node_mask[rows, columns] = True
+
+    char_mask = None
+    if mask != "none":
+        # The (start, end) of every char span of the batch in one buffer
+        packed = [
+            node.char_index_list.to_bytes() if node.char_index_list is not None else b""
+            for node in chain.from_iterable(subwords)
+        ]
+        bounds = np.frombuffer(b"".join(packed), dtype=np.int32).reshape(-1, 2)
+        spans_per_node = [len(node_bytes) // 8 for node_bytes in packed]
+        # The final nodes have no chars
+        query_nodes = np.flatnonzero(columns < (num_nodes - extra)[rows])
+        span_nodes = np.repeat(query_nodes, spans_per_node)
+        span_lengths = bounds[:, 1] - bounds[:, 0]
+
+        # Expands the spans into their chars
+        char_nodes = np.repeat(span_nodes, span_lengths)
+        span_offsets = np.cumsum(span_lengths) - span_lengths
+        chars = np.arange(int(span_lengths.sum()), dtype=np.int32) - np.repeat(
+            span_offsets - bounds[:, 0], span_lengths
+        )
+        if mask == "dense":
+            char_mask = np.zeros((batch_size, max_nodes, max_chars), dtype=bool)
+            char_mask[rows[char_nodes], columns[char_nodes], chars] = True
+        else:
+            char_mask = np.stack(
+                (rows[char_nodes], columns[char_nodes], chars), axis=1
+            ).astype(np.int32)
+
+    return CollatedBatch(
+        labels=labels,
+        depths=depths,
+        node_mask=node_mask,
+        num_nodes=num_nodes,
+        num_chars=num_chars,
+        char_mask=char_mask,
+    )
+
+
+def bucket_batches(
+    lengths: Sequence[int],
+    batch_size: int,
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+) -> List[List[int]]:
+    """Groups the indices of examples of similar length into batches.
+
+    The examples are sorted by length and cut into batches, so each batch
+    is only padded up to the length of its longest example.
+
+    Args:
+        lengths: The length of every example, e.g. from node_lengths or
+            the number of tokens.
+        batch_size: The maximal number of examples per batch.
+        shuffle: If set, the examples of equal length and the order of the
+            batches are shuffled.
+        seed: The seed of the shuffle.
+
+    Returns:
+        The example indices of each batch.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size has to be positive, got {batch_size}.")
+    indices = list(range(len(lengths)))
+    rng = random.Random(seed)
+    if shuffle:
+        rng.shuffle(indices)
+    # Stable, the shuffled order is kept within a length
+    indices.sort(key=lambda index: lengths[index])
+    batches = [
+        indices[start : start + batch_size]
+        for start in range(0, len(indices), batch_size)
+    ]
+    if shuffle:
+        rng.shuffle(batches)
+    return batches
+
+
+def node_lengths(ast_diffs: Sequence[Any], include_final: bool = False) -> List[int]:
+    """Returns the number of nodes of every example, see bucket_batches."""
+    extra = 1 if include_final else 0
+    return [len(ast_diff.query_subwords or []) + extra for ast_diff in ast_diffs]
@@ -0,0 +1,94 @@
+import unittest
+
+import numpy as np
+
+from sql_ast_dataset.ast_processing.collation import (
+    bucket_batches,
+    collate,
+    node_lengths,
+)
+from sql_ast_dataset.ast_processing.factory import Factory
+
+PAIRS = [
+    ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+    ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+    ("SELECT name FROM t WHERE age > 20", "SELECT name FROM t WHERE age < 20", 0),
+]
+
+
+class TestCollation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.ast_diffs = [self.instance.process(*pair) for pair in PAIRS]
+
+    def test_collate(self):
+        batch = collate(self.ast_diffs)
+        max_nodes = max(len(d.query_subwords) for d in self.ast_diffs)
+        max_chars = max(len(d.processed_query) for d in self.ast_diffs)
+        self.assertEqual(batch.labels.shape, (3, max_nodes))
+        self.assertEqual(batch.char_mask.shape, (3, max_nodes, max_chars))
+        for row, ast_diff in enumerate(self.ast_diffs):
+            num_nodes = len(ast_diff.query_subwords)
+            self.assertEqual(batch.num_nodes[row], num_nodes)
+            self.assertEqual(batch.num_chars[row], len(ast_diff.processed_query))
+            self.assertEqual(
+                batch.labels[row, :num_nodes].tolist(), ast_diff.get_labels()
+            )
+            self.assertTrue(np.all(batch.labels[row, num_nodes:] == -1))
+            self.assertEqual(
+                batch.depths[row, :num_nodes].tolist(),
+                [node.expr_depth for node in ast_diff.query_subwords],
+            )
+            self.assertEqual(batch.node_mask[row].sum(), num_nodes)
+            for node, indices in enumerate(ast_diff.query_subword_indices_as_list()):
+                self.assertEqual(
+                    np.flatnonzero(batch.char_mask[row, node]).tolist(), indices
+                )
+            self.assertFalse(batch.char_mask[row, num_nodes:].any())
+
+    def test_include_final_and_sparse(self):
+        dense = collate(self.ast_diffs, include_final=True, pad_label=-100)
+        sparse = collate(
+            self.ast_diffs, include_final=True, mask="sparse", pad_to_multiple_of=8
+        )
+        for row, ast_diff in enumerate(self.ast_diffs):
+            labels = ast_diff.get_labels(include_final=True)
+            self.assertEqual(dense.labels[row, : len(labels)].tolist(), labels)
+            self.assertEqual(dense.depths[row, len(labels) - 1], 0)
+            self.assertFalse(dense.char_mask[row, len(labels) - 1].any())
+        self.assertEqual(dense.labels[1, -1], -100)
+
+        self.assertEqual(sparse.labels.shape[1] % 8, 0)
+        self.assertEqual(sparse.char_mask.shape[1], 3)
+        self.assertEqual(
+            sorted(map(tuple, sparse.char_mask.tolist())),
+            sorted(map(tuple, np.argwhere(dense.char_mask).tolist())),
+        )
+        self.assertIsNone(collate(self.ast_diffs, mask="none").char_mask)
+        with self.assertRaises(ValueError):
+            collate(self.ast_diffs, mask="csr")
+
+    def test_empty(self):
+        batch = collate([])
+        self.assertEqual(batch.labels.shape, (0, 0))
+        self.assertEqual(batch.char_mask.shape, (0, 0, 0))
+
+    def test_bucket_batches(self):
+        lengths = [5, 1, 4, 2, 5, 3, 1]
+        batches = bucket_batches(lengths, batch_size=3)
+        self.assertEqual(batches, [[1, 6, 3], [5, 2, 0], [4]])
+        shuffled = bucket_batches(lengths, batch_size=3, shuffle=True, seed=0)
+        self.assertEqual(sorted(sum(shuffled, [])), list(range(7)))
+        for batch in shuffled:
+            batch_lengths = sorted(lengths[index] for index in batch)
+            self.assertIn(batch_lengths, ([1, 1, 2], [3, 4, 5], [5]))
+        self.assertEqual(
+            node_lengths(self.ast_diffs, include_final=True),
+            [len(d.query_subwords) + 1 for d in self.ast_diffs],
+        )
+        with self.assertRaises(ValueError):
+            bucket_batches(lengths, batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,374 @@
+"""The engines that diff candidate trees against a gold tree."""
+
+from collections import Counter, defaultdict
+from heapq import heappop, heappush
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+)
+
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.diff import (
+    IGNORED_LEAF_EXPRESSION_TYPES,
+    UPDATABLE_EXPRESSION_TYPES,
+    Insert,
+    Keep,
+    Remove,
+    Update,
+    _is_same_type,
+    _parent_similarity_score,
+)
+from sqlglot.expressions import Anonymous, Expression, Join
+
+from sql_ast_dataset.ast_processing.gold_change_distiller import GoldChangeDistiller
+from sql_ast_dataset.ast_processing.limits import Deadline
+from sql_ast_dataset.ast_processing.tree_matching import (
+    SubtreeIndex,
+    is_leaf,
+    match_identical_subtrees,
+)
+
+
+class GoldDiffer(Protocol):
+    """Diffs many source trees against the target tree it was built for."""
+
+    def diff_source(
+        self,
+        source: Expression,
+        deadline: Optional[Deadline] = None,
+        prematch_subtrees: bool = False,
+    ) -> List[Any]:
+        """Returns the edit script between the source and the target."""
+
+
+class AnchoredDiffer:
+    """A fast diff for SQL trees that is anchored on identical subtrees.
+
+    The nodes are matched in three passes:
+        1. Top-down, the subtrees that occur exactly once in both trees
+           are kept as a whole, see match_identical_subtrees.
+        2. The remaining leaves are matched like the leaves of
+           ChangeDistiller, by the dice coefficient of their SQL.
+        3. Bottom-up, each remaining inner node is matched to the target
+           node of the same type that holds most partners of its leaves,
+           if enough of the leaves of both nodes are shared.
+
+    Only the leaves left over by the anchoring are compared pairwise and
+    no SQL of inner nodes is generated. The edit script has the Remove,
+    Insert, Update and Keep edits of sqlglot.diff, moves are not detected.
+    """
+
+    def __init__(self, target: Expression, f: float = 0.6, t: float = 0.6):
+        """Precomputes the target side.
+
+        Args:
+            target: The gold expression all sources are compared with.
+            f: The minimum dice coefficient of matched leaves.
+            t: The minimum share of common leaves of matched inner nodes
+                with more than four leaves, 0.4 for smaller ones.
+        """
+        self.f = f
+        self.t = t
+        self._sql_generator = Dialect().generator()
+        self._target = target
+        self._target_subtrees = SubtreeIndex(target)
+        self._target_nodes = [
+            n for n in target.bfs() if not isinstance(n, IGNORED_LEAF_EXPRESSION_TYPES)
+        ]
+        self._target_leaves = [n for n in self._target_nodes if is_leaf(n)]
+        self._target_leaf_counts = self._leaf_counts(target)
+        self._target_bigram_histos: Dict[int, DefaultDict[str, int]] = {}
+        self._target_ancestors: Dict[int, Dict[type, List[Expression]]] = {}
+
+    def diff_source(
+        self,
+        source: Expression,
+        deadline: Optional[Deadline] = None,
+        prematch_subtrees: bool = False,
+    ) -> List[Any]:
+        """Returns the list of changes between the source and the target.
+
+        Args:
+            source: The source expression, it is not copied.
+            deadline: If set, checked once per source node while matching,
+                raises a LimitExceeded when it has passed.
+            prematch_subtrees: Ignored, the identical subtrees are always
+                matched first.
+
+        Returns:
+            The edit script, with the edits of sqlglot.diff but no Move.
+        """
+        source_nodes = [
+            n for n in source.bfs() if not isinstance(n, IGNORED_LEAF_EXPRESSION_TYPES)
+        ]
+        # Maps the id of a source node to its target node
+        matches: Dict[int, Expression] = {}
+        matched_target_ids: Set[int] = set()
+        identical: Set[int] = set()
+
+        source_subtrees = SubtreeIndex(source)
+        for keep in match_identical_subtrees(
+            source=source_subtrees, target=self._target_subtrees
+        ):
+            matches[id(keep.source)] = keep.target
+            matched_target_ids.add(id(keep.target))
+            identical.add(id(keep.source))
+
+        self._match_leaves(
+            source_leaves=[
+                n for n in source_nodes if id(n) not in matches and is_leaf(n)
+            ],
+            source_fingerprints=source_subtrees.fingerprints,
+            matches=matches,
+            matched_target_ids=matched_target_ids,
+            deadline=deadline,
+        )
+        self._match_inner_nodes(
+            source=source,
+            source_nodes=source_nodes,
+            matches=matches,
+            matched_target_ids=matched_target_ids,
+            deadline=deadline,
+        )
+
+        edit_script: List[Any] = [
+            Remove(node) for node in source_nodes if id(node) not in matches
+        ]
+        edit_script.extend(
+            Insert(node)
+            for node in self._target_nodes
+            if id(node) not in matched_target_ids
+        )
+        for node in source_nodes:
+            target_node = matches.get(id(node), None)
+            if target_node is None:
+                continue
+            if (
+                id(node) in identical
+                or not isinstance(node, UPDATABLE_EXPRESSION_TYPES)
+                or node == target_node
+            ):
+                edit_script.append(Keep(node, target_node))
+            else:
+                edit_script.append(Update(node, target_node))
+        return edit_script
+
+    def _match_leaves(
+        self,
+        source_leaves: List[Expression],
+        source_fingerprints: Dict[int, int],
+        matches: Dict[int, Expression],
+        matched_target_ids: Set[int],
+        deadline: Optional[Deadline],
+    ) -> None:
+        """Matches the leaves with the most similar SQL, best pairs first.
+
+        Identical leaves are paired first, only the leaves left over are
+        compared pairwise by the dice coefficient of their SQL.
+        """
+        target_by_fingerprint: DefaultDict[int, List[Expression]] = defaultdict(list)
+        for target_leaf in self._target_leaves:
+            if id(target_leaf) not in matched_target_ids:
+                target_by_fingerprint[
+                    self._target_subtrees.fingerprints[id(target_leaf)]
+                ].append(target_leaf)
+        candidates: List[Tuple[float, float, int, Expression, Expression]] = []
+        for source_leaf in source_leaves:
+            for target_leaf in target_by_fingerprint.get(
+                source_fingerprints[id(source_leaf)], []
+            ):
+                self._push_candidate(candidates, 1.0, source_leaf, target_leaf)
+        self._pick_best_candidates(candidates, matches, matched_target_ids)
+
+        target_leaves = [
+            n for n in self._target_leaves if id(n) not in matched_target_ids
+        ]
+        # The histograms of the source leaves are only needed for this diff
+        source_histos: Dict[int, DefaultDict[str, int]] = {}
+        for source_leaf in source_leaves:
+            if id(source_leaf) in matches:
+                continue
+            if deadline is not None:
+                deadline.check()
+            for target_leaf in target_leaves:
+                if not _is_same_type(source_leaf, target_leaf):
+                    continue
+                score = self._dice_coefficient(
+                    source_leaf, target_leaf, source_histos=source_histos
+                )
+                if score >= self.f:
+                    self._push_candidate(candidates, score, source_leaf, target_leaf)
+        self._pick_best_candidates(candidates, matches, matched_target_ids)
+
+    @staticmethod
+    def _push_candidate(
+        candidates: List[Tuple[float, float, int, Expression, Expression]],
+        score: float,
+        source_leaf: Expression,
+        target_leaf: Expression,
+    ) -> None:
+        """Adds a candidate pair, ordered like in ChangeDistiller."""
+        heappush(
+            candidates,
+            (
+                -score,
+                -_parent_similarity_score(source_leaf, target_leaf),
+                len(candidates),
+                source_leaf,
+                target_leaf,
+            ),
+        )
+
+    @staticmethod
+    def _pick_best_candidates(
+        candidates: List[Tuple[float, float, int, Expression, Expression]],
+        matches: Dict[int, Expression],
+        matched_target_ids: Set[int],
+    ) -> None:
+        """Matches the candidate pairs greedily, the best ones first."""
+        while candidates:
+            _, _, _, source_leaf, target_leaf = heappop(candidates)
+            if (
+                id(source_leaf) not in matches
+                and id(target_leaf) not in matched_target_ids
+            ):
+                matches[id(source_leaf)] = target_leaf
+                matched_target_ids.add(id(target_leaf))
+
+    def _match_inner_nodes(
+        self,
+        source: Expression,
+        source_nodes: List[Expression],
+        matches: Dict[int, Expression],
+        matched_target_ids: Set[int],
+        deadline: Optional[Deadline],
+    ) -> None:
+        """Matches the inner nodes by the partners of their leaves."""
+        source_leaf_counts = self._leaf_counts(source)
+        unmatched = {
+            id(n) for n in source_nodes if id(n) not in matches and not is_leaf(n)
+        }
+        # For each unmatched source node, the votes for its target nodes
+        votes: DefaultDict[int, Counter] = defaultdict(Counter)
+        for source_leaf in source_nodes:
+            target_leaf = matches.get(id(source_leaf), None)
+            if target_leaf is None or not is_leaf(source_leaf):
+                continue
+            target_ancestors = self._ancestors_by_type(target_leaf)
+            for source_ancestor in _ancestors(source_leaf):
+                if id(source_ancestor) not in unmatched:
+                    continue
+                candidates = target_ancestors.get(type(source_ancestor), None)
+                if not candidates:
+                    continue
+                if isinstance(source_ancestor, (Join, Anonymous)):
+                    # The only types where _is_same_type checks more
+                    candidates = [
+                        candidate
+                        for candidate in candidates
+                        if _is_same_type(source_ancestor, candidate)
+                    ]
+                node_votes = votes[id(source_ancestor)]
+                for candidate in candidates:
+                    node_votes[id(candidate)] += 1
+
+        target_by_id = {id(n): n for n in self._target_nodes}
+        # Deepest nodes first, so children are matched before their parents
+        for node in reversed(source_nodes):
+            if id(node) not in unmatched or id(node) not in votes:
+                continue
+            if deadline is not None:
+                deadline.check()
+            for target_id, common in votes[id(node)].most_common():
+                if target_id in matched_target_ids:
+                    continue
+                source_count = source_leaf_counts[id(node)]
+                target_count = self._target_leaf_counts[target_id]
+                threshold = self.t if min(source_count, target_count) > 4 else 0.4
+                if common / max(source_count, target_count) >= threshold:
+                    matches[id(node)] = target_by_id[target_id]
+                    matched_target_ids.add(target_id)
+                # Only the best candidate is considered
+                break
+
+    def _ancestors_by_type(
+        self, target_leaf: Expression
+    ) -> Dict[type, List[Expression]]:
+        """Returns the ancestors of a target leaf grouped by their type."""
+        ancestors = self._target_ancestors.get(id(target_leaf), None)
+        if ancestors is None:
+            ancestors = defaultdict(list)
+            for ancestor in _ancestors(target_leaf):
+                ancestors[type(ancestor)].append(ancestor)
+            self._target_ancestors[id(target_leaf)] = ancestors
+        return ancestors
+
+    @staticmethod
+    def _leaf_counts(root: Expression) -> Dict[int, int]:
+        """Counts the leaves below every node in one bottom-up pass."""
+        counts: Dict[int, int] = {}
+        for node in reversed(list(root.walk())):
+            if isinstance(node, IGNORED_LEAF_EXPRESSION_TYPES):
+                continue
+            if is_leaf(node):
+                counts[id(node)] = 1
+                continue
+            counts[id(node)] = sum(
+                counts.get(id(child), 0) for child in node.iter_expressions()
+            )
+        return counts
+
+    def _bigram_histo(
+        self, expression: Expression, cache: Dict[int, DefaultDict[str, int]]
+    ) -> DefaultDict[str, int]:
+        """Returns the bigram histogram of the SQL of an expression."""
+        histo = cache.get(id(expression), None)
+        if histo is None:
+            expression_str = self._sql_generator.generate(expression)
+            histo = defaultdict(int)
+            for i in range(max(0, len(expression_str) - 1)):
+                histo[expression_str[i : i + 2]] += 1
+            cache[id(expression)] = histo
+        return histo
+
+    def _dice_coefficient(
+        self,
+        source: Expression,
+        target: Expression,
+        source_histos: Dict[int, DefaultDict[str, int]],
+    ) -> float:
+        """Same as ChangeDistiller._dice_coefficient."""
+        source_histo = self._bigram_histo(source, cache=source_histos)
+        target_histo = self._bigram_histo(target, cache=self._target_bigram_histos)
+        total_grams = sum(source_histo.values()) + sum(target_histo.values())
+        if not total_grams:
+            return 1.0 if source == target else 0.0
+        overlap_len = sum(
+            min(count, target_histo[gram])
+            for gram, count in source_histo.items()
+            if gram in target_histo
+        )
+        return 2 * overlap_len / total_grams
+
+
+def _ancestors(node: Expression) -> Iterator[Expression]:
+    """Yields the parent, grandparent, ... of a node."""
+    parent = node.parent
+    while parent is not None:
+        yield parent
+        parent = parent.parent
+
+
+# The name of each engine and how it is built for a gold tree
+DIFF_ENGINES: Dict[str, Callable[[Expression], GoldDiffer]] = {
+    "sqlglot": GoldChangeDistiller,
+    "anchored": AnchoredDiffer,
+}
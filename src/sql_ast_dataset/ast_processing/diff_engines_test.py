@@ -0,0 +1,76 @@
+import unittest
+
+import sqlglot
+from sqlglot.diff import Insert, Keep, Remove, Update
+
+from sql_ast_dataset.ast_processing.diff_engines import DIFF_ENGINES, AnchoredDiffer
+from sql_ast_dataset.ast_processing.factory import Factory
+
+PAIRS = [
+    ("SELECT Name, COUNT(*) FROM singer WHERE age > 20", "SELECT COUNT(*) FROM singer"),
+    ("SELECT a, b FROM c", "SELECT b, a FROM c"),
+    (
+        "SELECT name FROM singer ORDER BY age",
+        "SELECT name FROM singer ORDER BY age DESC",
+    ),
+    (
+        "SELECT T1.name FROM singer AS T1 JOIN concert AS T2 ON T1.id = T2.id",
+        "SELECT T1.name FROM singer AS T1 JOIN concert AS T2 ON T1.id = T2.singer_id",
+    ),
+    (
+        "SELECT name FROM singer WHERE id IN (SELECT id FROM concert WHERE year = 1)",
+        "SELECT name FROM singer WHERE id IN (SELECT id FROM concert WHERE year = 2)",
+    ),
+]
+
+
+class TestDiffEngines(unittest.TestCase):
+    def test_identical(self):
+        source = sqlglot.parse_one(PAIRS[0][0])
+        edits = AnchoredDiffer(sqlglot.parse_one(PAIRS[0][0])).diff_source(source)
+        self.assertTrue(all(isinstance(edit, Keep) for edit in edits))
+        self.assertEqual(len(edits), len(sqlglot.diff(source, source.copy())))
+
+    def test_edits(self):
+        source = sqlglot.parse_one("SELECT a, b FROM t WHERE x = 1")
+        target = sqlglot.parse_one("SELECT a, c FROM t WHERE x = 2")
+        edits = AnchoredDiffer(target).diff_source(source)
+        expected = sqlglot.diff(source, target)
+        for edit_type in (Insert, Keep, Remove, Update):
+            self.assertEqual(
+                sorted(repr(e) for e in edits if isinstance(e, edit_type)),
+                sorted(repr(e) for e in expected if isinstance(e, edit_type)),
+                edit_type,
+            )
+
+    def test_processor_labels(self):
+        factory = Factory()
+        for diff_engine in DIFF_ENGINES:
+            instance = factory.build(
+                "QueryProcessor", config_dict={"diff_engine": diff_engine}
+            )
+            reference = factory.build("QueryProcessor", config_dict={})
+            for query_1, query_2 in PAIRS:
+                expected = reference.process(query_1, query_2, 0)
+                self.assertEqual(
+                    instance.process(query_1, query_2, 0).get_labels(),
+                    expected.get_labels(),
+                    (diff_engine, query_1),
+                )
+            ast_diffs = instance.process_candidates(
+                PAIRS[0][1], [query for query, _ in PAIRS], [0] * len(PAIRS)
+            )
+            for ast_diff, (query_1, _) in zip(ast_diffs, PAIRS):
+                self.assertEqual(
+                    ast_diff.get_labels(),
+                    instance.process(query_1, PAIRS[0][1], 0).get_labels(),
+                )
+
+    def test_invalid_config(self):
+        self.assertIsNone(
+            Factory().build("QueryProcessor", config_dict={"diff_engine": "gumtree"})
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""An index over the edits of an AST difference."""
+
+from collections import defaultdict, deque
+from typing import Any, DefaultDict, Deque, List, Optional, Tuple
+
+from sqlglot.diff import Keep, Remove, Update
+from sqlglot.expressions import Expression
+
+
+class EditIndex:
+    """Looks up the first unused Remove, Update or Keep edit of an expression.
+
+    sqlglot compares expressions by type and (structural) hash. The index
+    groups the positions of the edits by exactly that key, so a lookup is
+    a dict access instead of a scan over the whole diff. Within a group
+    the positions are kept in diff order, which reproduces the
+    first-match-and-consume behavior of
+    BaseMethod.get_unchanged_label_and_edit.
+    """
+
+    def __init__(self, query_diff: List[Any]):
+        """Builds the index.
+
+        Args:
+            query_diff: The AST difference between two SQL queries. Used
+                edits get replaced with None, like in
+                BaseMethod.get_unchanged_label_and_edit.
+        """
+        self.query_diff = query_diff
+        self._positions: DefaultDict[Tuple[type, int], Deque[int]] = defaultdict(deque)
+        for index, edit in enumerate(query_diff):
+            if isinstance(edit, Remove):
+                node = edit.expression
+            elif isinstance(edit, (Update, Keep)):
+                node = edit.source
+            else:
+                # Insert and Move are not relevant for us
+                continue
+            self._positions[self._key(node)].append(index)
+
+    @staticmethod
+    def _key(expr: Expression) -> Tuple[type, int]:
+        """The key under which sqlglot considers expressions equal."""
+        return type(expr), hash(expr)
+
+    def pop(self, expr: Expression) -> Optional[Any]:
+        """Returns and consumes the first unused edit of the expression.
+
+        Args:
+            expr: The expression to look up.
+
+        Returns:
+            The Remove, Update or Keep edit or None.
+        """
+        positions = self._positions.get(self._key(expr), None)
+        while positions:
+            index = positions.popleft()
+            edit = self.query_diff[index]
+            if edit is not None:
+                self.query_diff[index] = None
+                return edit
+        return None
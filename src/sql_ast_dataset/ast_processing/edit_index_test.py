@@ -0,0 +1,56 @@
+import unittest
+
+import sqlglot
+
+from sql_ast_dataset.ast_processing.edit_index import EditIndex
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+class TestEditIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.pairs = [
+            ("SELECT a, b FROM c", "SELECT b, a FROM c"),
+            ("SELECT Name, COUNT(*), Age FROM singer", "SELECT COUNT(*) FROM singer"),
+            ("SELECT a, a, a FROM t WHERE a = a", "SELECT a FROM t WHERE b = a"),
+            ('SELECT "Name" FROM "singer"', "SELECT name FROM Singer"),
+            (
+                "SELECT s.Name, s.Song_release_year FROM "
+                "singer AS s, singer_in_concert AS sc "
+                "WHERE s.Singer_ID = sc.Singer_ID "
+                "ORDER BY s.Age ASC LIMIT 1",
+                "SELECT song_name, song_release_year FROM singer ORDER BY age LIMIT 1",
+            ),
+        ]
+
+    def test_same_as_scan(self):
+        for query_1, query_2 in self.pairs:
+            parsed_1 = sqlglot.parse_one(query_1)
+            parsed_2 = sqlglot.parse_one(query_2)
+            diff_1_2 = sqlglot.diff(parsed_1, parsed_2)
+            edit_index = EditIndex(query_diff=list(diff_1_2))
+            scanned_diff = list(diff_1_2)
+
+            for expr in parsed_1.walk(bfs=False):
+                expected = self.instance.get_unchanged_label_and_edit(
+                    expr=expr, query_diff=scanned_diff
+                )
+                result = self.instance.get_indexed_label_and_edit(
+                    expr=expr, edit_index=edit_index
+                )
+                self.assertEqual(result[0], expected[0])
+                self.assertIs(result[1], expected[1])
+            self.assertEqual(edit_index.query_diff, scanned_diff)
+
+    def test_pop(self):
+        parsed = sqlglot.parse_one("SELECT a, a FROM t")
+        diff_1_2 = sqlglot.diff(parsed, parsed.copy())
+        edit_index = EditIndex(query_diff=diff_1_2)
+        column = sqlglot.parse_one("a", into=sqlglot.exp.Column)
+        self.assertIsNotNone(edit_index.pop(column))
+        self.assertIsNotNone(edit_index.pop(column))
+        self.assertIsNone(edit_index.pop(column))
+
+
+if __name__ == "__main__":
+    unittest.main()
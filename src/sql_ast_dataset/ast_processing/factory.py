@@ -1,45 +1,171 @@
 """A factory to refine schemas."""
 
-from typing import Any, Dict, List, Optional
-
-from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
-from sql_ast_dataset.ast_processing.query_processor import QueryProcessor
+import importlib
+import json
+import sys
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+
+# The class of each method as (module, class name). The modules import
+# sqlglot, so they are only imported when a method is used.
+SUPPORTED_METHODS: Dict[str, Tuple[str, str]] = {
+    "QueryProcessor": (
+        "sql_ast_dataset.ast_processing.query_processor",
+        "QueryProcessor",
+    ),
+}
+
+# Installed packages can add methods under this entry point group, e.g.
+# [tool.poetry.plugins."sql_ast_dataset.methods"]
+# MyProcessor = "my_package.processor:MyProcessor"
+ENTRY_POINT_GROUP = "sql_ast_dataset.methods"
+
+MethodClass = TypeVar("MethodClass", bound=type)
+
+# The entry point methods, discovered once per process
+_ENTRY_POINT_METHODS: Optional[Dict[str, Tuple[str, str]]] = None
+
+# The methods built by Factory.build_cached, keyed by name and config
+_BUILT_METHODS: Dict[Tuple[str, str], "BaseMethod"] = {}
+
+
+def register_method(name: Optional[str] = None) -> Callable[[MethodClass], MethodClass]:
+    """A class decorator that adds a BaseMethod to the supported methods.
+
+    Example:
+        @register_method("MyProcessor")
+        class MyProcessor(BaseMethod):
+            ...
+
+    Args:
+        name: The name of the method, the class name by default.
+
+    Returns:
+        The decorator, which returns the class unchanged.
+    """
+
+    def decorator(method_class: MethodClass) -> MethodClass:
+        SUPPORTED_METHODS[name or method_class.__name__] = (
+            method_class.__module__,
+            method_class.__qualname__,
+        )
+        return method_class
+
+    return decorator
+
+
+def _entry_point_methods() -> Dict[str, Tuple[str, str]]:
+    """Returns the methods of the installed entry points."""
+    global _ENTRY_POINT_METHODS
+    if _ENTRY_POINT_METHODS is None:
+        from importlib.metadata import entry_points
+
+        if sys.version_info >= (3, 10):
+            found = entry_points(group=ENTRY_POINT_GROUP)
+        else:
+            found = entry_points().get(ENTRY_POINT_GROUP, [])
+        _ENTRY_POINT_METHODS = {}
+        for entry_point in found:
+            module_name, _, class_name = entry_point.value.partition(":")
+            _ENTRY_POINT_METHODS[entry_point.name] = (
+                module_name.strip(),
+                class_name.strip(),
+            )
+    return _ENTRY_POINT_METHODS
+
+
+def clear_build_cache() -> None:
+    """Drops the methods built by Factory.build_cached in this process."""
+    _BUILT_METHODS.clear()
 
 
 class Factory:
     """A factory to build instances of refining methods."""
 
     def __init__(self):
-        """Initializes the factory."""
-        self.supported_methods = {
-            "QueryProcessor": QueryProcessor().get_parms(),
-        }
+        """Initializes the factory.
+
+        The names are resolved on every lookup, so methods registered
+        after the factory was created can be built as well.
+        """
 
-    def get_supported_methods(self) -> List[str]:
+    def _method_path(self, method_name: str) -> Optional[Tuple[str, str]]:
+        """Returns the (module, class name) of a method or None.
+
+        The registered methods take precedence over the entry points,
+        which are only read if the name is not registered.
+        """
+        path = SUPPORTED_METHODS.get(method_name, None)
+        if path is None:
+            path = _entry_point_methods().get(method_name, None)
+        return path
+
+    def get_supported_methods(self, include_entry_points: bool = False) -> List[str]:
         """Get the list of supported methods.
 
+        Args:
+            include_entry_points: If set, the methods of the installed
+                entry points are listed as well. Reading them scans the
+                metadata of all installed packages.
+
         Return:
             A list of string storing the names of the methods.
         """
-        return self.supported_methods.keys()
+        if not include_entry_points:
+            return list(SUPPORTED_METHODS)
+        return list(dict.fromkeys([*SUPPORTED_METHODS, *_entry_point_methods()]))
+
+    def get_method_class(self, method_name: str) -> Optional[Type["BaseMethod"]]:
+        """Imports the class of a method.
+
+        Args:
+            method_name: the name of the method.
+
+        Return:
+            The class of the method or None.
+        """
+        path = self._method_path(method_name)
+        if path is None:
+            return None
+
+        module_name, class_name = path
+        value: Any = importlib.import_module(module_name)
+        for attribute in class_name.split("."):
+            value = getattr(value, attribute)
+        return value
 
     def get_parms(self, method_name: str) -> Optional[Dict[str, Any]]:
         """Get the supported parameters by a specific method.
 
+        The parameters are read from the class, no instance is created.
+
         Args:
             method_name: the name of the method.
 
         Return:
             The dictionary of supported parameters or None.
         """
-        if method_name not in self.get_supported_methods():
+        method_class = self.get_method_class(method_name)
+        if method_class is None:
             return None
 
-        return self.supported_methods[method_name]
+        return dict(method_class.PARMS)
 
     def build(
         self, method_name: str, config_dict: Dict[str, Any]
-    ) -> Optional[BaseMethod]:
+    ) -> Optional["BaseMethod"]:
         """Build an instance of a method.
 
         Parms:
@@ -49,19 +175,44 @@ class Factory:
         Return:
             An instance that can be used to perform the filtering.
         """
-        if method_name not in self.get_supported_methods():
-            return None
-
-        method: Optional[BaseMethod] = None
-        if method_name == "QueryProcessor":
-            method = QueryProcessor()
-
-        if method is None:
+        method_class = self.get_method_class(method_name)
+        if method_class is None:
             return None
 
+        method = method_class()
         rc, message = method.set_config(config_dict=config_dict)
         if rc is False:
             print(f"Unable to build {method_name}: {message}")
             return None
 
         return method
+
+    def build_cached(
+        self, method_name: str, config_dict: Dict[str, Any]
+    ) -> Optional["BaseMethod"]:
+        """Returns the instance of this process for a method and config.
+
+        The first call builds the method, later calls with an equal config
+        return the same instance, so its caches stay warm across tasks,
+        e.g. in the tasks of a pool worker. The instance is shared, callers
+        must not change its config.
+
+        Parms:
+            method_name: the name of the method.
+            config_dict: the configuration dictionary for the method, it
+                has to be JSON serializable to be cached.
+
+        Return:
+            The shared instance, or None if it can not be built.
+        """
+        try:
+            key = (method_name, json.dumps(config_dict, sort_keys=True))
+        except (TypeError, ValueError):
+            return self.build(method_name, config_dict=config_dict)
+
+        method = _BUILT_METHODS.get(key, None)
+        if method is None:
+            method = self.build(method_name, config_dict=config_dict)
+            if method is not None:
+                _BUILT_METHODS[key] = method
+        return method
@@ -0,0 +1,98 @@
+import sys
+import unittest
+from importlib.metadata import EntryPoint
+from unittest import mock
+
+from sql_ast_dataset.ast_processing import factory
+from sql_ast_dataset.ast_processing.factory import (
+    SUPPORTED_METHODS,
+    Factory,
+    clear_build_cache,
+    register_method,
+)
+from sql_ast_dataset.ast_processing.query_processor import QueryProcessor
+
+
+class UpperCaseProcessor(QueryProcessor):
+    """A registered method, the parameters are inherited."""
+
+
+class TestFactory(unittest.TestCase):
+    def tearDown(self) -> None:
+        SUPPORTED_METHODS.pop("UpperCase", None)
+        clear_build_cache()
+
+    def test_supported_methods(self):
+        instance = Factory()
+        self.assertIn("QueryProcessor", instance.get_supported_methods())
+        self.assertIs(instance.get_method_class("QueryProcessor"), QueryProcessor)
+        self.assertIsNone(instance.get_method_class("Unknown"))
+        self.assertIsNone(instance.get_parms("Unknown"))
+        self.assertIsNone(instance.build("Unknown", config_dict={}))
+        self.assertEqual(instance.get_parms("QueryProcessor"), QueryProcessor.PARMS)
+
+    def test_register_method(self):
+        # An existing factory sees methods registered later
+        existing = Factory()
+        self.assertIsNone(existing.build("UpperCase", config_dict={}))
+        self.assertIs(
+            register_method("UpperCase")(UpperCaseProcessor), UpperCaseProcessor
+        )
+        instance = Factory()
+        self.assertIn("UpperCase", instance.get_supported_methods())
+        method = instance.build("UpperCase", config_dict={})
+        self.assertIsInstance(method, UpperCaseProcessor)
+        self.assertEqual(instance.get_parms("UpperCase"), QueryProcessor.PARMS)
+        self.assertIsInstance(
+            existing.build("UpperCase", config_dict={}), UpperCaseProcessor
+        )
+        self.assertIn("UpperCase", existing.get_supported_methods())
+
+    def test_entry_points(self):
+        entry_points = [
+            EntryPoint(
+                name="PluginProcessor",
+                value="sql_ast_dataset.ast_processing.query_processor:QueryProcessor",
+                group=factory.ENTRY_POINT_GROUP,
+            )
+        ]
+        with mock.patch.object(factory, "_ENTRY_POINT_METHODS", None), mock.patch(
+            "importlib.metadata.entry_points",
+            return_value=(
+                entry_points
+                if sys.version_info >= (3, 10)
+                else {factory.ENTRY_POINT_GROUP: entry_points}
+            ),
+        ) as read_entry_points:
+            instance = Factory()
+            # Listing and building registered methods does not scan
+            self.assertNotIn("PluginProcessor", instance.get_supported_methods())
+            self.assertIsNotNone(instance.get_method_class("QueryProcessor"))
+            read_entry_points.assert_not_called()
+            self.assertIn(
+                "PluginProcessor",
+                instance.get_supported_methods(include_entry_points=True),
+            )
+            self.assertIsInstance(
+                Factory().build("PluginProcessor", config_dict={}), QueryProcessor
+            )
+
+    def test_build_cached(self):
+        instance = Factory()
+        method = instance.build_cached("QueryProcessor", {"max_nodes": 10})
+        self.assertIsNotNone(method)
+        self.assertIs(
+            Factory().build_cached("QueryProcessor", {"max_nodes": 10}), method
+        )
+        self.assertIsNot(instance.build_cached("QueryProcessor", {}), method)
+        self.assertIsNot(instance.build("QueryProcessor", {"max_nodes": 10}), method)
+        self.assertIsNone(instance.build_cached("QueryProcessor", {"max_nodes": -1}))
+
+        clear_build_cache()
+        self.assertIsNot(
+            instance.build_cached("QueryProcessor", {"max_nodes": 10}), method
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
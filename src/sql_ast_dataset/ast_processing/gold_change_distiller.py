@@ -0,0 +1,239 @@
+"""A ChangeDistiller that reuses the gold side across many diffs."""
+
+from collections import defaultdict
+from heapq import heappop, heappush
+from typing import Any, DefaultDict, Dict, List, Optional, Set, Tuple
+
+from sqlglot.diff import (
+    IGNORED_LEAF_EXPRESSION_TYPES,
+    ChangeDistiller,
+    _get_leaves,
+    _is_same_type,
+    _parent_similarity_score,
+)
+from sqlglot.expressions import Expression
+
+from sql_ast_dataset.ast_processing.limits import Deadline
+from sql_ast_dataset.ast_processing.tree_matching import (
+    SubtreeIndex,
+    is_leaf,
+    match_identical_subtrees,
+)
+
+
+class GoldChangeDistiller(ChangeDistiller):
+    """Diffs many source trees against one fixed target tree.
+
+    sqlglot.diff copies both trees and rebuilds the node index, the leaves,
+    the leaf sets and the bigram histograms of the target for every call.
+    Here these structures are computed once for the (gold) target and are
+    reused for every (candidate) source. The matching itself follows
+    ChangeDistiller.
+
+    The trees are not copied, therefore the edits reference the passed
+    nodes and the target must not be modified while the instance is used.
+    """
+
+    def __init__(self, target: Expression, f: float = 0.6, t: float = 0.6):
+        """Precomputes the target side.
+
+        Args:
+            target: The gold expression all sources are compared with.
+            f: See ChangeDistiller.
+            t: See ChangeDistiller.
+        """
+        super().__init__(f=f, t=t)
+        self._target = target
+        # In BFS order, like ChangeDistiller
+        self._target_index = {
+            id(n): n
+            for n in target.bfs()
+            if not isinstance(n, IGNORED_LEAF_EXPRESSION_TYPES)
+        }
+        self._target_leaves = list(_get_leaves(target))
+        self._target_leaf_ids: Dict[int, Set[int]] = {}
+        self._target_bigram_histos: Dict[int, DefaultDict[str, int]] = {}
+        self._source_leaf_ids: Dict[int, Set[int]] = {}
+        self._deadline: Optional[Deadline] = None
+        # Built on the first diff with prematch_subtrees
+        self._target_subtrees: Optional[SubtreeIndex] = None
+        self._prematched_leaves: Set[Tuple[int, int]] = set()
+
+    def diff_source(
+        self,
+        source: Expression,
+        deadline: Optional[Deadline] = None,
+        prematch_subtrees: bool = False,
+    ) -> List[Any]:
+        """Returns the list of changes between the source and the target.
+
+        Args:
+            source: The source expression, it is not copied.
+            deadline: If set, checked once per source node while matching,
+                raises a LimitExceeded when it has passed.
+            prematch_subtrees: If set, the subtrees that occur exactly
+                once in both trees are matched up front by their
+                fingerprint and only the rest is matched by similarity.
+
+        Returns:
+            The edit script as returned by sqlglot.diff.
+        """
+        self._source = source
+        self._deadline = deadline
+        self._source_index = {
+            id(n): n
+            for n in source.bfs()
+            if not isinstance(n, IGNORED_LEAF_EXPRESSION_TYPES)
+        }
+        self._unmatched_source_nodes = set(self._source_index)
+        self._unmatched_target_nodes = set(self._target_index)
+        self._bigram_histo_cache = {}
+        self._source_leaf_ids = {}
+
+        prematched: Set[Tuple[int, int]] = set()
+        if prematch_subtrees:
+            if self._target_subtrees is None:
+                self._target_subtrees = SubtreeIndex(self._target)
+            for keep in match_identical_subtrees(
+                source=SubtreeIndex(source), target=self._target_subtrees
+            ):
+                source_id, target_id = id(keep.source), id(keep.target)
+                prematched.add((source_id, target_id))
+                self._unmatched_source_nodes.discard(source_id)
+                self._unmatched_target_nodes.discard(target_id)
+                if is_leaf(keep.source):
+                    self._prematched_leaves.add((source_id, target_id))
+
+        try:
+            return self._generate_edit_script(self._compute_matching_set() | prematched)
+        finally:
+            # The per source caches are keyed by ids of the source tree
+            self._source_leaf_ids = {}
+            self._bigram_histo_cache = {}
+            self._deadline = None
+            self._prematched_leaves = set()
+
+    def _leaf_ids(self, node: Expression) -> Set[int]:
+        """Returns the ids of the leaves of a node, cached per side."""
+        node_id = id(node)
+        cache = (
+            self._target_leaf_ids
+            if node_id in self._target_index
+            else self._source_leaf_ids
+        )
+        leaf_ids = cache.get(node_id, None)
+        if leaf_ids is None:
+            leaf_ids = {id(leaf) for leaf in _get_leaves(node)}
+            cache[node_id] = leaf_ids
+        return leaf_ids
+
+    def _bigram_histo(self, expression: Expression) -> DefaultDict[str, int]:
+        """Returns the bigram histogram, target histograms are kept."""
+        if id(expression) not in self._target_index:
+            return super()._bigram_histo(expression)
+
+        histo = self._target_bigram_histos.get(id(expression), None)
+        if histo is None:
+            expression_str = self._sql_generator.generate(expression)
+            histo = defaultdict(int)
+            for i in range(max(0, len(expression_str) - 1)):
+                histo[expression_str[i : i + 2]] += 1
+            self._target_bigram_histos[id(expression)] = histo
+        return histo
+
+    def _compute_matching_set(self) -> Set[Tuple[int, int]]:
+        """Same as ChangeDistiller._compute_matching_set with cached leaves."""
+        leaves_matching_set = self._compute_leaf_matching_set()
+        matching_set = leaves_matching_set.copy()
+
+        ordered_unmatched_source_nodes = {
+            id(n): None
+            for n in self._source.bfs()
+            if id(n) in self._unmatched_source_nodes
+        }
+        ordered_unmatched_target_nodes = {
+            node_id: None
+            for node_id in self._target_index
+            if node_id in self._unmatched_target_nodes
+        }
+
+        for source_node_id in ordered_unmatched_source_nodes:
+            if self._deadline is not None:
+                self._deadline.check()
+            for target_node_id in ordered_unmatched_target_nodes:
+                source_node = self._source_index[source_node_id]
+                target_node = self._target_index[target_node_id]
+                if not _is_same_type(source_node, target_node):
+                    continue
+
+                source_leaf_ids = self._leaf_ids(source_node)
+                target_leaf_ids = self._leaf_ids(target_node)
+
+                max_leaves_num = max(len(source_leaf_ids), len(target_leaf_ids))
+                if max_leaves_num:
+                    common_leaves_num = sum(
+                        1 if s in source_leaf_ids and t in target_leaf_ids else 0
+                        for s, t in leaves_matching_set
+                    )
+                    leaf_similarity_score = common_leaves_num / max_leaves_num
+                else:
+                    leaf_similarity_score = 0.0
+
+                adjusted_t = (
+                    self.t
+                    if min(len(source_leaf_ids), len(target_leaf_ids)) > 4
+                    else 0.4
+                )
+
+                if leaf_similarity_score >= 0.8 or (
+                    leaf_similarity_score >= adjusted_t
+                    and self._dice_coefficient(source_node, target_node) >= self.f
+                ):
+                    matching_set.add((source_node_id, target_node_id))
+                    self._unmatched_source_nodes.remove(source_node_id)
+                    self._unmatched_target_nodes.remove(target_node_id)
+                    ordered_unmatched_target_nodes.pop(target_node_id, None)
+                    break
+
+        return matching_set
+
+    def _compute_leaf_matching_set(self) -> Set[Tuple[int, int]]:
+        """Same as ChangeDistiller._compute_leaf_matching_set with cached leaves."""
+        candidate_matchings: List[Tuple[float, int, int, Expression, Expression]] = []
+        for source_leaf in _get_leaves(self._source):
+            if self._deadline is not None:
+                self._deadline.check()
+            if id(source_leaf) not in self._unmatched_source_nodes:
+                # Prematched, it can not be matched again
+                continue
+            for target_leaf in self._target_leaves:
+                if id(target_leaf) not in self._unmatched_target_nodes:
+                    continue
+                if _is_same_type(source_leaf, target_leaf):
+                    similarity_score = self._dice_coefficient(source_leaf, target_leaf)
+                    if similarity_score >= self.f:
+                        heappush(
+                            candidate_matchings,
+                            (
+                                -similarity_score,
+                                -_parent_similarity_score(source_leaf, target_leaf),
+                                len(candidate_matchings),
+                                source_leaf,
+                                target_leaf,
+                            ),
+                        )
+
+        # Pick best matchings based on the highest score, the prematched
+        # leaves count for the similarity of their parents
+        matching_set = set(self._prematched_leaves)
+        while candidate_matchings:
+            _, _, _, source_leaf, target_leaf = heappop(candidate_matchings)
+            if (
+                id(source_leaf) in self._unmatched_source_nodes
+                and id(target_leaf) in self._unmatched_target_nodes
+            ):
+                matching_set.add((id(source_leaf), id(target_leaf)))
+                self._unmatched_source_nodes.remove(id(source_leaf))
+                self._unmatched_target_nodes.remove(id(target_leaf))
+
+        return matching_set
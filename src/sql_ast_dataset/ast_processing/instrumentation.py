@@ -0,0 +1,106 @@
+"""Per-call and aggregated statistics of the AST processing methods."""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class CallStats:
+    """Class for keeping track of the statistics of a single process call.
+
+    The stages are timed with lap, which attributes the time since the
+    previous lap (or the creation) to the given stage.
+    """
+
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    num_nodes: int = 0
+    num_edits: int = 0  # Edits of the diff that are not Keep
+    num_search_candidates: int = 0  # Occurrences checked by the SQL search
+    exact_match: bool = False  # The diff was skipped for identical queries
+    cache_hit: bool = False  # The result was read from the result cache
+    error_type: Optional[str] = None
+    _last_lap: float = field(default_factory=time.perf_counter, repr=False)
+
+    def lap(self, stage: str) -> None:
+        """Attributes the time since the last lap to the stage."""
+        now = time.perf_counter()
+        self.stage_seconds[stage] = (
+            self.stage_seconds.get(stage, 0.0) + now - self._last_lap
+        )
+        self._last_lap = now
+
+    def restart(self) -> None:
+        """Starts the next lap now, e.g. to skip untimed work."""
+        self._last_lap = time.perf_counter()
+
+
+@dataclass
+class ProcessingStats:
+    """Class for keeping track of the statistics aggregated over many calls."""
+
+    num_calls: int = 0
+    num_failures: int = 0
+    failure_types: Dict[str, int] = field(default_factory=dict)
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    num_nodes: int = 0
+    num_edits: int = 0
+    num_search_candidates: int = 0
+    num_exact_matches: int = 0
+    num_cache_hits: int = 0
+
+    def add_call(self, call_stats: CallStats) -> None:
+        """Adds the statistics of a single call."""
+        self.num_calls += 1
+        if call_stats.error_type is not None:
+            self.num_failures += 1
+            self.failure_types[call_stats.error_type] = (
+                self.failure_types.get(call_stats.error_type, 0) + 1
+            )
+        for stage, seconds in call_stats.stage_seconds.items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.num_nodes += call_stats.num_nodes
+        self.num_edits += call_stats.num_edits
+        self.num_search_candidates += call_stats.num_search_candidates
+        self.num_exact_matches += int(call_stats.exact_match)
+        self.num_cache_hits += int(call_stats.cache_hit)
+
+    def merge(self, other: "ProcessingStats") -> None:
+        """Adds the statistics of other, e.g. of another batch or worker."""
+        self.num_calls += other.num_calls
+        self.num_failures += other.num_failures
+        for error_type, count in other.failure_types.items():
+            self.failure_types[error_type] = (
+                self.failure_types.get(error_type, 0) + count
+            )
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.num_nodes += other.num_nodes
+        self.num_edits += other.num_edits
+        self.num_search_candidates += other.num_search_candidates
+        self.num_exact_matches += other.num_exact_matches
+        self.num_cache_hits += other.num_cache_hits
+
+    def mean_stage_seconds(self) -> Dict[str, float]:
+        """Returns the mean duration of each stage per call."""
+        if self.num_calls == 0:
+            return {}
+        return {
+            stage: seconds / self.num_calls
+            for stage, seconds in self.stage_seconds.items()
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the statistics as a JSON serializable dict."""
+        return {
+            "num_calls": self.num_calls,
+            "num_failures": self.num_failures,
+            "failure_types": dict(self.failure_types),
+            "stage_seconds": dict(self.stage_seconds),
+            "mean_stage_seconds": self.mean_stage_seconds(),
+            "num_nodes": self.num_nodes,
+            "num_edits": self.num_edits,
+            "num_search_candidates": self.num_search_candidates,
+            "num_exact_matches": self.num_exact_matches,
+            "num_cache_hits": self.num_cache_hits,
+        }
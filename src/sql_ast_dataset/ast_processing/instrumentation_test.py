@@ -0,0 +1,95 @@
+import unittest
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.instrumentation import CallStats, ProcessingStats
+
+STAGES = ["parse_gold", "parse", "map_chars", "group_chars", "diff", "labeling"]
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.items = [
+            ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+            ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+            # Can not be labeled as correct
+            ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+        ]
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.instance.stats)
+        self.instance.process(*self.items[0])
+        self.assertIsNone(self.instance.stats)
+
+    def test_process(self):
+        calls = []
+        stats = self.instance.enable_stats(callback=calls.append)
+        self.instance.process(*self.items[0])
+        with self.assertRaises(ValueError):
+            self.instance.process(*self.items[2])
+
+        self.assertEqual(stats.num_calls, 2)
+        self.assertEqual(stats.num_failures, 1)
+        self.assertEqual(stats.failure_types, {"ValueError": 1})
+        self.assertEqual(list(calls[0].stage_seconds), STAGES)
+        self.assertTrue(all(s >= 0 for s in calls[0].stage_seconds.values()))
+        # Select, Column, Count, From, Identifier, Star, Table, Identifier
+        self.assertEqual(calls[0].num_nodes, 8)
+        # Remove(Name)
+        self.assertEqual(calls[0].num_edits, 1)
+        self.assertEqual(calls[1].error_type, "ValueError")
+        self.assertEqual(stats.num_nodes, calls[0].num_nodes + calls[1].num_nodes)
+
+        self.assertIs(self.instance.disable_stats(), stats)
+        self.instance.process(*self.items[0])
+        self.assertEqual(stats.num_calls, 2)
+
+    def test_search_candidates(self):
+        self.assertEqual(
+            self.instance.set_config({"span_mapping": "search"}), (True, "")
+        )
+        stats = self.instance.enable_stats()
+        self.instance.process("SELECT a, a FROM t WHERE a = 1", "SELECT a FROM t", 0)
+        self.assertGreater(stats.num_search_candidates, 0)
+
+    def test_process_candidates(self):
+        stats = self.instance.enable_stats()
+        self.instance.process_candidates(
+            "SELECT COUNT(*) FROM singer",
+            ["SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer"],
+            [0, 1],
+        )
+        self.assertEqual(stats.num_calls, 2)
+        self.assertEqual(stats.num_failures, 0)
+        self.assertNotIn("parse_gold", stats.stage_seconds)
+        self.assertIn("labeling", stats.stage_seconds)
+
+    def test_merge(self):
+        stats = ProcessingStats()
+        call = CallStats(num_nodes=3, num_edits=1)
+        call.lap("diff")
+        stats.add_call(call)
+        other = ProcessingStats()
+        other.add_call(CallStats(num_nodes=2, error_type="ValueError"))
+        stats.merge(other)
+        result = stats.as_dict()
+        self.assertEqual(result["num_calls"], 2)
+        self.assertEqual(result["num_failures"], 1)
+        self.assertEqual(result["num_nodes"], 5)
+        self.assertEqual(result["num_edits"], 1)
+        self.assertEqual(list(result["mean_stage_seconds"]), ["diff"])
+
+    def test_batch(self):
+        expected = self.instance.enable_stats()
+        self.instance.process_batch(self.items * 2, num_workers=0)
+        stats = self.instance.enable_stats()
+        self.instance.process_batch(self.items * 2, num_workers=2, chunk_size=1)
+        self.assertEqual(stats.num_calls, len(self.items) * 2)
+        self.assertEqual(stats.num_failures, 2)
+        self.assertEqual(stats.num_nodes, expected.num_nodes)
+        self.assertEqual(stats.num_edits, expected.num_edits)
+        self.assertEqual(set(stats.stage_seconds), set(expected.stage_seconds))
+
+
+if __name__ == "__main__":
+    unittest.main()
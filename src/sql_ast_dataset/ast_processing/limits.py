@@ -0,0 +1,69 @@
+"""Per query pair complexity and time limits."""
+
+import time
+from typing import Any, Dict, Optional
+
+# What happens with a pair that exceeds a limit
+LIMIT_STRATEGIES = ("skip", "uniform")
+
+
+class LimitExceeded(ValueError):
+    """Raised when a query pair exceeds one of the configured limits."""
+
+    def __init__(self, reason: str, limit: float, value: float):
+        """Records why the pair was stopped.
+
+        Args:
+            reason: One of "max_nodes", "max_edits" or "timeout_seconds".
+            limit: The configured limit.
+            value: The value that exceeded the limit.
+        """
+        super().__init__(f"{reason} exceeded: {value} > {limit}")
+        self.reason = reason
+        self.limit = limit
+        self.value = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the reason as a JSON serializable dict."""
+        return {"reason": self.reason, "limit": self.limit, "value": self.value}
+
+
+class Deadline:
+    """A wall-clock deadline that is checked between units of work.
+
+    The checks are cooperative, the work in between is not interrupted.
+    """
+
+    __slots__ = ("seconds", "_start", "_end")
+
+    def __init__(self, seconds: float):
+        """Starts the deadline now.
+
+        Args:
+            seconds: The time budget.
+        """
+        self.seconds = seconds
+        self._start = time.perf_counter()
+        self._end = self._start + seconds
+
+    def check(self) -> None:
+        """Raises a LimitExceeded if the deadline has passed."""
+        now = time.perf_counter()
+        if now > self._end:
+            raise LimitExceeded(
+                reason="timeout_seconds",
+                limit=self.seconds,
+                value=round(now - self._start, 6),
+            )
+
+
+def check_limit(reason: str, limit: Optional[int], value: int) -> None:
+    """Raises a LimitExceeded if the value is above a set limit.
+
+    Args:
+        reason: The name of the limit.
+        limit: The limit, None means unlimited.
+        value: The measured value.
+    """
+    if limit is not None and value > limit:
+        raise LimitExceeded(reason=reason, limit=limit, value=value)
@@ -0,0 +1,144 @@
+import time
+import unittest
+from unittest import mock
+
+import sqlglot
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.gold_change_distiller import GoldChangeDistiller
+from sql_ast_dataset.ast_processing.limits import Deadline, LimitExceeded
+
+
+class TestLimits(unittest.TestCase):
+    def setUp(self) -> None:
+        self.factory = Factory()
+        self.query_1 = "SELECT Name, COUNT(*) FROM singer WHERE age > 20"
+        self.query_2 = "SELECT COUNT(*) FROM singer"
+
+    def _build(self, **config):
+        instance = self.factory.build("QueryProcessor", config_dict=config)
+        self.assertIsNotNone(instance)
+        return instance
+
+    def test_invalid_config(self):
+        for config in (
+            {"max_nodes": -1},
+            {"max_edits": "10"},
+            {"max_nodes": True},
+            {"timeout_seconds": 0},
+            {"limit_strategy": "ignore"},
+        ):
+            self.assertIsNone(
+                self.factory.build("QueryProcessor", config_dict=config), config
+            )
+
+    def test_within_limits(self):
+        expected = self._build().process(self.query_1, self.query_2, 0)
+        ast_diff = self._build(max_nodes=100, max_edits=10, timeout_seconds=60).process(
+            self.query_1, self.query_2, 0
+        )
+        self.assertEqual(ast_diff.get_labels(), expected.get_labels())
+        self.assertNotIn("limit_exceeded", ast_diff.metadata)
+
+    def test_skip(self):
+        for config, reason in (
+            ({"max_nodes": 5}, "max_nodes"),
+            ({"max_edits": 1}, "max_edits"),
+            ({"timeout_seconds": 1e-9}, "timeout_seconds"),
+        ):
+            with self.assertRaises(LimitExceeded) as context:
+                self._build(**config).process(self.query_1, self.query_2, 0)
+            self.assertEqual(context.exception.reason, reason)
+            self.assertEqual(context.exception.as_dict()["reason"], reason)
+
+    def test_uniform(self):
+        expected = self._build().process(self.query_1, self.query_2, 0)
+        for label in (0, 1):
+            ast_diff = self._build(max_edits=1, limit_strategy="uniform").process(
+                self.query_1, self.query_2, label
+            )
+            self.assertEqual(
+                ast_diff.metadata["limit_exceeded"],
+                {"reason": "max_edits", "limit": 1, "value": 5},
+            )
+            # The root is always 1
+            self.assertEqual(
+                ast_diff.get_labels(),
+                [1] + [label] * (len(ast_diff.query_subwords) - 1),
+            )
+            self.assertEqual(
+                ast_diff.query_subword_indices_as_list(),
+                expected.query_subword_indices_as_list(),
+            )
+
+    def test_stage_deadline(self):
+        # Identical queries are not diffed, only the other stages are timed
+        instance = self._build(timeout_seconds=0.05, limit_strategy="uniform")
+        group_char_indices = instance.group_char_indices
+
+        def slow_group_char_indices(**kwargs):
+            time.sleep(0.1)
+            return group_char_indices(**kwargs)
+
+        with mock.patch.object(
+            instance, "group_char_indices", side_effect=slow_group_char_indices
+        ):
+            ast_diff = instance.process(self.query_2, self.query_2, 0)
+            self.assertEqual(
+                ast_diff.metadata["limit_exceeded"]["reason"], "timeout_seconds"
+            )
+            self.assertEqual(ast_diff.get_labels(), [1, 0, 0, 0, 0])
+
+            instance.set_config({"timeout_seconds": 0.05})
+            with self.assertRaises(LimitExceeded):
+                instance.process(self.query_2, self.query_2, 0)
+
+    def test_search_deadline(self):
+        instance = self._build(
+            timeout_seconds=0.05, span_mapping="search", limit_strategy="uniform"
+        )
+        find_node_in_parent = instance._find_node_in_parent
+
+        def slow_find_node_in_parent(**kwargs):
+            time.sleep(0.02)
+            return find_node_in_parent(**kwargs)
+
+        with mock.patch.object(
+            instance, "_find_node_in_parent", side_effect=slow_find_node_in_parent
+        ):
+            # The nodes can not be labeled without the chars
+            with self.assertRaises(LimitExceeded):
+                instance.process(self.query_1, self.query_2, 0)
+
+    def test_distiller_deadline(self):
+        target = sqlglot.parse_one(self.query_2)
+        source = sqlglot.parse_one(self.query_1)
+        distiller = GoldChangeDistiller(target=target)
+        with self.assertRaises(LimitExceeded):
+            distiller.diff_source(source, deadline=Deadline(-1))
+        # The deadline is not kept for the next source
+        self.assertEqual(
+            [type(e) for e in distiller.diff_source(source)],
+            [type(e) for e in sqlglot.diff(source, target)],
+        )
+
+    def test_batch(self):
+        instance = self._build(max_nodes=10)
+        results = instance.process_batch(
+            [
+                (self.query_1, self.query_2, 0),
+                ("SELECT a FROM b", "SELECT a FROM b", 1),
+            ],
+            num_workers=0,
+        )
+        self.assertIsInstance(results[0], ASTDiffFailure)
+        self.assertEqual(results[0].error_type, "LimitExceeded")
+        self.assertEqual(
+            results[0].skip_reason, {"reason": "max_nodes", "limit": 10, "value": 13}
+        )
+        self.assertEqual(results[1].get_labels(), [1, 1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""A bounded LRU cache for parsed SQL queries."""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import sqlglot
+from sqlglot.expressions import Expression
+
+
+@dataclass
+class ParseCacheStats:
+    """Class for keeping track of the cache statistics."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ParseCache:
+    """Caches the parsed and normalized form of SQL queries.
+
+    The entries are keyed by (dialect, SQL text). Every lookup returns a
+    copy of the cached tree, so callers can modify it freely.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        """Initializes the cache.
+
+        Args:
+            max_size: The maximal number of cached queries.
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size has to be positive, got {max_size}.")
+        self.max_size = max_size
+        self.stats = ParseCacheStats()
+        self._entries: (
+            "OrderedDict[Tuple[Optional[str], str], Tuple[Expression, str]]"
+        ) = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, sql_query: str, dialect: Optional[str]) -> Tuple[Expression, str]:
+        """Parses the query or returns a copy of the cached parse.
+
+        Args:
+            sql_query: The SQL query.
+            dialect: The sqlglot dialect used for parsing.
+
+        Returns:
+            A tuple with a private copy of the parsed query and the
+            normalized SQL string.
+        """
+        key = (dialect, sql_query)
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            self.stats.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0].copy(), entry[1]
+
+        self.stats.misses += 1
+        parsed = sqlglot.parse_one(sql_query, dialect=dialect)
+        normalized = parsed.sql()
+        self._entries[key] = (parsed, normalized)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        return parsed.copy(), normalized
+
+    def clear(self) -> None:
+        """Removes all entries and resets the statistics."""
+        self._entries.clear()
+        self.stats = ParseCacheStats()
@@ -0,0 +1,58 @@
+import unittest
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.parse_cache import ParseCache
+
+
+class TestParseCache(unittest.TestCase):
+    def test_lru(self):
+        cache = ParseCache(max_size=2)
+        parsed_1, sql_1 = cache.get("select a from b", dialect="sqlite")
+        parsed_2, sql_2 = cache.get("select a from b", dialect="sqlite")
+        self.assertEqual(sql_1, "SELECT a FROM b")
+        self.assertEqual(sql_1, sql_2)
+        # Every lookup hands out its own copy
+        self.assertIsNot(parsed_1, parsed_2)
+        parsed_1.args["expressions"][0].pop()
+        self.assertEqual(cache.get("select a from b", dialect="sqlite")[0].sql(), sql_1)
+        self.assertEqual(parsed_2.sql(), sql_1)
+
+        cache.get("select c from d", dialect="sqlite")
+        cache.get("select a from b", dialect="duckdb")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats.hits, 2)
+        self.assertEqual(cache.stats.misses, 3)
+        self.assertEqual(cache.stats.evictions, 1)
+
+        with self.assertRaises(ValueError):
+            ParseCache(max_size=0)
+
+    def test_processor(self):
+        factory = Factory()
+        cached = factory.build("QueryProcessor", config_dict={})
+        uncached = factory.build("QueryProcessor", config_dict={"parse_cache_size": 0})
+        self.assertIsNone(uncached.parse_cache)
+        for parse_cache_size in (-1, True, False):
+            self.assertIsNone(
+                factory.build(
+                    "QueryProcessor", config_dict={"parse_cache_size": parse_cache_size}
+                )
+            )
+
+        gold = "SELECT COUNT(*) FROM singer"
+        candidates = [
+            ("SELECT Name, COUNT(*) FROM singer", 0),
+            ("SELECT COUNT(Name) FROM singer", 0),
+            ("SELECT COUNT(*) FROM singer", 1),
+        ]
+        for candidate, label in candidates * 2:
+            expected = uncached.process(candidate, gold, label)
+            result = cached.process(candidate, gold, label)
+            self.assertEqual(result.gold_query, expected.gold_query)
+            self.assertEqual(result.get_labels(), expected.get_labels())
+        self.assertEqual(cached.parse_cache.stats.misses, 1)
+        self.assertEqual(cached.parse_cache.stats.hits, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,26 +1,173 @@
 """Query Processor."""
 
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import sqlglot
 import sqlglot.expressions
+from sqlglot.diff import Keep
 from sqlglot.expressions import Column, Expression, Identifier, Limit, Table, TableAlias
 
-from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffInput, QueryASTWord
+from sql_ast_dataset.ast_processing.ast_diff_types import (
+    AnyQueryASTWord,
+    ASTDiffInput,
+    QueryASTWord,
+    SlimQueryASTWord,
+)
 from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+from sql_ast_dataset.ast_processing.char_node_map import CharNodeMap, numpy_available
+from sql_ast_dataset.ast_processing.char_spans import CharSpans
+from sql_ast_dataset.ast_processing.diff_engines import DIFF_ENGINES, GoldDiffer
+from sql_ast_dataset.ast_processing.edit_index import EditIndex
+from sql_ast_dataset.ast_processing.instrumentation import CallStats
+from sql_ast_dataset.ast_processing.limits import (
+    LIMIT_STRATEGIES,
+    Deadline,
+    LimitExceeded,
+    check_limit,
+)
+from sql_ast_dataset.ast_processing.parse_cache import ParseCache
+from sql_ast_dataset.ast_processing.result_cache import ResultCache, result_cache_key
+from sql_ast_dataset.ast_processing.span_mapping import Spans, generate_spans
+from sql_ast_dataset.ast_processing.tree_matching import keep_identical_trees
+
+SPAN_MAPPINGS = ("generator", "search")
+CHAR_MAPS = ("list", "numpy")
+# Settings that do not change a result, they are not part of the cache key
+RESULT_CACHE_IGNORED_KEYS = (
+    "parse_cache_size",
+    "timeout_seconds",
+    "result_cache_path",
+    "result_cache_max_bytes",
+)
 
 
 class QueryProcessor(BaseMethod):
     """A processor that uses the AST of the query."""
 
+    # The configuration parameters, readable without an instance
+    PARMS: Dict[str, Any] = {
+        "sqlglot_dialect": "The dialect to use for parsing.",
+        "parse_cache_size": (
+            "The number of gold queries whose parse gets cached, "
+            "0 disables the cache."
+        ),
+        "span_mapping": (
+            'How the AST nodes are mapped to the chars of the query. "generator" '
+            "records the spans while generating the SQL once and falls back to "
+            '"search" for nodes without a usable span. "search" looks up the '
+            "SQL of every node in the SQL of its parent."
+        ),
+        "char_map": (
+            'How the node of each char is stored. "list" keeps the expressions '
+            'in a list, "numpy" keeps node ordinals in an int32 array, groups '
+            "them vectorized and stores the char to query subword map in "
+            "ASTDiffInput.char_subword_map (requires NumPy)."
+        ),
+        "add_expression_references": (
+            "If true, each query subword keeps its sqlglot expression and "
+            "edit. If false, slim records with only the name, label, depth "
+            "and char indices are returned, which keeps the memory flat in "
+            "bulk generation."
+        ),
+        "max_nodes": (
+            "If set, pairs where either query has more AST nodes exceed the limits."
+        ),
+        "max_edits": (
+            "If set, pairs whose diff has more edits (other than Keep) "
+            "exceed the limits."
+        ),
+        "timeout_seconds": (
+            "If set, pairs whose processing takes longer exceed the limits. "
+            "The time is checked after parsing, the char mapping, the grouping "
+            'and the diff, while searching nodes with the "search" span '
+            "mapping and while matching the nodes of the diff. A timeout "
+            "during the char mapping always skips the pair, its nodes can not "
+            "be labeled uniformly without the chars."
+        ),
+        "limit_strategy": (
+            'What happens with a pair that exceeds a limit. "skip" raises a '
+            'LimitExceeded with the reason. "uniform" skips the diff and '
+            "labels every node with the label of the pair, the reason is "
+            'stored in the metadata under "limit_exceeded".'
+        ),
+        "exact_match_fast_path": (
+            "If true, queries whose normalized SQL equals the gold query "
+            "are not diffed, all their nodes are kept."
+        ),
+        "subtree_prematching": (
+            "If true, the subtrees that occur exactly once in both queries "
+            "are found by a fingerprint of each subtree and kept, only the "
+            "remaining nodes are matched by the diff."
+        ),
+        "diff_engine": (
+            'The engine that diffs the queries. "sqlglot" uses the '
+            'ChangeDistiller of sqlglot.diff. "anchored" keeps identical '
+            "subtrees, matches the remaining leaves by similarity and the "
+            "inner nodes by the partners of their leaves, which is faster "
+            "but may label some nodes differently."
+        ),
+        "result_cache_path": (
+            "If set, the processed pairs are cached in this SQLite file, keyed "
+            "by a hash of the method, the config, both queries and the label. "
+            "The file can be shared by processes and runs. Cached results "
+            "keep no expressions or edits."
+        ),
+        "result_cache_max_bytes": (
+            "The maximal size of the cached results, the least recently used "
+            "ones are evicted."
+        ),
+    }
+
     def __init__(self):
         """Initialize the processing method.
 
         For the configuration following parameters can be set:
+            - sqlglot_dialect: The dialect to use for parsing.
+            - parse_cache_size: The number of gold queries whose parse
+                gets cached, 0 disables the cache.
+            - span_mapping: How the AST nodes are mapped to the chars of
+                the query, "generator" or "search".
+            - char_map: How the node of each char is stored, "list" or
+                "numpy".
+            - add_expression_references: If set the query subwords keep
+                their expression and edit, otherwise slim records without
+                references are returned.
+            - max_nodes: The maximum number of AST nodes of either query,
+                None for no limit.
+            - max_edits: The maximum number of edits of the diff, None for
+                no limit.
+            - timeout_seconds: The wall-clock budget of a pair, None for no
+                limit.
+            - limit_strategy: What happens with a pair over a limit, "skip"
+                or "uniform".
+            - exact_match_fast_path: If set, the diff is skipped for queries
+                with the same normalized SQL.
+            - subtree_prematching: If set, subtrees that occur exactly once
+                in both queries are kept before the rest is diffed.
+            - diff_engine: The engine of the diff, "sqlglot" or "anchored".
+            - result_cache_path: The SQLite file of the persistent result
+                cache, None disables it.
+            - result_cache_max_bytes: The maximal size of the cached results.
         """
         self.config = None
         self.sqlglot_dialect = None
+        self.parse_cache: Optional[ParseCache] = None
+        self.span_mapping = "generator"
+        self.char_map = "list"
+        self.add_expression_references = True
+        self.max_nodes: Optional[int] = None
+        self.max_edits: Optional[int] = None
+        self.timeout_seconds: Optional[float] = None
+        self.limit_strategy = "skip"
+        self.exact_match_fast_path = True
+        self.subtree_prematching = False
+        self.diff_engine = "sqlglot"
+        self.result_cache: Optional[ResultCache] = None
+        # The statistics of the current call, see BaseMethod.enable_stats
+        self._call_stats: Optional[CallStats] = None
+        # The deadline of the current call, checked by _search_node
+        self._deadline: Optional[Deadline] = None
 
     def get_name(self) -> str:
         """Get the name of the method."""
@@ -43,6 +190,74 @@ class QueryProcessor(BaseMethod):
 
         self.sqlglot_dialect = self.config["sqlglot_dialect"]
 
+        parse_cache_size = self.config["parse_cache_size"]
+        if (
+            not isinstance(parse_cache_size, int)
+            or isinstance(parse_cache_size, bool)
+            or parse_cache_size < 0
+        ):
+            return False, "parse_cache_size has to be a non-negative integer."
+        self.parse_cache = (
+            ParseCache(max_size=parse_cache_size) if parse_cache_size > 0 else None
+        )
+
+        if self.config["span_mapping"] not in SPAN_MAPPINGS:
+            return False, f"span_mapping has to be one of {SPAN_MAPPINGS}."
+        self.span_mapping = self.config["span_mapping"]
+
+        if self.config["char_map"] not in CHAR_MAPS:
+            return False, f"char_map has to be one of {CHAR_MAPS}."
+        if self.config["char_map"] == "numpy" and not numpy_available():
+            return False, 'char_map "numpy" requires NumPy to be installed.'
+        self.char_map = self.config["char_map"]
+
+        self.add_expression_references = bool(self.config["add_expression_references"])
+
+        for key in ("max_nodes", "max_edits"):
+            value = self.config[key]
+            if value is not None and (
+                not isinstance(value, int) or isinstance(value, bool) or value < 0
+            ):
+                return False, f"{key} has to be None or a non-negative integer."
+        self.max_nodes = self.config["max_nodes"]
+        self.max_edits = self.config["max_edits"]
+
+        timeout_seconds = self.config["timeout_seconds"]
+        if timeout_seconds is not None and (
+            not isinstance(timeout_seconds, (int, float))
+            or isinstance(timeout_seconds, bool)
+            or timeout_seconds <= 0
+        ):
+            return False, "timeout_seconds has to be None or a positive number."
+        self.timeout_seconds = timeout_seconds
+
+        if self.config["limit_strategy"] not in LIMIT_STRATEGIES:
+            return False, f"limit_strategy has to be one of {LIMIT_STRATEGIES}."
+        self.limit_strategy = self.config["limit_strategy"]
+
+        self.exact_match_fast_path = bool(self.config["exact_match_fast_path"])
+        self.subtree_prematching = bool(self.config["subtree_prematching"])
+
+        if self.config["diff_engine"] not in DIFF_ENGINES:
+            return False, f"diff_engine has to be one of {tuple(DIFF_ENGINES)}."
+        self.diff_engine = self.config["diff_engine"]
+
+        result_cache_max_bytes = self.config["result_cache_max_bytes"]
+        if (
+            not isinstance(result_cache_max_bytes, int)
+            or isinstance(result_cache_max_bytes, bool)
+            or result_cache_max_bytes < 1
+        ):
+            return False, "result_cache_max_bytes has to be a positive integer."
+        self.result_cache = (
+            ResultCache(
+                path=self.config["result_cache_path"],
+                max_bytes=result_cache_max_bytes,
+            )
+            if self.config["result_cache_path"] is not None
+            else None
+        )
+
         return True, ""
 
     def _get_default_dict(self) -> Dict[str, Any]:
@@ -53,16 +268,19 @@ class QueryProcessor(BaseMethod):
         """
         return {
             "sqlglot_dialect": "sqlite",
-        }
-
-    def get_parms(self) -> Dict[str, Any]:
-        """Get the configuration parameters for the method.
-
-        Return:
-            The configuration parameters as a dictionary.
-        """
-        return {
-            "sqlglot_dialect": "The dialect to use for parsing.",
+            "parse_cache_size": 1024,
+            "span_mapping": "generator",
+            "char_map": "list",
+            "add_expression_references": True,
+            "max_nodes": None,
+            "max_edits": None,
+            "timeout_seconds": None,
+            "limit_strategy": "skip",
+            "exact_match_fast_path": True,
+            "subtree_prematching": False,
+            "diff_engine": "sqlglot",
+            "result_cache_path": None,
+            "result_cache_max_bytes": 1 << 30,
         }
 
     def skip_node(self, expr: Expression) -> bool:
@@ -114,6 +332,8 @@ class QueryProcessor(BaseMethod):
         start_ind_list = [
             m.start() for m in re.finditer(re.escape(node_sql), available_sql)
         ]
+        if self._call_stats is not None:
+            self._call_stats.num_search_candidates += len(start_ind_list)
 
         for start_ind in start_ind_list:
             local_node_left = left + start_ind
@@ -131,7 +351,8 @@ class QueryProcessor(BaseMethod):
                 # only the parent exists
                 parent_ok = True
                 for parent_node in char_list[local_node_left:local_node_right]:
-                    if parent_node != node.parent:
+                    # The identity check avoids hashing the whole parent
+                    if parent_node is not node.parent and parent_node != node.parent:
                         parent_ok = False
                         break
                 if not parent_ok:
@@ -141,19 +362,16 @@ class QueryProcessor(BaseMethod):
             break
         return left_index
 
-    def dfs_simple_node_to_char(
+    def _search_node(
         self,
         node: Expression,
         initial_sql: str,
         left: int,
         right: int,
         char_list: List[Any],
-        prune: Any = None,
         check_parent: bool = False,
     ) -> Tuple[int, int]:
-        """Best effort of mapping the SQL AST to the char of the string.
-
-        Updates the char_list with pointers to the associated Expressions.
+        """Searches the SQL of the node in the SQL of its parent.
 
         Args:
             node: The current expression.
@@ -166,11 +384,10 @@ class QueryProcessor(BaseMethod):
                 that is only occupied by the parent of node.
 
         Returns:
-            The new left and right index.
+            The left and right index of the node.
         """
-        if prune and prune(node):
-            return left, right
-
+        if self._deadline is not None:
+            self._deadline.check()
         available_sql = initial_sql[left:right]
         node_sql = node.sql()
         if (
@@ -205,21 +422,93 @@ class QueryProcessor(BaseMethod):
 
         # Computing the new global indices
         node_left = left + left_index
-        node_right = node_left + len(node_sql)
+        return node_left, node_left + len(node_sql)
 
-        if not self.skip_node(expr=node):
+    def _assign_chars(
+        self, char_list: Any, left: int, right: int, node: Expression
+    ) -> None:
+        """Assigns the chars from left to right (exclusive) to the node.
+
+        Args:
+            char_list: A list or a CharNodeMap.
+            left: The left char index.
+            right: The right char index.
+            node: The current expression.
+        """
+        if isinstance(char_list, CharNodeMap):
+            char_list.assign(left=left, right=right, node=node)
+        else:
             # Assigning position in array
-            char_list[node_left:node_right] = [node] * len(node_sql)
+            char_list[left:right] = [node] * (right - left)
+
+    def _children_in_sql_order(self, node: Expression) -> List[Expression]:
+        """Returns the children of the node in the order they are written.
 
+        Args:
+            node: The current expression.
+
+        Returns:
+            The child expressions.
+        """
         # Attention this is specific to SQLite
         # In DFS the LIMIT node comes before FROM, WHERE, etc.
         # But this is not conform wiht how we write it.
         limit = None
-
+        children = []
         for v in node.iter_expressions(reverse=False):
             if isinstance(v, Limit):
                 limit = v
                 continue
+            children.append(v)
+        if limit is not None:
+            children.append(limit)
+        return children
+
+    def dfs_simple_node_to_char(
+        self,
+        node: Expression,
+        initial_sql: str,
+        left: int,
+        right: int,
+        char_list: List[Any],
+        prune: Any = None,
+        check_parent: bool = False,
+    ) -> Tuple[int, int]:
+        """Best effort of mapping the SQL AST to the char of the string.
+
+        Updates the char_list with pointers to the associated Expressions.
+
+        Args:
+            node: The current expression.
+            initial_sql: The initial SQL expression as a string.
+            left: The left char boundary of initial_sql.
+            right: The right char boundry of initial_sql.
+            char_list: For each char in initial_sql store the associated
+                expression.
+            check_parent: If set makes sure that we always find a substring
+                that is only occupied by the parent of node.
+
+        Returns:
+            The new left and right index.
+        """
+        if prune and prune(node):
+            return left, right
+
+        node_left, node_right = self._search_node(
+            node=node,
+            initial_sql=initial_sql,
+            left=left,
+            right=right,
+            char_list=char_list,
+            check_parent=check_parent,
+        )
+
+        if not self.skip_node(expr=node):
+            self._assign_chars(
+                char_list=char_list, left=node_left, right=node_right, node=node
+            )
+
+        for v in self._children_in_sql_order(node=node):
             _, _ = self.dfs_simple_node_to_char(
                 node=v,
                 initial_sql=initial_sql,
@@ -230,34 +519,181 @@ class QueryProcessor(BaseMethod):
                 check_parent=check_parent,
             )
 
-        if limit is not None:
-            _, _ = self.dfs_simple_node_to_char(
-                node=limit,
+        return node_left, node_right
+
+    def _find_node_by_span(
+        self,
+        node: Expression,
+        span: Tuple[int, int],
+        initial_sql: str,
+        left: int,
+        right: int,
+        char_list: List[Any],
+    ) -> Optional[Tuple[int, int]]:
+        """Places the node like _search_node but starting from its known span.
+
+        _search_node picks the first non-overlapping occurrence of the
+        node SQL in its parent that is only occupied by the parent. Only
+        the occurrences up to the generated span are checked here. Since
+        a node can not be occupied by one of its descendants, checking
+        the identity of the parent is enough.
+
+        Args:
+            node: The current expression.
+            span: The left and right index of the generated node SQL.
+            initial_sql: The initial SQL expression as a string.
+            left: The left char boundary of the parent.
+            right: The right char boundry of the parent.
+            char_list: For each char in initial_sql store the associated
+                expression.
+
+        Returns:
+            The left and right index of the node, or None if the search
+            has to be used.
+        """
+        span_left, span_right = span
+        if span_left < left or span_right > right or span_left == span_right:
+            return None
+        if node.comments:
+            # The parent may place the comments outside of the node SQL
+            return None
+
+        parent = node.parent
+        node_sql = initial_sql[span_left:span_right]
+        node_length = span_right - span_left
+        occurrence = initial_sql.find(node_sql, left, right)
+        while occurrence != -1 and occurrence <= span_left:
+            occurrence_right = occurrence + node_length
+            if parent is None or all(
+                entry is parent for entry in char_list[occurrence:occurrence_right]
+            ):
+                return occurrence, occurrence_right
+            occurrence = initial_sql.find(node_sql, occurrence_right, right)
+        return None
+
+    def dfs_span_node_to_char(
+        self,
+        node: Expression,
+        initial_sql: str,
+        left: int,
+        right: int,
+        char_list: List[Any],
+        spans: Spans,
+        prune: Any = None,
+    ) -> Tuple[int, int]:
+        """Maps the SQL AST to the char of the string using generated spans.
+
+        Gives the same result as dfs_simple_node_to_char with check_parent
+        set, but avoids generating and searching the SQL of every node.
+        Nodes without a usable span fall back to the search.
+
+        Args:
+            node: The current expression.
+            initial_sql: The initial SQL expression as a string.
+            left: The left char boundary of initial_sql.
+            right: The right char boundry of initial_sql.
+            char_list: For each char in initial_sql store the associated
+                expression.
+            spans: The generated spans by node id, see generate_spans.
+
+        Returns:
+            The new left and right index.
+        """
+        if prune and prune(node):
+            return left, right
+
+        node_left_right = None
+        span = spans.get(id(node), None)
+        if span is not None:
+            node_left_right = self._find_node_by_span(
+                node=node,
+                span=span,
+                initial_sql=initial_sql,
+                left=left,
+                right=right,
+                char_list=char_list,
+            )
+        if node_left_right is None:
+            node_left_right = self._search_node(
+                node=node,
+                initial_sql=initial_sql,
+                left=left,
+                right=right,
+                char_list=char_list,
+                check_parent=True,
+            )
+        node_left, node_right = node_left_right
+
+        if not self.skip_node(expr=node):
+            self._assign_chars(
+                char_list=char_list, left=node_left, right=node_right, node=node
+            )
+
+        for v in self._children_in_sql_order(node=node):
+            _, _ = self.dfs_span_node_to_char(
+                node=v,
                 initial_sql=initial_sql,
                 left=node_left,
                 right=node_right,
                 char_list=char_list,
+                spans=spans,
                 prune=prune,
-                check_parent=check_parent,
             )
 
         return node_left, node_right
 
     def map_node_to_char_index_list(
         self, char_list: List[Expression]
-    ) -> Dict[Expression, List[int]]:
+    ) -> Dict[Expression, CharSpans]:
         """Maps the node to a char_index_list.
 
+        Expressions that are equal (same type and structure) share one
+        char_index_list.
+
         Args:
             char_list: The list of char to expression nodes.
 
         Returns:
             A dict that maps an expression to a char_index_list.
         """
-        ret: Dict[Expression, List[int]] = {}
-        for index, entry in enumerate(char_list):
-            ret[entry] = ret.get(entry, []) + [index]
-        return ret
+        # Collect the runs of each node by identity first, so every
+        # (structurally hashed) node is only looked up once
+        runs_by_id: Dict[int, List[Tuple[int, int]]] = {}
+        nodes_by_id: Dict[int, Expression] = {}
+        start = 0
+        for end in range(1, len(char_list) + 1):
+            if end < len(char_list) and char_list[end] is char_list[start]:
+                continue
+            entry = char_list[start]
+            node_runs = runs_by_id.get(id(entry), None)
+            if node_runs is None:
+                node_runs = runs_by_id[id(entry)] = []
+                nodes_by_id[id(entry)] = entry
+            node_runs.append((start, end))
+            start = end
+
+        runs_by_node: Dict[Expression, List[Tuple[int, int]]] = {}
+        for node_id, entry in nodes_by_id.items():
+            runs_by_node.setdefault(entry, []).extend(runs_by_id[node_id])
+        return {
+            entry: CharSpans.from_spans(sorted(node_runs))
+            for entry, node_runs in runs_by_node.items()
+        }
+
+    def parse_gold_query(self, sql_query: str) -> Tuple[Expression, str]:
+        """Parses the gold query, using the parse cache if enabled.
+
+        Args:
+            sql_query: The ideal/gold query.
+
+        Returns:
+            A tuple with the parsed query, which is a private copy, and
+            its normalized SQL string.
+        """
+        if self.parse_cache is not None:
+            return self.parse_cache.get(sql_query, dialect=self.sqlglot_dialect)
+        parsed_sql_query = sqlglot.parse_one(sql_query, dialect=self.sqlglot_dialect)
+        return parsed_sql_query, parsed_sql_query.sql()
 
     def process(self, sql_query_1: str, sql_query_2: str, label: int) -> ASTDiffInput:
         """Constructs a QuerySubword list of the two SQL queries.
@@ -270,45 +706,282 @@ class QueryProcessor(BaseMethod):
         Returns:
             An instance of ASTDiffInput.
         """
-        parsed_sql_query_1 = sqlglot.parse_one(
-            sql_query_1, dialect=self.sqlglot_dialect
+        call_stats = self._start_call()
+        try:
+            cache_key = self._result_cache_key(sql_query_1, sql_query_2, label)
+            cached = self._cached_result(cache_key, call_stats)
+            if cached is not None:
+                return cached
+            # The gold query is usually shared by many predictions
+            parsed_sql_query_2, normalized_sql_query_2 = self.parse_gold_query(
+                sql_query_2
+            )
+            if call_stats is not None:
+                call_stats.lap("parse_gold")
+            ast_diff = self._process_parsed_gold(
+                sql_query_1=sql_query_1,
+                parsed_sql_query_2=parsed_sql_query_2,
+                sql_query_2=normalized_sql_query_2,
+                label=label,
+                call_stats=call_stats,
+            )
+            self._cache_result(cache_key, ast_diff)
+            return ast_diff
+        except Exception as ex:
+            if call_stats is not None:
+                call_stats.error_type = type(ex).__name__
+            raise
+        finally:
+            self._finish_call(call_stats)
+
+    def process_candidates(
+        self,
+        sql_gold_query: str,
+        sql_queries: Sequence[str],
+        labels: Sequence[int],
+    ) -> List[ASTDiffInput]:
+        """Constructs the QuerySubword lists of many queries for one gold query.
+
+        The gold query is parsed once and its diff structures (node index,
+        leaves and bigram histograms) are shared by all candidates.
+
+        Args:
+            sql_gold_query: The ideal/gold query.
+            sql_queries: The original/wrong queries.
+            labels: For each query the label if it is correct.
+
+        Returns:
+            An instance of ASTDiffInput for each query.
+        """
+        if len(sql_queries) != len(labels):
+            raise ValueError(
+                f"Got {len(sql_queries)} queries but {len(labels)} labels."
+            )
+        parsed_sql_query_2: Optional[Expression] = None
+        sql_query_2 = sql_gold_query
+        gold_distiller: Optional[GoldDiffer] = None
+        ast_diffs = []
+        for sql_query_1, label in zip(sql_queries, labels):
+            call_stats = self._start_call()
+            try:
+                cache_key = self._result_cache_key(sql_query_1, sql_gold_query, label)
+                cached = self._cached_result(cache_key, call_stats)
+                if cached is not None:
+                    ast_diffs.append(cached)
+                    continue
+                if parsed_sql_query_2 is None:
+                    # Only parsed if a candidate is not cached
+                    parsed_sql_query_2, sql_query_2 = self.parse_gold_query(
+                        sql_gold_query
+                    )
+                    gold_distiller = self.build_gold_differ(target=parsed_sql_query_2)
+                ast_diff = self._process_parsed_gold(
+                    sql_query_1=sql_query_1,
+                    parsed_sql_query_2=parsed_sql_query_2,
+                    sql_query_2=sql_query_2,
+                    label=label,
+                    gold_distiller=gold_distiller,
+                    call_stats=call_stats,
+                )
+                self._cache_result(cache_key, ast_diff)
+                ast_diffs.append(ast_diff)
+            except Exception as ex:
+                if call_stats is not None:
+                    call_stats.error_type = type(ex).__name__
+                raise
+            finally:
+                self._finish_call(call_stats)
+        return ast_diffs
+
+    def _result_cache_key(
+        self, sql_query_1: str, sql_query_2: str, label: int
+    ) -> Optional[str]:
+        """Returns the result cache key of a pair, None without a cache."""
+        if self.result_cache is None or self.config is None:
+            return None
+        return result_cache_key(
+            method_name=self.get_name(),
+            config={
+                key: value
+                for key, value in self.config.items()
+                if key not in RESULT_CACHE_IGNORED_KEYS
+            },
+            sql_query_1=sql_query_1,
+            sql_query_2=sql_query_2,
+            label=label,
         )
-        sql_query_1 = parsed_sql_query_1.sql()  # To make it consistent
-        parsed_sql_query_2 = sqlglot.parse_one(
-            sql_query_2, dialect=self.sqlglot_dialect
+
+    def _cached_result(
+        self, cache_key: Optional[str], call_stats: Optional[CallStats]
+    ) -> Optional[ASTDiffInput]:
+        """Looks the pair up in the result cache."""
+        if cache_key is None or self.result_cache is None:
+            return None
+        ast_diff = self.result_cache.get(cache_key)
+        if ast_diff is not None and call_stats is not None:
+            call_stats.cache_hit = True
+        return ast_diff
+
+    def _cache_result(self, cache_key: Optional[str], ast_diff: ASTDiffInput) -> None:
+        """Stores a result, unless it was labeled uniformly due to a limit."""
+        if cache_key is None or self.result_cache is None:
+            return
+        if (
+            isinstance(ast_diff.metadata, dict)
+            and "limit_exceeded" in ast_diff.metadata
+        ):
+            # E.g. a timeout depends on the load of the machine
+            return
+        self.result_cache.put(cache_key, ast_diff)
+
+    def map_chars_to_nodes(
+        self, parsed_sql_query: Expression, sql_query: str
+    ) -> Tuple[List[Expression], Any]:
+        """Maps each char of the query to its AST node.
+
+        Args:
+            parsed_sql_query: The parsed query.
+            sql_query: The SQL of the parsed query.
+
+        Returns:
+            A tuple with the nodes in DFS order and the char_list (a list
+            or a CharNodeMap, depending on char_map).
+        """
+        nodes = list(parsed_sql_query.walk(bfs=False))
+        char_list: Any = (
+            CharNodeMap(nodes=nodes, length=len(sql_query))
+            if self.char_map == "numpy"
+            else [None] * len(sql_query)
         )
-        sql_query_2 = parsed_sql_query_2.sql()  # To make it consistent
-
-        # Map each char to its node
-        char_list = [None] * len(sql_query_1)
-        self.dfs_simple_node_to_char(
-            node=parsed_sql_query_1,
-            initial_sql=sql_query_1,
-            left=0,
-            right=len(sql_query_1),
-            char_list=char_list,
-            check_parent=True,
+        spans = (
+            generate_spans(expression=parsed_sql_query, expected_sql=sql_query)
+            if self.span_mapping == "generator"
+            else None
         )
+        if spans is not None:
+            self.dfs_span_node_to_char(
+                node=parsed_sql_query,
+                initial_sql=sql_query,
+                left=0,
+                right=len(sql_query),
+                char_list=char_list,
+                spans=spans,
+            )
+        else:
+            self.dfs_simple_node_to_char(
+                node=parsed_sql_query,
+                initial_sql=sql_query,
+                left=0,
+                right=len(sql_query),
+                char_list=char_list,
+                check_parent=True,
+            )
+        return nodes, char_list
+
+    def group_char_indices(
+        self, nodes: List[Expression], char_list: Any
+    ) -> List[Optional[CharSpans]]:
+        """Groups the char indices by node.
+
+        Args:
+            nodes: The nodes in DFS order.
+            char_list: The char_list of map_chars_to_nodes.
+
+        Returns:
+            For each node its char indices, or None if it has no chars.
+        """
+        if isinstance(char_list, CharNodeMap):
+            return char_list.group()
         node_map_to_char_index_list = self.map_node_to_char_index_list(
-            char_list=char_list  # type: ignore
+            char_list=char_list
         )
+        return [node_map_to_char_index_list.get(expr, None) for expr in nodes]
 
-        # Create the difference between the sql nodes
-        diff_1_2 = sqlglot.diff(parsed_sql_query_1, parsed_sql_query_2)
-        a_ast_list: List[QueryASTWord] = []
+    def build_gold_differ(self, target: Expression) -> GoldDiffer:
+        """Builds the configured diff engine for a gold query.
 
-        for expr in parsed_sql_query_1.walk(bfs=False):
-            expr_name = expr.sql()
+        Args:
+            target: The parsed gold query.
+
+        Returns:
+            The differ, which diffs many candidates against the target.
+        """
+        return DIFF_ENGINES[self.diff_engine](target)
 
-            char_index_list: Optional[List[int]] = node_map_to_char_index_list.get(
-                expr, None
+    def diff_queries(
+        self,
+        parsed_sql_query_1: Expression,
+        parsed_sql_query_2: Expression,
+        gold_distiller: Optional[GoldDiffer] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Any]:
+        """Creates the difference between the sql nodes.
+
+        Args:
+            parsed_sql_query_1: The parsed original/wrong query.
+            parsed_sql_query_2: The parsed ideal/gold query.
+            gold_distiller: If set, used to diff against the gold query.
+            deadline: If set, checked while matching the nodes.
+
+        Returns:
+            The edit script.
+
+        Raises:
+            LimitExceeded: If the deadline passes.
+        """
+        if gold_distiller is None and (
+            deadline is not None
+            or self.subtree_prematching
+            or self.diff_engine != "sqlglot"
+        ):
+            # Only the differs check deadlines and prematch subtrees
+            gold_distiller = self.build_gold_differ(target=parsed_sql_query_2)
+        if gold_distiller is not None:
+            return gold_distiller.diff_source(
+                parsed_sql_query_1,
+                deadline=deadline,
+                prematch_subtrees=self.subtree_prematching,
             )
+        return sqlglot.diff(parsed_sql_query_1, parsed_sql_query_2)
+
+    def label_nodes(
+        self,
+        nodes: List[Expression],
+        char_index_lists: List[Optional[CharSpans]],
+        query_diff: List[Any],
+        label: int,
+        uniform_label: Optional[int] = None,
+    ) -> Tuple[List[AnyQueryASTWord], List[int]]:
+        """Labels the nodes that have chars.
+
+        Args:
+            nodes: The nodes in DFS order, the first one is the root.
+            char_index_lists: For each node its char indices or None.
+            query_diff: The edit script, used edits get replaced with None.
+            label: The label if the query is correct.
+            uniform_label: If set, every node but the root gets this label
+                and the edit script is ignored.
+
+        Returns:
+            A tuple with the query subwords and for each node its index in
+            the query subwords (-1 if it has none), plus a last -1 entry.
+        """
+        edit_index = EditIndex(query_diff=query_diff)
+        a_ast_list: List[AnyQueryASTWord] = []
+        # The query_subwords index of each node, -1 if it has none
+        subword_indices = [-1] * (len(nodes) + 1)
+
+        for ordinal, (expr, char_index_list) in enumerate(zip(nodes, char_index_lists)):
             if char_index_list is None:
                 continue
+            expr_name = expr.sql()
 
-            node_label, possible_edit = self.get_unchanged_label_and_edit(
-                expr=expr, query_diff=diff_1_2
-            )
+            if uniform_label is not None:
+                node_label, possible_edit = uniform_label, None
+            else:
+                node_label, possible_edit = self.get_indexed_label_and_edit(
+                    expr=expr, edit_index=edit_index
+                )
 
             if label == 1 and node_label != 1:
                 raise ValueError(
@@ -320,25 +993,199 @@ class QueryProcessor(BaseMethod):
 
             # For the root node we assume
             # it is always a SELECT
-            if expr == parsed_sql_query_1:
+            if expr is nodes[0]:
                 node_label = 1
 
-            a_ast_list.append(
-                QueryASTWord(
-                    expr_name=expr_name,
-                    label=node_label,
-                    expr_depth=expr.depth,
-                    expr=expr,
-                    edit=possible_edit,
-                    char_index_list=char_index_list,
+            subword_indices[ordinal] = len(a_ast_list)
+            if self.add_expression_references:
+                a_ast_list.append(
+                    QueryASTWord(
+                        expr_name=expr_name,
+                        label=node_label,
+                        expr_depth=expr.depth,
+                        expr=expr,
+                        edit=possible_edit,
+                        char_index_list=char_index_list,
+                    )
+                )
+            else:
+                a_ast_list.append(
+                    SlimQueryASTWord(
+                        expr_name=expr_name,
+                        label=node_label,
+                        expr_depth=expr.depth,
+                        char_index_list=char_index_list,
+                    )
+                )
+
+        return a_ast_list, subword_indices
+
+    def _limit_exceeded(self, ex: LimitExceeded) -> LimitExceeded:
+        """Applies the limit strategy to a pair that exceeded a limit.
+
+        Args:
+            ex: The exceeded limit.
+
+        Returns:
+            The exceeded limit if the pair gets labeled uniformly.
+
+        Raises:
+            LimitExceeded: If the limit strategy is "skip".
+        """
+        if self.limit_strategy == "skip":
+            raise ex
+        return ex
+
+    def _check_deadline(
+        self, deadline: Optional[Deadline], limit_exceeded: Optional[LimitExceeded]
+    ) -> Optional[LimitExceeded]:
+        """Checks the deadline between two stages.
+
+        Args:
+            deadline: The deadline of the pair, if any.
+            limit_exceeded: The limit the pair exceeded so far, if any.
+
+        Returns:
+            The exceeded limit if the pair gets labeled uniformly.
+
+        Raises:
+            LimitExceeded: If the deadline passed and the limit strategy
+                is "skip".
+        """
+        if deadline is None or limit_exceeded is not None:
+            return limit_exceeded
+        try:
+            deadline.check()
+        except LimitExceeded as ex:
+            return self._limit_exceeded(ex)
+        return None
+
+    def _process_parsed_gold(
+        self,
+        sql_query_1: str,
+        parsed_sql_query_2: Expression,
+        sql_query_2: str,
+        label: int,
+        gold_distiller: Optional[GoldDiffer] = None,
+        call_stats: Optional[CallStats] = None,
+    ) -> ASTDiffInput:
+        """Constructs a QuerySubword list with an already parsed gold query.
+
+        Args:
+            sql_query_1: The original/wrong query.
+            parsed_sql_query_2: The parsed ideal/gold query.
+            sql_query_2: The normalized ideal/gold query.
+            label: The label if the query is correct.
+            gold_distiller: If set, used to diff against the gold query.
+            call_stats: If set, the statistics of the call are recorded.
+
+        Returns:
+            An instance of ASTDiffInput.
+
+        Raises:
+            LimitExceeded: If the pair exceeds a limit and the limit
+                strategy is "skip".
+        """
+        if call_stats is not None:
+            call_stats.restart()
+        deadline = (
+            Deadline(self.timeout_seconds) if self.timeout_seconds is not None else None
+        )
+        limit_exceeded: Optional[LimitExceeded] = None
+
+        parsed_sql_query_1 = sqlglot.parse_one(
+            sql_query_1, dialect=self.sqlglot_dialect
+        )
+        sql_query_1 = parsed_sql_query_1.sql()  # To make it consistent
+        if call_stats is not None:
+            call_stats.lap("parse")
+
+        if self.max_nodes is not None:
+            try:
+                check_limit(
+                    "max_nodes",
+                    self.max_nodes,
+                    max(
+                        sum(1 for _ in parsed_sql_query_1.walk()),
+                        sum(1 for _ in parsed_sql_query_2.walk()),
+                    ),
                 )
+            except LimitExceeded as ex:
+                limit_exceeded = self._limit_exceeded(ex)
+        limit_exceeded = self._check_deadline(deadline, limit_exceeded)
+
+        self._call_stats = call_stats
+        self._deadline = deadline
+        try:
+            nodes, char_list = self.map_chars_to_nodes(
+                parsed_sql_query=parsed_sql_query_1, sql_query=sql_query_1
             )
+        finally:
+            self._call_stats = None
+            self._deadline = None
+        if call_stats is not None:
+            call_stats.num_nodes = len(nodes)
+            call_stats.lap("map_chars")
+        limit_exceeded = self._check_deadline(deadline, limit_exceeded)
+
+        char_index_lists = self.group_char_indices(nodes=nodes, char_list=char_list)
+        if call_stats is not None:
+            call_stats.lap("group_chars")
+        limit_exceeded = self._check_deadline(deadline, limit_exceeded)
+
+        diff_1_2: Optional[List[Any]] = None
+        if (
+            self.exact_match_fast_path
+            and limit_exceeded is None
+            and sql_query_1 == sql_query_2
+        ):
+            # Identical queries are not diffed, all their nodes are kept
+            diff_1_2 = keep_identical_trees(
+                source=parsed_sql_query_1, target=parsed_sql_query_2
+            )
+            if call_stats is not None:
+                call_stats.exact_match = diff_1_2 is not None
+        if limit_exceeded is None and diff_1_2 is None:
+            try:
+                diff_1_2 = self.diff_queries(
+                    parsed_sql_query_1=parsed_sql_query_1,
+                    parsed_sql_query_2=parsed_sql_query_2,
+                    gold_distiller=gold_distiller,
+                    deadline=deadline,
+                )
+                if call_stats is not None or self.max_edits is not None:
+                    num_edits = sum(
+                        1 for edit in diff_1_2 if not isinstance(edit, Keep)
+                    )
+                    if call_stats is not None:
+                        call_stats.num_edits = num_edits
+                    check_limit("max_edits", self.max_edits, num_edits)
+            except LimitExceeded as ex:
+                limit_exceeded = self._limit_exceeded(ex)
+                diff_1_2 = None
+        if call_stats is not None:
+            call_stats.lap("diff")
+        limit_exceeded = self._check_deadline(deadline, limit_exceeded)
+        if limit_exceeded is not None:
+            diff_1_2 = None
+
+        a_ast_list, subword_indices = self.label_nodes(
+            nodes=nodes,
+            char_index_lists=char_index_lists,
+            query_diff=diff_1_2 if diff_1_2 is not None else [],
+            label=label,
+            uniform_label=label if limit_exceeded is not None else None,
+        )
+        if call_stats is not None:
+            call_stats.lap("labeling")
 
         # The metadata
         metadata = {
             "ast_processor_name": self.get_name(),
             "ast_processor_config": self.config,
         }
+        if limit_exceeded is not None:
+            metadata["limit_exceeded"] = limit_exceeded.as_dict()
 
         return ASTDiffInput(
             gold_query=sql_query_2,
@@ -347,4 +1194,9 @@ class QueryProcessor(BaseMethod):
             processed_query=sql_query_1,
             query_subwords=a_ast_list,
             metadata=metadata,
+            char_subword_map=(
+                char_list.subword_map(subword_indices=subword_indices)
+                if isinstance(char_list, CharNodeMap)
+                else None
+            ),
         )
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from sql_ast_dataset.ast_processing.factory import Factory
@@ -388,6 +389,74 @@ class TestQueryProcessor(unittest.TestCase):
         except Exception:
             self.assertTrue(False)
 
+    def test_process_candidates(self):
+        query_2 = "SELECT song_name, song_release_year FROM singer ORDER BY age LIMIT 1"
+        queries = [
+            (
+                "SELECT name, song_release_year FROM "
+                "singer WHERE age = (SELECT MIN(age) FROM singer)"
+            ),
+            (
+                "SELECT s.Name, s.Song_release_year FROM "
+                "singer AS s, singer_in_concert AS sc "
+                "WHERE s.Singer_ID = sc.Singer_ID "
+                "ORDER BY s.Age ASC LIMIT 1"
+            ),
+            query_2,
+        ]
+        labels = [0, 0, 1]
+        instance = self.factory.build(self.method_name, config_dict={})
+        self.assertIsNotNone(instance)
+
+        ast_diffs = instance.process_candidates(query_2, queries, labels)
+        self.assertEqual(len(ast_diffs), len(queries))
+        for ast_diff, query_1, label in zip(ast_diffs, queries, labels):
+            expected = instance.process(
+                sql_query_1=query_1, sql_query_2=query_2, label=label
+            )
+            self.assertEqual(ast_diff.gold_query, expected.gold_query)
+            self.assertEqual(ast_diff.get_labels(), expected.get_labels())
+            self.assertEqual(
+                ast_diff.query_subword_indices_as_list(),
+                expected.query_subword_indices_as_list(),
+            )
+
+        with self.assertRaises(ValueError):
+            instance.process_candidates(query_2, queries, labels[:1])
+
+    def test_without_expression_references(self):
+        query_1 = "SELECT Name, COUNT(*) FROM singer WHERE age > 20"
+        query_2 = "SELECT COUNT(*) FROM singer"
+        instance = self.factory.build(
+            self.method_name, config_dict={"add_expression_references": False}
+        )
+        self.assertIsNotNone(instance)
+        self.assertIn(
+            "add_expression_references", self.factory.get_parms(self.method_name)
+        )
+
+        ast_diff = instance.process(query_1, query_2, 0)
+        expected = self.factory.build(self.method_name, config_dict={}).process(
+            query_1, query_2, 0
+        )
+        self.assertEqual(ast_diff.get_labels(), expected.get_labels())
+        self.assertEqual(
+            ast_diff.query_subword_indices_as_list(),
+            expected.query_subword_indices_as_list(),
+        )
+        for word, expected_word in zip(
+            ast_diff.query_subwords, expected.query_subwords
+        ):
+            self.assertEqual(word.expr_name, expected_word.expr_name)
+            self.assertEqual(word.expr_depth, expected_word.expr_depth)
+            self.assertIsNone(word.expr)
+            self.assertIsNone(word.edit)
+            self.assertFalse(hasattr(word, "__dict__"))
+        self.assertEqual(
+            pickle.loads(pickle.dumps(ast_diff)).query_subwords,
+            ast_diff.query_subwords,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,304 @@
+"""A persistent, content-addressed cache of processed query pairs."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import sqlglot
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffInput
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled ASTDiffInput changes, older entries are not read
+CACHE_FORMAT_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def code_versions() -> Tuple[str, str]:
+    """Returns the versions of sqlglot and of this package.
+
+    They are part of every key, so results of other parser or diff
+    versions are not served after an upgrade.
+    """
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        package_version = version("sql-ast-dataset")
+    except PackageNotFoundError:
+        # E.g. run from a source checkout
+        package_version = "unknown"
+    return sqlglot.__version__, package_version
+
+
+@dataclass
+class ResultCacheStats:
+    """Class for keeping track of the cache statistics of this process."""
+
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    # Failed reads and writes, e.g. of a locked or read-only file
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def result_cache_key(
+    method_name: str,
+    config: Dict[str, Any],
+    sql_query_1: str,
+    sql_query_2: str,
+    label: int,
+) -> str:
+    """Hashes everything that determines the result of a pair.
+
+    The key includes the versions of sqlglot and of this package.
+
+    Args:
+        method_name: The name of the processing method.
+        config: The configuration of the method that affects the result.
+        sql_query_1: The original/wrong query.
+        sql_query_2: The ideal/gold query.
+        label: The label if the query is correct.
+
+    Returns:
+        The hex SHA-256 of the inputs.
+    """
+    payload = json.dumps(
+        [
+            CACHE_FORMAT_VERSION,
+            *code_versions(),
+            method_name,
+            config,
+            sql_query_1,
+            sql_query_2,
+            label,
+        ],
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Stores processed pairs in a SQLite file, shared by processes.
+
+    Every process opens its own connection on first use, so an instance
+    can be pickled to pool workers. The database runs in WAL mode, readers
+    do not block the writer and concurrent writers wait for each other.
+
+    The size of the stored results is bounded by max_bytes. When it is
+    exceeded, the least recently used entries are evicted until the size
+    is below low_watermark * max_bytes.
+
+    The results are stored slim, see ASTDiffInput.slim, so a hit has no
+    sqlglot expressions or edits.
+
+    The cache never fails a lookup or a store. SQLite, file system and
+    pickling errors are logged and count as a miss or a skipped write.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 1 << 30,
+        low_watermark: float = 0.9,
+        check_every: int = 256,
+        timeout_seconds: float = 30.0,
+    ):
+        """Initializes the cache, the file is opened lazily.
+
+        Args:
+            path: The SQLite file, created if it does not exist.
+            max_bytes: The maximal total size of the pickled results.
+            low_watermark: The fraction of max_bytes an eviction frees up to.
+            check_every: The number of writes of a process between size
+                checks.
+            timeout_seconds: How long a writer waits for a lock.
+        """
+        if max_bytes < 1:
+            raise ValueError(f"max_bytes has to be positive, got {max_bytes}.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self.check_every = check_every
+        self.timeout_seconds = timeout_seconds
+        self.stats = ResultCacheStats()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes_since_check = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Connections can not be shared across processes
+        state["_connection"] = None
+        state["_pid"] = None
+        state["stats"] = ResultCacheStats()
+        state["_writes_since_check"] = 0
+        return state
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection of this process."""
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout_seconds, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: str) -> Optional[ASTDiffInput]:
+        """Returns the cached result or None.
+
+        Args:
+            key: The key of result_cache_key.
+
+        Returns:
+            The cached ASTDiffInput or None.
+        """
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as ex:
+            self._error("read", ex)
+            self.stats.misses += 1
+            return None
+        if row is None:
+            self.stats.misses += 1
+            return None
+        try:
+            result = pickle.loads(row[0])
+        except Exception:  # pylint: disable=broad-except
+            # E.g. written by an incompatible version, it gets replaced
+            self.stats.misses += 1
+            return None
+        try:
+            connection.execute(
+                "UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        except (sqlite3.Error, OSError) as ex:
+            # The result is valid, only its access time is not updated
+            self._error("update", ex)
+        self.stats.hits += 1
+        return result
+
+    def put(self, key: str, result: ASTDiffInput) -> None:
+        """Stores a result, evicting old entries if the cache is full.
+
+        Args:
+            key: The key of result_cache_key.
+            result: The processed pair.
+        """
+        try:
+            value = pickle.dumps(result.slim(), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as ex:  # pylint: disable=broad-except
+            # E.g. a RecursionError of a very deep query
+            self._error("serialization", ex)
+            return
+        if len(value) > self.max_bytes:
+            return
+        try:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self.stats.writes += 1
+            self._writes_since_check += 1
+            if self._writes_since_check >= self.check_every:
+                self._writes_since_check = 0
+                self.evict()
+        except (sqlite3.Error, OSError) as ex:
+            self._error("write", ex)
+
+    def _error(self, operation: str, ex: Exception) -> None:
+        """Logs a failed operation, only the first one as a warning."""
+        self.stats.errors += 1
+        logger.log(
+            logging.WARNING if self.stats.errors == 1 else logging.DEBUG,
+            "Result cache %s of %s failed, it is skipped: %s",
+            operation,
+            self.path,
+            ex,
+        )
+
+    def size_bytes(self) -> int:
+        """Returns the total size of the stored results."""
+        row = self._connect().execute("SELECT SUM(size) FROM results").fetchone()
+        return int(row[0] or 0)
+
+    def __len__(self) -> int:
+        row = self._connect().execute("SELECT COUNT(*) FROM results").fetchone()
+        return int(row[0])
+
+    def evict(self) -> int:
+        """Evicts the least recently used entries if the cache is too large.
+
+        Returns:
+            The number of evicted entries.
+        """
+        connection = self._connect()
+        # One writer at a time, concurrent evictions do not overshoot
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            total = int(
+                connection.execute("SELECT SUM(size) FROM results").fetchone()[0] or 0
+            )
+            if total <= self.max_bytes:
+                connection.execute("COMMIT")
+                return 0
+            target = total - int(self.low_watermark * self.max_bytes)
+            keys = []
+            freed = 0
+            for key, size in connection.execute(
+                "SELECT key, size FROM results ORDER BY accessed"
+            ):
+                keys.append((key,))
+                freed += size
+                if freed >= target:
+                    break
+            connection.executemany("DELETE FROM results WHERE key = ?", keys)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self.stats.evictions += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the statistics."""
+        self._connect().execute("DELETE FROM results")
+        self.stats = ResultCacheStats()
+
+    def close(self) -> None:
+        """Closes the connection of this process."""
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
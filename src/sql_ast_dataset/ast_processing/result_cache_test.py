@@ -0,0 +1,167 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from sql_ast_dataset.ast_processing import result_cache
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure, ASTDiffInput
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.result_cache import ResultCache, result_cache_key
+
+ITEMS = [
+    ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+    ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+    ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+    # Can not be labeled as correct, failures are not cached
+    ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+]
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "results.sqlite")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_key(self):
+        key = result_cache_key("QueryProcessor", {"a": 1, "b": 2}, "q1", "q2", 0)
+        self.assertEqual(len(key), 64)
+        self.assertEqual(
+            key, result_cache_key("QueryProcessor", {"b": 2, "a": 1}, "q1", "q2", 0)
+        )
+        for other in (
+            result_cache_key("Other", {"a": 1, "b": 2}, "q1", "q2", 0),
+            result_cache_key("QueryProcessor", {"a": 1, "b": 3}, "q1", "q2", 0),
+            result_cache_key("QueryProcessor", {"a": 1, "b": 2}, "q2", "q1", 0),
+            result_cache_key("QueryProcessor", {"a": 1, "b": 2}, "q1", "q2", 1),
+        ):
+            self.assertNotEqual(key, other)
+
+        # Results of other sqlglot or package versions are not served
+        with mock.patch.object(
+            result_cache, "code_versions", return_value=("0.0.0", "0.0.0")
+        ):
+            self.assertNotEqual(
+                key, result_cache_key("QueryProcessor", {"a": 1, "b": 2}, "q1", "q2", 0)
+            )
+
+    def test_get_put(self):
+        cache = ResultCache(self.path)
+        ast_diff = ASTDiffInput(query="q1", gold_query="q2", label=0)
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", ast_diff)
+        self.assertEqual(cache.get("key").query, "q1")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+        # A pickled cache opens its own connection
+        loaded = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(loaded.stats.hits, 0)
+        self.assertEqual(loaded.get("key").gold_query, "q2")
+        cache.close()
+        loaded.close()
+
+    def test_eviction(self):
+        ast_diff = ASTDiffInput(query="q" * 100, gold_query="q2", label=0)
+        entry_size = len(pickle.dumps(ast_diff, protocol=pickle.HIGHEST_PROTOCOL))
+        cache = ResultCache(
+            self.path, max_bytes=5 * entry_size, low_watermark=0.6, check_every=1
+        )
+        for index in range(5):
+            cache.put(f"key{index}", ast_diff)
+        self.assertEqual(len(cache), 5)
+        # Recently read entries are kept
+        cache.get("key0")
+        cache.put("key5", ast_diff)
+        self.assertLessEqual(cache.size_bytes(), 3 * entry_size)
+        self.assertIsNotNone(cache.get("key0"))
+        self.assertIsNotNone(cache.get("key5"))
+        self.assertIsNone(cache.get("key1"))
+        self.assertEqual(cache.stats.evictions, 3)
+        cache.close()
+
+    def test_query_processor(self):
+        factory = Factory()
+        instance = factory.build("QueryProcessor", {"result_cache_path": self.path})
+        stats = instance.enable_stats()
+        expected = instance.process_batch(ITEMS, num_workers=0)
+        self.assertEqual(len(instance.result_cache), 3)
+
+        results = instance.process_batch(ITEMS, num_workers=0)
+        self.assertEqual(stats.num_cache_hits, 3)
+        for result, reference in zip(results[:3], expected[:3]):
+            self.assertEqual(result.get_labels(), reference.get_labels())
+            self.assertEqual(
+                result.query_subword_indices_as_list(),
+                reference.query_subword_indices_as_list(),
+            )
+
+        candidates = instance.process_candidates(
+            ITEMS[0][1], [ITEMS[0][0], ITEMS[2][0]], [0, 0]
+        )
+        self.assertEqual(stats.num_cache_hits, 5)
+        self.assertEqual(candidates[1].get_labels(), expected[2].get_labels())
+
+        # A different config does not read the results of another
+        other = factory.build(
+            "QueryProcessor",
+            {"result_cache_path": self.path, "span_mapping": "search"},
+        )
+        other_stats = other.enable_stats()
+        other.process(*ITEMS[0])
+        self.assertEqual(other_stats.num_cache_hits, 0)
+        self.assertEqual(len(other.result_cache), 4)
+
+    def test_process_pool(self):
+        instance = Factory().build("QueryProcessor", {"result_cache_path": self.path})
+        stats = instance.enable_stats()
+        instance.process_batch(ITEMS * 4, num_workers=2, chunk_size=1)
+        self.assertEqual(len(instance.result_cache), 3)
+        results = instance.process_batch(ITEMS * 2, num_workers=2, chunk_size=2)
+        self.assertGreaterEqual(stats.num_cache_hits, 6)
+        self.assertEqual(results[1].get_labels(), [1, 1, 1, 1, 1])
+
+    def test_unusable_file(self):
+        # The directory of the file does not exist
+        path = os.path.join(self.directory.name, "missing", "results.sqlite")
+        instance = Factory().build("QueryProcessor", {"result_cache_path": path})
+        with self.assertLogs(result_cache.logger, level="WARNING"):
+            results = instance.process_batch(ITEMS[:2], num_workers=0)
+        for result in results:
+            self.assertNotIsInstance(result, ASTDiffFailure)
+        self.assertEqual(results[1].get_labels(), [1, 1, 1, 1, 1])
+        self.assertEqual(instance.result_cache.stats.hits, 0)
+        self.assertEqual(instance.result_cache.stats.writes, 0)
+        self.assertEqual(instance.result_cache.stats.errors, 4)
+
+    def test_unpicklable_result(self):
+        instance = Factory().build("QueryProcessor", {"result_cache_path": self.path})
+        with mock.patch.object(
+            result_cache.pickle, "dumps", side_effect=RecursionError("too deep")
+        ), self.assertLogs(result_cache.logger, level="WARNING"):
+            result = instance.process(*ITEMS[1])
+        self.assertEqual(result.get_labels(), [1, 1, 1, 1, 1])
+        self.assertEqual(instance.result_cache.stats.errors, 1)
+        self.assertEqual(instance.result_cache.stats.writes, 0)
+
+        # The results are stored without their expressions
+        instance.process(*ITEMS[1])
+        cached = instance.process(*ITEMS[1])
+        self.assertEqual(instance.result_cache.stats.hits, 1)
+        self.assertIsNone(cached.query_subwords[0].expr)
+        self.assertEqual(cached.get_labels(), [1, 1, 1, 1, 1])
+
+    def test_invalid_config(self):
+        self.assertIsNone(
+            Factory().build(
+                "QueryProcessor",
+                {"result_cache_path": self.path, "result_cache_max_bytes": 0},
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
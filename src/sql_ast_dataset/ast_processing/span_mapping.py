@@ -0,0 +1,129 @@
+"""Maps the nodes of a SQL AST to their char spans in the generated SQL."""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlglot.expressions import Expression
+from sqlglot.generator import Generator
+
+# Private use characters that do not occur in the generated SQL
+_SPAN_START = "\ue000"
+_SPAN_SEPARATOR = "\ue001"
+_SPAN_END = "\ue002"
+_SPAN_MARKER_RE = re.compile(f"{_SPAN_START}(\\d+){_SPAN_SEPARATOR}|{_SPAN_END}")
+
+# Node id -> (left, right) char index in the generated SQL
+Spans = Dict[int, Tuple[int, int]]
+
+
+class SpanTrackingGenerator(Generator):
+    """A Generator that marks where the SQL of each node starts and ends.
+
+    The SQL of every node is surrounded by markers while it is generated,
+    so a single generation pass yields the spans of all nodes. Nodes which
+    are not generated on their own (e.g. the If nodes of a Case) or which
+    generate an empty string get no markers.
+    """
+
+    def __init__(self, **opts: Any):
+        """Initializes the generator, see sqlglot.generator.Generator."""
+        super().__init__(**opts)
+        self.span_nodes: List[Expression] = []
+
+    def sql(
+        self,
+        expression: Optional[Any],
+        key: Optional[str] = None,
+        comment: bool = True,
+    ) -> str:
+        """Generates the SQL of the expression surrounded by span markers."""
+        if key is not None or not isinstance(expression, Expression):
+            return super().sql(expression, key=key, comment=comment)
+
+        sql = super().sql(expression, comment=comment)
+        if not sql:
+            return sql
+        ordinal = len(self.span_nodes)
+        self.span_nodes.append(expression)
+        return f"{_SPAN_START}{ordinal}{_SPAN_SEPARATOR}{sql}{_SPAN_END}"
+
+
+def generate_spans(expression: Expression, expected_sql: str) -> Optional[Spans]:
+    """Generates the SQL of the expression once and records each node's span.
+
+    Args:
+        expression: The root of the AST.
+        expected_sql: The SQL of the expression as returned by
+            expression.sql(), the spans index into this string.
+
+    Returns:
+        The spans by node id, or None if the generated SQL differs from
+        expected_sql, in which case the spans can not be used. Nodes that
+        are generated more than once or replaced by the generator are
+        left out.
+    """
+    if any(
+        marker in expected_sql for marker in (_SPAN_START, _SPAN_SEPARATOR, _SPAN_END)
+    ):
+        return None
+
+    # The generator modifies some nodes, e.g. a safe Div, hence the copy
+    expression_copy = expression.copy()
+    original_by_copy_id = {
+        id(copy_node): original_node
+        for original_node, copy_node in zip(expression.walk(), expression_copy.walk())
+    }
+
+    generator = SpanTrackingGenerator()
+    try:
+        marked_sql = generator.sql(expression_copy)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    parts: List[str] = []
+    length = 0
+    position = 0
+    open_spans: List[Tuple[int, int]] = []
+    spans_by_ordinal: Dict[int, Tuple[int, int]] = {}
+    for match in _SPAN_MARKER_RE.finditer(marked_sql):
+        text = marked_sql[position : match.start()]
+        parts.append(text)
+        length += len(text)
+        position = match.end()
+        if match.group(1) is not None:
+            open_spans.append((int(match.group(1)), length))
+        elif open_spans:
+            ordinal, left = open_spans.pop()
+            spans_by_ordinal[ordinal] = (left, length)
+        else:
+            return None
+    parts.append(marked_sql[position:])
+    if open_spans:
+        return None
+
+    # Like Generator.generate
+    sql = "".join(parts)
+    offset = len(sql) - len(sql.lstrip())
+    if sql.strip() != expected_sql:
+        return None
+
+    spans: Spans = {}
+    duplicates = set()
+    for ordinal, (left, right) in spans_by_ordinal.items():
+        original_node = original_by_copy_id.get(id(generator.span_nodes[ordinal]))
+        if original_node is None:
+            # Created by the generator
+            continue
+        node_id = id(original_node)
+        if node_id in spans:
+            duplicates.add(node_id)
+        left = min(max(left - offset, 0), len(expected_sql))
+        right = min(max(right - offset, left), len(expected_sql))
+        # Like Generator.generate, e.g. the leading separator of a FROM
+        node_sql = expected_sql[left:right]
+        left += len(node_sql) - len(node_sql.lstrip())
+        right -= len(node_sql) - len(node_sql.rstrip())
+        spans[node_id] = (left, max(left, right))
+    for node_id in duplicates:
+        del spans[node_id]
+    return spans
@@ -0,0 +1,115 @@
+import unittest
+
+import sqlglot
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.span_mapping import generate_spans
+
+
+class TestSpanMapping(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.queries = [
+            "SELECT * FROM A",
+            (
+                "SELECT T2.Name FROM course_arrange AS T1 JOIN teacher "
+                "AS T2 ON T1.Teacher_ID = T2.Teacher_ID GROUP BY "
+                "T2.Name HAVING COUNT(*) >= 2"
+            ),
+            (
+                "SELECT DISTINCT t.name FROM teacher AS t WHERE NOT "
+                "t.teacher_id IN (SELECT DISTINCT teacher_id "
+                "FROM course_arrange)"
+            ),
+            (
+                "SELECT *, NOT COUNT(CASE WHEN SourceAirport IN ('CVO', 'APG') "
+                "THEN 1 ELSE NULL END) IS NULL AS has_CVO_or_APG FROM flights "
+                "WHERE DestAirport = 'CVO' GROUP BY Airline"
+            ),
+            "/* 1 */ SELECT COUNT(*) FROM ship WHERE lost_in_battle IS NULL",
+            "SELECT E FROM T WHERE E = 1",
+            "SELECT a, a, a FROM t WHERE a = a",
+            "SELECT aa, a FROM aaa WHERE aaa.aa = 'aaa'",
+            "SELECT max(a), Min(b), sum(c) / count(d) FROM t",
+            "SELECT a FROM t WHERE a IN (SELECT a FROM u INTERSECT SELECT a FROM v)",
+            "SELECT CAST(a AS TEXT), -b, a || b FROM t LIMIT 5 OFFSET 2",
+            (
+                "SELECT s.Name, s.Song_release_year FROM "
+                "singer AS s, singer_in_concert AS sc "
+                "WHERE s.Singer_ID = sc.Singer_ID "
+                "ORDER BY s.Age ASC LIMIT 1"
+            ),
+        ]
+
+    def _char_list(self, query, use_spans):
+        expr = sqlglot.parse_one(query, dialect="sqlite")
+        sql = expr.sql()
+        char_list = [None] * len(sql)
+        if use_spans:
+            spans = generate_spans(expression=expr, expected_sql=sql)
+            self.assertIsNotNone(spans)
+            self.instance.dfs_span_node_to_char(
+                node=expr,
+                initial_sql=sql,
+                left=0,
+                right=len(sql),
+                char_list=char_list,
+                spans=spans,
+            )
+        else:
+            self.instance.dfs_simple_node_to_char(
+                node=expr,
+                initial_sql=sql,
+                left=0,
+                right=len(sql),
+                char_list=char_list,
+                check_parent=True,
+            )
+        # Compare the nodes by their DFS position
+        position = {id(node): index for index, node in enumerate(expr.walk())}
+        return [position.get(id(node)) for node in char_list]
+
+    def test_same_as_search(self):
+        for query in self.queries:
+            self.assertEqual(
+                self._char_list(query, use_spans=True),
+                self._char_list(query, use_spans=False),
+                query,
+            )
+
+    def test_expression_unchanged(self):
+        # The generator rewrites a safe division
+        expr = sqlglot.parse_one("SELECT a / b FROM t", dialect="sqlite")
+        before = repr(expr)
+        generate_spans(expression=expr, expected_sql=expr.sql())
+        self.assertEqual(repr(expr), before)
+
+    def test_mismatch(self):
+        expr = sqlglot.parse_one("SELECT a FROM t")
+        self.assertIsNone(generate_spans(expression=expr, expected_sql="SELECT b"))
+
+    def test_processor(self):
+        search = Factory().build(
+            "QueryProcessor", config_dict={"span_mapping": "search"}
+        )
+        self.assertIsNone(
+            Factory().build("QueryProcessor", config_dict={"span_mapping": "regex"})
+        )
+        gold = "SELECT COUNT(*) FROM singer"
+        for query in self.queries:
+            try:
+                expected = search.process(query, gold, 0)
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    self.instance.process(query, gold, 0)
+                continue
+            result = self.instance.process(query, gold, 0)
+            self.assertEqual(result.get_labels(), expected.get_labels())
+            self.assertEqual(
+                result.query_subword_indices_as_list(),
+                expected.query_subword_indices_as_list(),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
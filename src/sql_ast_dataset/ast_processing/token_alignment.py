@@ -0,0 +1,119 @@
+"""Aligns the char level AST nodes with the subword tokens of a tokenizer.
+
+The alignment only needs the offset mapping of the tokenizer, i.e. the
+half-open (start, end) char span of every token in the processed query,
+e.g. return_offsets_mapping=True of the Hugging Face tokenizers. A token
+gets the node of its first char that belongs to a node, so a leading
+space does not hide the node. Special tokens have empty spans and get no
+node.
+"""
+
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, List, Sequence
+
+from sql_ast_dataset.ast_processing.char_node_map import (
+    char_subword_map,
+    require_numpy,
+)
+
+
+@dataclass
+class TokenAlignment:
+    """Class for keeping track of the AST nodes of the tokens of a query."""
+
+    # Index into query_subwords per token, -1 for tokens without a node
+    node_ids: Any
+    # The label of the node per token, fill_value for tokens without a node
+    labels: Any
+
+
+def align_tokens(
+    ast_diff: Any, offset_mapping: Any, fill_value: int = -1
+) -> TokenAlignment:
+    """Aligns the AST nodes of one query with its tokens.
+
+    Args:
+        ast_diff: An instance of ASTDiffInput.
+        offset_mapping: The (start, end) char offsets of the tokens of
+            ast_diff.processed_query, an array-like of shape (tokens, 2).
+        fill_value: The label of tokens that belong to no node.
+
+    Returns:
+        The node ids and labels of the tokens.
+    """
+    return align_tokens_batch([ast_diff], [offset_mapping], fill_value)[0]
+
+
+def align_tokens_batch(
+    ast_diffs: Sequence[Any],
+    offset_mappings: Sequence[Any],
+    fill_value: int = -1,
+) -> List[TokenAlignment]:
+    """Aligns the AST nodes of many queries with their tokens at once.
+
+    The chars and tokens of all queries are concatenated, so a single
+    searchsorted over the chars with a node finds the first node char of
+    every token of the batch.
+
+    Args:
+        ast_diffs: The instances of ASTDiffInput.
+        offset_mappings: For each query the (start, end) char offsets of
+            its tokens, see align_tokens.
+        fill_value: The label of tokens that belong to no node.
+
+    Returns:
+        The node ids and labels of the tokens of each query.
+    """
+    np = require_numpy()
+    if len(ast_diffs) != len(offset_mappings):
+        raise ValueError(
+            f"Got {len(ast_diffs)} queries but {len(offset_mappings)} offset mappings."
+        )
+    if not ast_diffs:
+        return []
+
+    char_maps = [char_subword_map(ast_diff) for ast_diff in ast_diffs]
+    node_labels = [ast_diff.get_labels() for ast_diff in ast_diffs]
+    num_tokens = np.array([len(offsets) for offsets in offset_mappings], dtype=np.int64)
+
+    # The first char and node of every query in the concatenation
+    char_lengths = np.array([len(char_map) for char_map in char_maps], dtype=np.int64)
+    char_starts = np.concatenate(([0], np.cumsum(char_lengths)[:-1]))
+    node_counts = np.array([len(labels) for labels in node_labels], dtype=np.int64)
+    node_starts = np.concatenate(([0], np.cumsum(node_counts)[:-1]))
+
+    # With a last char without a node, so every search finds a position
+    all_chars = np.concatenate(char_maps + [np.full(1, -1, dtype=np.int32)])
+    all_labels = np.fromiter(
+        chain(chain.from_iterable(node_labels), [0]), dtype=np.int32
+    )
+    # One conversion for the whole batch, the tokenizers return lists
+    if all(isinstance(offsets, np.ndarray) for offsets in offset_mappings):
+        all_offsets = np.concatenate(
+            [offsets.reshape(-1, 2) for offsets in offset_mappings]
+        ).astype(np.int64)
+    else:
+        all_offsets = np.array(
+            list(chain.from_iterable(offset_mappings)), dtype=np.int64
+        ).reshape(-1, 2)
+    # Tokens past the end of their query are cut off at its end
+    token_lengths = np.repeat(char_lengths, num_tokens)
+    char_offsets = np.repeat(char_starts, num_tokens)
+    starts = np.minimum(all_offsets[:, 0], token_lengths) + char_offsets
+    ends = np.minimum(all_offsets[:, 1], token_lengths) + char_offsets
+
+    node_chars = np.append(np.flatnonzero(all_chars >= 0), len(all_chars) - 1)
+    first_chars = node_chars[np.searchsorted(node_chars, starts)]
+    found = first_chars < ends
+    node_ids = np.where(found, all_chars[first_chars], -1)
+    global_ids = np.where(found, node_ids + np.repeat(node_starts, num_tokens), -1)
+    labels = np.where(found, all_labels[global_ids], fill_value)
+
+    node_ids = node_ids.astype(np.int32)
+    labels = labels.astype(np.int32)
+    bounds = np.cumsum(num_tokens).tolist()
+    return [
+        TokenAlignment(node_ids=node_ids[start:end], labels=labels[start:end])
+        for start, end in zip([0] + bounds[:-1], bounds)
+    ]
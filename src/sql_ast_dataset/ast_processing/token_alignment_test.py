@@ -0,0 +1,81 @@
+import re
+import unittest
+
+import numpy as np
+
+from sql_ast_dataset.ast_processing.char_node_map import char_subword_map
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.token_alignment import (
+    align_tokens,
+    align_tokens_batch,
+)
+
+PAIRS = [
+    ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+    ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+    ("SELECT name FROM t WHERE age > 20", "SELECT name FROM t WHERE age < 20", 0),
+]
+
+
+def tokenize(text):
+    """A tokenizer with leading spaces and special tokens at both ends."""
+    offsets = [(0, 0)]
+    offsets += [match.span() for match in re.finditer(r"\s*(\w+|\S)", text)]
+    return offsets + [(0, 0)]
+
+
+def align_reference(ast_diff, offset_mapping, fill_value=-1):
+    """The alignment as a loop over the chars of each token."""
+    char_map = char_subword_map(ast_diff).tolist()
+    labels = ast_diff.get_labels()
+    node_ids = []
+    for start, end in offset_mapping:
+        nodes = [node for node in char_map[start:end] if node >= 0]
+        node_ids.append(nodes[0] if nodes else -1)
+    return node_ids, [labels[node] if node >= 0 else fill_value for node in node_ids]
+
+
+class TestTokenAlignment(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.ast_diffs = [self.instance.process(*pair) for pair in PAIRS]
+
+    def test_align_tokens(self):
+        ast_diff = self.ast_diffs[0]
+        offset_mapping = tokenize(ast_diff.processed_query)
+        alignment = align_tokens(ast_diff, offset_mapping, fill_value=-100)
+        node_ids, labels = align_reference(ast_diff, offset_mapping, -100)
+        self.assertEqual(alignment.node_ids.tolist(), node_ids)
+        self.assertEqual(alignment.labels.tolist(), labels)
+        self.assertEqual(alignment.node_ids.dtype, np.int32)
+        # The special tokens have no node
+        self.assertEqual(alignment.labels[[0, -1]].tolist(), [-100, -100])
+        self.assertTrue(np.all(alignment.node_ids[1:-1] >= 0))
+
+    def test_batch(self):
+        offset_mappings = [
+            tokenize(ast_diff.processed_query) for ast_diff in self.ast_diffs
+        ]
+        # Tokens without offsets and past the end of the query
+        offset_mappings[1] = offset_mappings[1] + [(100, 120)]
+        offset_mappings.append(np.zeros((0, 2), dtype=np.int64))
+        ast_diffs = self.ast_diffs + [self.ast_diffs[0]]
+
+        alignments = align_tokens_batch(ast_diffs, offset_mappings)
+        self.assertEqual(len(alignments), 4)
+        for ast_diff, offset_mapping, alignment in zip(
+            ast_diffs, offset_mappings, alignments
+        ):
+            node_ids, labels = align_reference(ast_diff, offset_mapping)
+            self.assertEqual(alignment.node_ids.tolist(), node_ids)
+            self.assertEqual(alignment.labels.tolist(), labels)
+        self.assertEqual(alignments[1].node_ids[-1], -1)
+        self.assertEqual(alignments[3].node_ids.shape, (0,))
+
+        self.assertEqual(align_tokens_batch([], []), [])
+        with self.assertRaises(ValueError):
+            align_tokens_batch(ast_diffs, offset_mappings[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
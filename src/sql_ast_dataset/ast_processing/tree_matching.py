@@ -0,0 +1,169 @@
+"""Matching of identical (sub)trees without running the full diff."""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from sqlglot.diff import IGNORED_LEAF_EXPRESSION_TYPES, Keep
+from sqlglot.expressions import Expression
+
+
+def keep_identical_trees(
+    source: Expression, target: Expression
+) -> Optional[List[Keep]]:
+    """Returns the edit script of two identical trees.
+
+    The trees are walked in parallel and every pair of nodes is kept,
+    like sqlglot.diff does for identical trees, up to the order of the
+    edits.
+
+    Only the shape and the node types are compared, the caller has to
+    make sure that both trees have the same SQL.
+
+    Args:
+        source: The source expression.
+        target: The target expression.
+
+    Returns:
+        A Keep edit for each node that sqlglot.diff considers, or None if
+        the trees differ in shape or node types.
+    """
+    edits: List[Keep] = []
+    source_nodes = source.walk()
+    target_nodes = target.walk()
+    for source_node in source_nodes:
+        target_node = next(target_nodes, None)
+        if target_node is None or type(source_node) is not type(target_node):
+            return None
+        if source_node is not source and (
+            source_node.arg_key != target_node.arg_key
+            or source_node.index != target_node.index
+        ):
+            # The roots may sit at different positions of their parents
+            return None
+        if isinstance(source_node, IGNORED_LEAF_EXPRESSION_TYPES):
+            continue
+        edits.append(Keep(source=source_node, target=target_node))
+    if next(target_nodes, None) is not None:
+        return None
+    return edits
+
+
+def is_leaf(node: Expression) -> bool:
+    """Returns if a node is a leaf for the diff, like sqlglot.diff._get_leaves."""
+    return not any(
+        not isinstance(child, IGNORED_LEAF_EXPRESSION_TYPES)
+        for child in node.iter_expressions()
+    )
+
+
+def _arg_fingerprint(value: Any, fingerprints: Dict[int, int]) -> Any:
+    """The hashable form of an arg, child expressions by their fingerprint."""
+    if isinstance(value, Expression):
+        return fingerprints[id(value)]
+    # Like sqlglot, which compares strings case-insensitively
+    return value.lower() if type(value) is str else value
+
+
+def subtree_fingerprints(root: Expression) -> Dict[int, int]:
+    """Computes a Merkle style fingerprint of every subtree.
+
+    The fingerprint of a node combines its type and args, where child
+    expressions contribute their fingerprint. Therefore all nodes are
+    fingerprinted in one bottom-up pass, instead of hashing each subtree
+    again like the hash of sqlglot expressions does. Equal subtrees in
+    the sense of sqlglot get the same fingerprint.
+
+    Args:
+        root: The root expression.
+
+    Returns:
+        The fingerprint of each node, keyed by the id of the node.
+    """
+    fingerprints: Dict[int, int] = {}
+    # In the reversed DFS pre-order all children come before their parent
+    for node in reversed(list(root.walk())):
+        if type(node).hashable_args is not Expression.hashable_args:
+            # E.g. Identifier and Literal define their own (leaf) args
+            fingerprints[id(node)] = hash((type(node), node.hashable_args))
+            continue
+        fingerprints[id(node)] = hash(
+            (
+                type(node),
+                frozenset(
+                    (
+                        key,
+                        (
+                            tuple(_arg_fingerprint(v, fingerprints) for v in value)
+                            if type(value) is list
+                            else _arg_fingerprint(value, fingerprints)
+                        ),
+                    )
+                    for key, value in node.args.items()
+                    if not (
+                        value is None
+                        or value is False
+                        or (type(value) is list and not value)
+                    )
+                ),
+            )
+        )
+    return fingerprints
+
+
+class SubtreeIndex:
+    """Finds the subtrees of a tree that occur exactly once."""
+
+    def __init__(self, root: Expression):
+        """Fingerprints the tree.
+
+        Args:
+            root: The root expression.
+        """
+        self.root = root
+        self.fingerprints = subtree_fingerprints(root)
+        self.counts = Counter(self.fingerprints.values())
+        self._unique_nodes: Optional[Dict[int, Expression]] = None
+
+    def unique_node(self, fingerprint: int) -> Optional[Expression]:
+        """Returns the node with the fingerprint if it is the only one."""
+        if self._unique_nodes is None:
+            self._unique_nodes = {
+                self.fingerprints[id(node)]: node
+                for node in self.root.walk()
+                if self.counts[self.fingerprints[id(node)]] == 1
+            }
+        return self._unique_nodes.get(fingerprint, None)
+
+
+def match_identical_subtrees(source: SubtreeIndex, target: SubtreeIndex) -> List[Keep]:
+    """Pairs the largest subtrees that occur exactly once on both sides.
+
+    The source tree is searched top-down, a subtree whose fingerprint is
+    unique in both trees is kept as a whole and not searched further.
+
+    Args:
+        source: The index of the source tree.
+        target: The index of the target tree.
+
+    Returns:
+        A Keep edit for each node pair of the matched subtrees that
+        sqlglot.diff considers.
+    """
+    edits: List[Keep] = []
+    stack = [source.root]
+    while stack:
+        node = stack.pop()
+        fingerprint = source.fingerprints[id(node)]
+        if source.counts[fingerprint] == 1:
+            target_node = target.unique_node(fingerprint)
+            if target_node is not None:
+                kept = keep_identical_trees(source=node, target=target_node)
+                if kept is not None:
+                    edits.extend(kept)
+                    continue
+        stack.extend(
+            child
+            for child in node.iter_expressions()
+            if not isinstance(child, IGNORED_LEAF_EXPRESSION_TYPES)
+        )
+    return edits
@@ -0,0 +1,131 @@
+import unittest
+
+import sqlglot
+from sqlglot.diff import Keep
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.ast_processing.gold_change_distiller import GoldChangeDistiller
+from sql_ast_dataset.ast_processing.tree_matching import (
+    SubtreeIndex,
+    keep_identical_trees,
+    match_identical_subtrees,
+    subtree_fingerprints,
+)
+
+QUERIES = [
+    "SELECT Name, COUNT(*) FROM singer WHERE age > 20",
+    "SELECT T1.name FROM singer AS T1 JOIN concert AS T2 ON T1.id = T2.singer_id",
+    "SELECT name FROM singer WHERE id IN (SELECT singer_id FROM concert) LIMIT 1",
+    "SELECT CASE WHEN age > 20 THEN 'old' ELSE 'young' END FROM singer",
+]
+
+
+class TestTreeMatching(unittest.TestCase):
+    def test_keep_identical_trees(self):
+        for query in QUERIES:
+            source = sqlglot.parse_one(query)
+            target = sqlglot.parse_one(query)
+            edits = keep_identical_trees(source=source, target=target)
+            expected = sqlglot.diff(source, target)
+            self.assertIsNotNone(edits)
+            self.assertTrue(all(isinstance(edit, Keep) for edit in expected))
+            self.assertEqual(
+                sorted(edit.source.sql() for edit in edits),
+                sorted(edit.source.sql() for edit in expected),
+            )
+            for edit in edits:
+                self.assertEqual(edit.source, edit.target)
+
+    def test_different_trees(self):
+        source = sqlglot.parse_one(QUERIES[0])
+        for query in ("SELECT Name FROM singer", "SELECT COUNT(*) FROM singer"):
+            self.assertIsNone(
+                keep_identical_trees(source=source, target=sqlglot.parse_one(query))
+            )
+
+    def test_processor_fast_path(self):
+        factory = Factory()
+        fast = factory.build("QueryProcessor", config_dict={})
+        slow = factory.build(
+            "QueryProcessor", config_dict={"exact_match_fast_path": False}
+        )
+        stats = fast.enable_stats()
+        for query in QUERIES:
+            for label in (0, 1):
+                # The same normalized SQL
+                result = fast.process("  ".join(query.split()), query, label)
+                expected = slow.process("  ".join(query.split()), query, label)
+                self.assertEqual(result.get_labels(), expected.get_labels())
+                self.assertEqual(
+                    result.query_subword_indices_as_list(),
+                    expected.query_subword_indices_as_list(),
+                )
+                self.assertEqual(
+                    [type(qs.edit) for qs in result.query_subwords],
+                    [type(qs.edit) for qs in expected.query_subwords],
+                )
+        self.assertEqual(stats.num_exact_matches, 2 * len(QUERIES))
+        self.assertEqual(stats.num_edits, 0)
+
+        fast.process(QUERIES[0], "SELECT Name FROM singer", 0)
+        self.assertEqual(stats.num_exact_matches, 2 * len(QUERIES))
+
+    def test_subtree_fingerprints(self):
+        for query in QUERIES + ["SELECT a FROM t WHERE a = 'A' AND A = 'a'"]:
+            source = sqlglot.parse_one(query)
+            target = sqlglot.parse_one(query.lower())
+            source_fingerprints = subtree_fingerprints(source)
+            target_fingerprints = subtree_fingerprints(target)
+            # Equal fingerprints for exactly the nodes sqlglot considers equal
+            for source_node in source.walk():
+                for target_node in target.walk():
+                    self.assertEqual(
+                        source_fingerprints[id(source_node)]
+                        == target_fingerprints[id(target_node)],
+                        source_node == target_node,
+                    )
+
+    def test_match_identical_subtrees(self):
+        edits = match_identical_subtrees(
+            source=SubtreeIndex(sqlglot.parse_one(QUERIES[0])),
+            target=SubtreeIndex(
+                sqlglot.parse_one("SELECT COUNT(*) FROM singer WHERE age > 30")
+            ),
+        )
+        self.assertEqual(
+            sorted(edit.source.sql() for edit in edits),
+            ["*", "COUNT(*)", "FROM singer", "age", "singer"],
+        )
+        for edit in edits:
+            self.assertEqual(edit.source, edit.target)
+
+    def test_prematch_subtrees(self):
+        target = sqlglot.parse_one(
+            "SELECT T1.name FROM singer AS T1 JOIN concert AS T2 "
+            "ON T1.id = T2.singer_id WHERE T2.year = 2014"
+        )
+        distiller = GoldChangeDistiller(target=target)
+        for query in QUERIES[:3]:
+            source = sqlglot.parse_one(query)
+            expected = distiller.diff_source(source)
+            edits = distiller.diff_source(source, prematch_subtrees=True)
+            self.assertEqual(
+                sorted((type(e).__name__, repr(e)) for e in edits),
+                sorted((type(e).__name__, repr(e)) for e in expected),
+            )
+
+    def test_processor_prematching(self):
+        factory = Factory()
+        instance = factory.build("QueryProcessor", config_dict={})
+        prematching = factory.build(
+            "QueryProcessor", config_dict={"subtree_prematching": True}
+        )
+        gold_query = "SELECT COUNT(*) FROM singer WHERE age > 30"
+        for query in QUERIES:
+            expected = instance.process(query, gold_query, 0)
+            result = prematching.process(query, gold_query, 0)
+            self.assertEqual(result.get_labels(), expected.get_labels())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1 @@
+"""A module to benchmark the AST processing."""
@@ -0,0 +1,151 @@
+"""Label agreement between the diff engines of the QueryProcessor."""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffInput
+from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+from sql_ast_dataset.ast_processing.factory import Factory
+
+
+@dataclass
+class AgreementReport:
+    """Class for keeping track of the agreement of an engine with a reference."""
+
+    engine: str
+    reference: str
+    num_pairs: int = 0
+    num_compared: int = 0  # Pairs both engines could label
+    num_identical: int = 0  # Pairs with the same labels for all nodes
+    num_nodes: int = 0
+    num_agreeing_nodes: int = 0
+    num_reference_failures: int = 0
+    num_engine_failures: int = 0
+    reference_seconds: float = 0.0
+    engine_seconds: float = 0.0
+    disagreements: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def node_agreement(self) -> float:
+        """The fraction of the compared nodes with the same label."""
+        return self.num_agreeing_nodes / self.num_nodes if self.num_nodes else 1.0
+
+    @property
+    def pair_agreement(self) -> float:
+        """The fraction of the compared pairs with the same labels."""
+        return self.num_identical / self.num_compared if self.num_compared else 1.0
+
+
+def _timed_process(
+    method: BaseMethod, item: Tuple[str, str, int]
+) -> Tuple[Optional[ASTDiffInput], float]:
+    """Processes a pair, returns None instead of raising."""
+    start = time.perf_counter()
+    try:
+        ast_diff = method.process(
+            sql_query_1=item[0], sql_query_2=item[1], label=item[2]
+        )
+    except Exception:  # pylint: disable=broad-except
+        ast_diff = None
+    return ast_diff, time.perf_counter() - start
+
+
+def compare_diff_engines(
+    items: Iterable[Tuple[str, str, int]],
+    engine: str,
+    reference: str = "sqlglot",
+    config: Optional[Dict[str, Any]] = None,
+    max_disagreements: int = 10,
+) -> AgreementReport:
+    """Labels every pair with both engines and compares the node labels.
+
+    Args:
+        items: The (sql_query_1, sql_query_2, label) triples.
+        engine: The diff_engine to evaluate.
+        reference: The diff_engine to compare with.
+        config: The other settings of the QueryProcessor.
+        max_disagreements: The number of disagreeing pairs to keep as
+            examples.
+
+    Returns:
+        The agreement report.
+    """
+    factory = Factory()
+    methods = []
+    for diff_engine in (reference, engine):
+        method = factory.build(
+            "QueryProcessor", config_dict=dict(config or {}, diff_engine=diff_engine)
+        )
+        if method is None:
+            raise ValueError(f"Unable to build a QueryProcessor with {diff_engine}.")
+        methods.append(method)
+
+    report = AgreementReport(engine=engine, reference=reference)
+    for item in items:
+        report.num_pairs += 1
+        expected, seconds = _timed_process(methods[0], item)
+        report.reference_seconds += seconds
+        result, seconds = _timed_process(methods[1], item)
+        report.engine_seconds += seconds
+        if expected is None:
+            report.num_reference_failures += 1
+        if result is None:
+            report.num_engine_failures += 1
+        if expected is None or result is None:
+            continue
+
+        report.num_compared += 1
+        expected_labels = expected.get_labels()
+        labels = result.get_labels()
+        report.num_nodes += len(expected_labels)
+        report.num_agreeing_nodes += sum(
+            1 for a, b in zip(expected_labels, labels) if a == b
+        )
+        if labels == expected_labels:
+            report.num_identical += 1
+        elif len(report.disagreements) < max_disagreements:
+            report.disagreements.append(
+                {
+                    "query": item[0],
+                    "gold_query": item[1],
+                    "label": item[2],
+                    "nodes": [
+                        qs.expr_name
+                        for qs, a, b in zip(
+                            expected.query_subwords or [], expected_labels, labels
+                        )
+                        if a != b
+                    ],
+                    "reference_labels": expected_labels,
+                    "engine_labels": labels,
+                }
+            )
+    return report
+
+
+def format_agreement(report: AgreementReport) -> str:
+    """Formats the agreement report as text.
+
+    Args:
+        report: The agreement report.
+
+    Returns:
+        The summary followed by the nodes of the disagreeing pairs.
+    """
+    lines = [
+        f"{report.engine} vs {report.reference}: {report.num_pairs} pairs, "
+        f"{report.num_compared} compared",
+        f"node agreement: {report.node_agreement:.4f} "
+        f"({report.num_agreeing_nodes}/{report.num_nodes})",
+        f"pair agreement: {report.pair_agreement:.4f} "
+        f"({report.num_identical}/{report.num_compared})",
+        f"failures: {report.reference}={report.num_reference_failures} "
+        f"{report.engine}={report.num_engine_failures}",
+        f"time: {report.reference}={report.reference_seconds:.3f}s "
+        f"{report.engine}={report.engine_seconds:.3f}s",
+    ]
+    for disagreement in report.disagreements:
+        nodes = ", ".join(node[:40] for node in disagreement["nodes"])
+        lines.append(f"- {disagreement['query'][:80]}: {nodes}")
+    return "\n".join(lines)
@@ -0,0 +1,35 @@
+import unittest
+
+from sql_ast_dataset.benchmarks.diff_agreement import (
+    compare_diff_engines,
+    format_agreement,
+)
+
+
+class TestDiffAgreement(unittest.TestCase):
+    def test_compare_diff_engines(self):
+        items = [
+            ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+            ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+            # Can not be labeled as correct
+            ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+        ]
+        report = compare_diff_engines(items, engine="sqlglot")
+        self.assertEqual(report.num_pairs, 3)
+        self.assertEqual(report.num_compared, 2)
+        self.assertEqual(report.num_reference_failures, 1)
+        self.assertEqual(report.num_engine_failures, 1)
+        self.assertEqual(report.node_agreement, 1.0)
+        self.assertEqual(report.pair_agreement, 1.0)
+        self.assertEqual(report.disagreements, [])
+
+        report = compare_diff_engines(items, engine="anchored")
+        self.assertEqual(report.num_compared, 2)
+        self.assertIn("anchored vs sqlglot: 3 pairs", format_agreement(report))
+
+        with self.assertRaises(ValueError):
+            compare_diff_engines(items, engine="gumtree")
+
+
+if __name__ == "__main__":
+    unittest.main()
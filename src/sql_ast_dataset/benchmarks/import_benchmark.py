@@ -0,0 +1,123 @@
+"""Start-up benchmarks, each statement is timed in a fresh interpreter."""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+_FACTORY = "from sql_ast_dataset.ast_processing.factory import Factory"
+
+# What short-lived workers typically do after the start of the interpreter
+IMPORT_STATEMENTS: Dict[str, str] = {
+    "sqlglot": "import sqlglot",
+    "factory": f"{_FACTORY}; Factory().get_supported_methods()",
+    "get_parms": f"{_FACTORY}; Factory().get_parms('QueryProcessor')",
+    "build": f"{_FACTORY}; Factory().build('QueryProcessor', config_dict={{}})",
+}
+
+# Prints the duration of the statement and if it imported sqlglot
+_TIMER = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "sqlglot": "sqlglot" in sys.modules}}))
+"""
+
+
+@dataclass
+class ImportTimeResult:
+    """Class for keeping track of the start-up times of one statement."""
+
+    name: str
+    statement: str
+    seconds: List[float] = field(default_factory=list)
+    imports_sqlglot: bool = False
+    error: Optional[str] = None
+
+    @property
+    def median_seconds(self) -> float:
+        """The median of the measured durations."""
+        return statistics.median(self.seconds) if self.seconds else 0.0
+
+
+def _package_root() -> str:
+    """The directory that contains the sql_ast_dataset package."""
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def time_statement(name: str, statement: str, repeat: int = 5) -> ImportTimeResult:
+    """Times a statement in fresh interpreters.
+
+    Args:
+        name: The name of the measurement.
+        statement: The Python statement, e.g. an import.
+        repeat: The number of interpreters.
+
+    Returns:
+        The duration of each run in seconds.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (_package_root(), env.get("PYTHONPATH")) if path
+    )
+    result = ImportTimeResult(name=name, statement=statement)
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(statement=statement)],
+            capture_output=True,
+            env=env,
+            text=True,
+        )
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines()
+            result.error = lines[-1] if lines else f"exit code {process.returncode}"
+            break
+        measurement = json.loads(process.stdout.strip().splitlines()[-1])
+        result.seconds.append(measurement["seconds"])
+        result.imports_sqlglot = measurement["sqlglot"]
+    return result
+
+
+def run_import_benchmarks(
+    statements: Optional[Dict[str, str]] = None, repeat: int = 5
+) -> List[ImportTimeResult]:
+    """Times each statement in fresh interpreters.
+
+    Args:
+        statements: The statements by name, IMPORT_STATEMENTS by default.
+        repeat: The number of interpreters per statement.
+
+    Returns:
+        A result per statement.
+    """
+    statements = statements if statements is not None else IMPORT_STATEMENTS
+    return [
+        time_statement(name=name, statement=statement, repeat=repeat)
+        for name, statement in statements.items()
+    ]
+
+
+def format_import_report(results: List[ImportTimeResult]) -> str:
+    """Formats the start-up times as a table.
+
+    Args:
+        results: The results of run_import_benchmarks.
+
+    Returns:
+        A line per statement with the median and the minimum time.
+    """
+    lines = [f"{'statement':<12}{'median ms':>12}{'min ms':>12}  sqlglot"]
+    for result in results:
+        if result.error is not None:
+            lines.append(f"{result.name:<12}  error: {result.error}")
+            continue
+        lines.append(
+            f"{result.name:<12}{result.median_seconds * 1000:>12.1f}"
+            f"{min(result.seconds) * 1000:>12.1f}  "
+            f"{'yes' if result.imports_sqlglot else 'no'}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,36 @@
+import unittest
+
+from sql_ast_dataset.benchmarks.import_benchmark import (
+    IMPORT_STATEMENTS,
+    format_import_report,
+    run_import_benchmarks,
+    time_statement,
+)
+
+
+class TestImportBenchmark(unittest.TestCase):
+    def test_factory_is_lazy(self):
+        results = run_import_benchmarks(
+            {name: IMPORT_STATEMENTS[name] for name in ("factory", "build")},
+            repeat=1,
+        )
+        factory, build = results
+        self.assertIsNone(factory.error)
+        self.assertEqual(len(factory.seconds), 1)
+        self.assertFalse(factory.imports_sqlglot)
+        self.assertIsNone(build.error)
+        self.assertTrue(build.imports_sqlglot)
+
+        report = format_import_report(results)
+        self.assertIn("factory", report)
+        self.assertIn("no", report.splitlines()[1])
+
+    def test_error(self):
+        result = time_statement("missing", "import not_a_module", repeat=2)
+        self.assertEqual(result.seconds, [])
+        self.assertIn("ModuleNotFoundError", result.error)
+        self.assertIn("error", format_import_report([result]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+"""Scaling benchmarks of the QueryProcessor labeling pipeline."""
+
+import math
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import sqlglot
+
+from sql_ast_dataset.ast_processing.query_processor import QueryProcessor
+from sql_ast_dataset.benchmarks.query_generator import QueryPair, generate_pairs
+
+# In the order they run in QueryProcessor.process
+STAGES = ("parse", "map_chars", "group_chars", "diff", "labeling")
+
+
+@dataclass
+class BenchmarkResult:
+    """Class for keeping track of the measurements of one query pair."""
+
+    kind: str
+    size: int
+    num_nodes: int = 0
+    query_length: int = 0
+    total_seconds: float = 0.0
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    peak_memory_bytes: int = 0
+    error: Optional[str] = None
+
+
+def time_stages(processor: QueryProcessor, pair: QueryPair) -> Dict[str, float]:
+    """Runs the stages of QueryProcessor.process once and times each of them.
+
+    Args:
+        processor: The configured processor.
+        pair: The query pair.
+
+    Returns:
+        The duration of each stage in seconds.
+    """
+    durations: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    parsed_1 = sqlglot.parse_one(pair.query, dialect=processor.sqlglot_dialect)
+    sql_query_1 = parsed_1.sql()
+    parsed_2 = sqlglot.parse_one(pair.gold_query, dialect=processor.sqlglot_dialect)
+    parsed_2.sql()
+    durations["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nodes, char_list = processor.map_chars_to_nodes(
+        parsed_sql_query=parsed_1, sql_query=sql_query_1
+    )
+    durations["map_chars"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    char_index_lists = processor.group_char_indices(nodes=nodes, char_list=char_list)
+    durations["group_chars"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_diff = processor.diff_queries(
+        parsed_sql_query_1=parsed_1, parsed_sql_query_2=parsed_2
+    )
+    durations["diff"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.label_nodes(
+        nodes=nodes,
+        char_index_lists=char_index_lists,
+        query_diff=query_diff,
+        label=pair.label,
+    )
+    durations["labeling"] = time.perf_counter() - start
+    return durations
+
+
+def benchmark_pair(
+    processor: QueryProcessor, pair: QueryPair, repeat: int = 3
+) -> BenchmarkResult:
+    """Measures the stage times, the total time and the peak memory of a pair.
+
+    The times are the medians over the repetitions. The peak memory is
+    traced in a separate run of QueryProcessor.process, since tracing
+    slows down the code.
+
+    Args:
+        processor: The configured processor.
+        pair: The query pair.
+        repeat: The number of timed repetitions.
+
+    Returns:
+        The measurements.
+    """
+    if repeat < 1:
+        raise ValueError(f"repeat has to be positive, got {repeat}.")
+    result = BenchmarkResult(kind=pair.kind, size=pair.size)
+    try:
+        parsed = sqlglot.parse_one(pair.query, dialect=processor.sqlglot_dialect)
+        result.num_nodes = sum(1 for _ in parsed.walk())
+        result.query_length = len(parsed.sql())
+
+        stage_runs = [time_stages(processor, pair) for _ in range(repeat)]
+        result.stage_seconds = {
+            stage: statistics.median(run[stage] for run in stage_runs)
+            for stage in STAGES
+        }
+
+        totals = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            processor.process(pair.query, pair.gold_query, pair.label)
+            totals.append(time.perf_counter() - start)
+        result.total_seconds = statistics.median(totals)
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        processor.process(pair.query, pair.gold_query, pair.label)
+        _, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+        result.peak_memory_bytes = peak - baseline
+    except Exception as ex:  # pylint: disable=broad-except
+        result.error = f"{type(ex).__name__}: {ex}"
+    return result
+
+
+def run_benchmarks(
+    processor: QueryProcessor,
+    kinds: Iterable[str],
+    sizes: Sequence[int],
+    repeat: int = 3,
+) -> List[BenchmarkResult]:
+    """Benchmarks the query pairs of each kind and size.
+
+    Args:
+        processor: The configured processor.
+        kinds: The kinds of query pairs, see PAIR_GENERATORS.
+        sizes: The sizes of the query pairs.
+        repeat: The number of timed repetitions per pair.
+
+    Returns:
+        The measurements, grouped by kind and ordered by size.
+    """
+    return [
+        benchmark_pair(processor=processor, pair=pair, repeat=repeat)
+        for kind in kinds
+        for pair in generate_pairs(kind=kind, sizes=sizes)
+    ]
+
+
+def growth_exponents(results: Sequence[BenchmarkResult]) -> Dict[str, float]:
+    """Fits total time ~ num_nodes ** exponent for each kind.
+
+    An exponent close to 1 means linear scaling in the AST size, close
+    to 2 quadratic scaling.
+
+    Args:
+        results: The measurements.
+
+    Returns:
+        The least squares exponent of the log-log curve per kind.
+    """
+    points: Dict[str, List[List[float]]] = {}
+    for result in results:
+        if result.error is None and result.num_nodes > 0 and result.total_seconds > 0:
+            points.setdefault(result.kind, []).append(
+                [math.log(result.num_nodes), math.log(result.total_seconds)]
+            )
+
+    exponents: Dict[str, float] = {}
+    for kind, kind_points in points.items():
+        if len(kind_points) < 2:
+            continue
+        mean_x = statistics.mean(x for x, _ in kind_points)
+        mean_y = statistics.mean(y for _, y in kind_points)
+        variance = sum((x - mean_x) ** 2 for x, _ in kind_points)
+        if variance == 0:
+            continue
+        covariance = sum((x - mean_x) * (y - mean_y) for x, y in kind_points)
+        exponents[kind] = covariance / variance
+    return exponents
+
+
+def format_report(results: Sequence[BenchmarkResult]) -> str:
+    """Formats the measurements as a text table.
+
+    Args:
+        results: The measurements.
+
+    Returns:
+        The table with one row per query pair, the times in milliseconds,
+        followed by the growth exponent of each kind.
+    """
+    header = (
+        ["kind", "size", "nodes", "chars", "total_ms"]
+        + [f"{stage}_ms" for stage in STAGES]
+        + ["peak_kib"]
+    )
+    rows = [header]
+    for result in results:
+        if result.error is not None:
+            rows.append([result.kind, str(result.size), "error: " + result.error[:60]])
+            continue
+        rows.append(
+            [
+                result.kind,
+                str(result.size),
+                str(result.num_nodes),
+                str(result.query_length),
+                f"{result.total_seconds * 1000:.2f}",
+            ]
+            + [f"{result.stage_seconds[stage] * 1000:.2f}" for stage in STAGES]
+            + [f"{result.peak_memory_bytes / 1024:.0f}"]
+        )
+
+    widths = [
+        max(len(row[column]) for row in rows if len(row) == len(header))
+        for column in range(len(header))
+    ]
+    lines = [
+        "  ".join(value.rjust(width) for value, width in zip(row, widths))
+        for row in rows
+    ]
+    for kind, exponent in growth_exponents(results).items():
+        lines.append(f"{kind}: total time ~ nodes^{exponent:.2f}")
+    return "\n".join(lines)
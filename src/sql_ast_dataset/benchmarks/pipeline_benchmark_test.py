@@ -0,0 +1,56 @@
+import unittest
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.benchmarks.pipeline_benchmark import (
+    STAGES,
+    BenchmarkResult,
+    format_report,
+    growth_exponents,
+    run_benchmarks,
+)
+from sql_ast_dataset.benchmarks.query_generator import PAIR_GENERATORS, generate_pairs
+
+
+class TestPipelineBenchmark(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+
+    def test_generate_pairs(self):
+        for kind in PAIR_GENERATORS:
+            pairs = generate_pairs(kind, [1, 3])
+            self.assertEqual([pair.size for pair in pairs], [1, 3])
+            self.assertLess(len(pairs[0].query), len(pairs[1].query))
+            for pair in pairs:
+                self.assertNotEqual(pair.query, pair.gold_query)
+        with self.assertRaises(ValueError):
+            generate_pairs("unions", [1])
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(
+            self.instance, kinds=list(PAIR_GENERATORS), sizes=[1, 2], repeat=1
+        )
+        self.assertEqual(len(results), 2 * len(PAIR_GENERATORS))
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(tuple(result.stage_seconds), STAGES)
+            self.assertGreater(result.num_nodes, 0)
+            self.assertGreater(result.total_seconds, 0)
+            self.assertGreater(result.peak_memory_bytes, 0)
+
+        report = format_report(results)
+        for kind in PAIR_GENERATORS:
+            self.assertIn(kind, report)
+
+    def test_growth_exponents(self):
+        results = [
+            BenchmarkResult(kind="joins", size=size, num_nodes=size, total_seconds=t)
+            for size, t in ((10, 0.01), (20, 0.04), (40, 0.16))
+        ]
+        results.append(BenchmarkResult(kind="case", size=1, error="ValueError"))
+        exponents = growth_exponents(results)
+        self.assertEqual(list(exponents), ["joins"])
+        self.assertAlmostEqual(exponents["joins"], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Synthetic query pairs of increasing size for the benchmarks."""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+
+@dataclass
+class QueryPair:
+    """Class for keeping track of a benchmark query pair."""
+
+    kind: str
+    size: int
+    query: str
+    gold_query: str
+    label: int = 0
+
+
+def join_pair(size: int) -> QueryPair:
+    """A chain of size joins, the gold query selects another column."""
+    tables = [f"t{i}" for i in range(size + 1)]
+    joins = " ".join(
+        f"JOIN {table} ON {tables[i]}.id = {table}.parent_id"
+        for i, table in enumerate(tables[1:])
+    )
+    query = (
+        f"SELECT {tables[0]}.name, {tables[-1]}.value FROM {tables[0]} {joins} "
+        f"WHERE {tables[0]}.age > 20"
+    )
+    gold_query = (
+        f"SELECT {tables[0]}.name, {tables[-1]}.amount FROM {tables[0]} {joins} "
+        f"WHERE {tables[0]}.age >= 20"
+    )
+    return QueryPair(kind="joins", size=size, query=query, gold_query=gold_query)
+
+
+def subquery_pair(size: int) -> QueryPair:
+    """Size nested subqueries, the innermost condition differs."""
+
+    def nested(depth: int, value: int) -> str:
+        if depth == 0:
+            return f"SELECT id FROM singer WHERE age > {value}"
+        return (
+            f"SELECT id FROM singer WHERE country = 'c{depth}' "
+            f"AND id IN ({nested(depth - 1, value)})"
+        )
+
+    query = f"SELECT name FROM singer WHERE id IN ({nested(size, 20)})"
+    gold_query = f"SELECT name FROM singer WHERE id IN ({nested(size, 30)})"
+    return QueryPair(kind="subqueries", size=size, query=query, gold_query=gold_query)
+
+
+def case_pair(size: int) -> QueryPair:
+    """Size CASE expressions, the gold query has different ELSE branches.
+
+    Each CASE has a single WHEN branch, since the char mapping can not
+    place the If nodes of a CASE with several WHEN branches.
+    """
+    cases = ", ".join(
+        f"CASE WHEN age = {i} THEN 'g{i}' ELSE 'other' END AS grp{i}"
+        for i in range(size)
+    )
+    gold_cases = ", ".join(
+        f"CASE WHEN age = {i} THEN 'g{i}' ELSE NULL END AS grp{i}" for i in range(size)
+    )
+    query = f"SELECT name, {cases} FROM singer"
+    gold_query = f"SELECT name, {gold_cases} FROM singer"
+    return QueryPair(kind="case", size=size, query=query, gold_query=gold_query)
+
+
+def in_list_pair(size: int) -> QueryPair:
+    """An IN list with size values, the gold query misses the last one."""
+    values = [str(i) for i in range(size + 1)]
+    query = f"SELECT name FROM singer WHERE age IN ({', '.join(values)})"
+    gold_query = f"SELECT name FROM singer WHERE age IN ({', '.join(values[:-1])})"
+    return QueryPair(kind="in_list", size=size, query=query, gold_query=gold_query)
+
+
+def mixed_pair(size: int) -> QueryPair:
+    """A Spider style query with size repetitions of each construct."""
+    conditions = " AND ".join(
+        f"s.age > {i} AND s.country IN ('a{i}', 'b{i}')" for i in range(size)
+    )
+    cases = ", ".join(
+        f"CASE WHEN s.age < {10 * i} THEN {i} ELSE 0 END" for i in range(size)
+    )
+    query = (
+        f"SELECT s.name, COUNT(*), {cases} FROM singer AS s "
+        "JOIN singer_in_concert AS sc ON s.singer_id = sc.singer_id "
+        f"WHERE {conditions} AND s.singer_id IN (SELECT singer_id FROM concert) "
+        "GROUP BY s.name HAVING COUNT(*) > 1 ORDER BY s.age DESC LIMIT 5"
+    )
+    gold_query = (
+        f"SELECT s.name, COUNT(*) FROM singer AS s "
+        "JOIN singer_in_concert AS sc ON s.singer_id = sc.singer_id "
+        f"WHERE {conditions} GROUP BY s.name ORDER BY s.age DESC LIMIT 5"
+    )
+    return QueryPair(kind="mixed", size=size, query=query, gold_query=gold_query)
+
+
+PAIR_GENERATORS: Dict[str, Callable[[int], QueryPair]] = {
+    "joins": join_pair,
+    "subqueries": subquery_pair,
+    "case": case_pair,
+    "in_list": in_list_pair,
+    "mixed": mixed_pair,
+}
+
+
+def generate_pairs(kind: str, sizes: Sequence[int]) -> List[QueryPair]:
+    """Generates one query pair per size.
+
+    Args:
+        kind: One of PAIR_GENERATORS.
+        sizes: The sizes, e.g. the number of joins.
+
+    Returns:
+        The query pairs.
+    """
+    if kind not in PAIR_GENERATORS:
+        raise ValueError(f"Unknown kind {kind}, use one of {list(PAIR_GENERATORS)}.")
+    return [PAIR_GENERATORS[kind](size) for size in sizes]
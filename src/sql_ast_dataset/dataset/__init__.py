@@ -0,0 +1 @@
+"""A module to build datasets from query pairs."""
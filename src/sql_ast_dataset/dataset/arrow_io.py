@@ -0,0 +1,310 @@
+"""Columnar Arrow IPC and Parquet export of labeled query pairs.
+
+The records are stored with list typed columns for the per node names,
+labels, depths and char spans. Live sqlglot objects are left out, so
+the files can be memory-mapped and read by training jobs without
+unpickling or regenerating the dataset.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sql_ast_dataset.ast_processing.ast_diff_types import (
+    AnyQueryASTWord,
+    ASTDiffInput,
+    SlimQueryASTWord,
+)
+from sql_ast_dataset.ast_processing.char_spans import CharSpans
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore[assignment]
+
+COLUMNAR_OUTPUT_FORMATS = ("parquet", "arrow")
+# The columns that are copied from a labeled record
+_RECORD_COLUMNS = (
+    "index",
+    "question",
+    "query",
+    "gold_query",
+    "label",
+    "processed_query",
+    "expr_names",
+    "labels",
+    "expr_depths",
+)
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError(
+            "pyarrow is required for the columnar export, "
+            "install sql-ast-dataset[arrow]."
+        )
+
+
+def infer_columnar_format(path: str) -> Optional[str]:
+    """Infers the columnar format from the file extension.
+
+    Args:
+        path: The file path.
+
+    Returns:
+        "parquet", "arrow" or None if the extension is unknown.
+    """
+    if path.endswith((".parquet", ".pq")):
+        return "parquet"
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        return "arrow"
+    return None
+
+
+def ast_diff_schema() -> Any:
+    """Returns the Arrow schema of the labeled records.
+
+    char_spans holds for each node the half-open char spans flattened
+    into (start_0, end_0, start_1, end_1, ...).
+    """
+    _require_pyarrow()
+    return pa.schema(
+        [
+            pa.field("index", pa.int64()),
+            pa.field("question", pa.string()),
+            pa.field("query", pa.string()),
+            pa.field("gold_query", pa.string()),
+            pa.field("label", pa.int64()),
+            pa.field("processed_query", pa.string()),
+            pa.field("expr_names", pa.list_(pa.string())),
+            pa.field("labels", pa.list_(pa.int32())),
+            pa.field("expr_depths", pa.list_(pa.int32())),
+            pa.field("char_spans", pa.list_(pa.list_(pa.int32()))),
+        ]
+    )
+
+
+def _flat_spans(char_index_list: Iterable[int]) -> List[int]:
+    """Flattens the spans of ascending char indices."""
+    char_spans = (
+        char_index_list
+        if isinstance(char_index_list, CharSpans)
+        else CharSpans(sorted(set(char_index_list)))
+    )
+    return [bound for span in char_spans.spans() for bound in span]
+
+
+def record_to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts a labeled record, see ast_diff_to_record, into a table row.
+
+    Args:
+        record: The labeled record with char_index_lists.
+
+    Returns:
+        A dict with the columns of ast_diff_schema.
+    """
+    row = {name: record.get(name, None) for name in _RECORD_COLUMNS}
+    if row["question"] is not None:
+        # Copied from the input, e.g. an int id, the column holds strings
+        row["question"] = str(row["question"])
+    row["char_spans"] = [
+        _flat_spans(char_index_list)
+        for char_index_list in record.get("char_index_lists", [])
+    ]
+    return row
+
+
+def ast_diff_to_row(ast_diff: ASTDiffInput) -> Dict[str, Any]:
+    """Converts an ASTDiffInput into a table row.
+
+    Args:
+        ast_diff: The processed query pair.
+
+    Returns:
+        A dict with the columns of ast_diff_schema.
+    """
+    query_subwords = ast_diff.query_subwords or []
+    return {
+        "index": None,
+        "question": None,
+        "query": ast_diff.query,
+        "gold_query": ast_diff.gold_query,
+        "label": ast_diff.label,
+        "processed_query": ast_diff.processed_query,
+        "expr_names": [qs.expr_name for qs in query_subwords],
+        "labels": ast_diff.get_labels(),
+        "expr_depths": [qs.expr_depth for qs in query_subwords],
+        "char_spans": [
+            [bound for span in spans for bound in span]
+            for spans in ast_diff.query_subword_spans()
+        ],
+    }
+
+
+class ColumnarWriter:
+    """Writes labeled records incrementally into a Parquet or Arrow IPC file.
+
+    The records are buffered and written as record batches, it can be
+    used in place of JsonlWriter for the labeled records.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        output_format: Optional[str] = None,
+        batch_size: int = 1024,
+    ):
+        """Opens the output file.
+
+        Args:
+            path: The file path.
+            output_format: "parquet" or "arrow", inferred from the extension
+                by default.
+            batch_size: The number of records per record batch.
+        """
+        _require_pyarrow()
+        output_format = output_format or infer_columnar_format(path)
+        if output_format not in COLUMNAR_OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format {output_format}.")
+        if batch_size < 1:
+            raise ValueError(f"batch_size has to be positive, got {batch_size}.")
+        self.path = path
+        self.output_format = output_format
+        self.batch_size = batch_size
+        self.schema = ast_diff_schema()
+        self.count = 0
+        self._rows: List[Dict[str, Any]] = []
+        if output_format == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Writes a single labeled record, see ast_diff_to_record."""
+        self.write_row(record_to_row(record))
+
+    def write_row(self, row: Dict[str, Any]) -> None:
+        """Writes a single row with the columns of ast_diff_schema."""
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self._write_rows()
+
+    def _write_rows(self) -> None:
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def flush(self) -> None:
+        """Writes the buffered records as a record batch."""
+        self._write_rows()
+
+    def close(self) -> None:
+        """Writes the remaining records and closes the file."""
+        self._write_rows()
+        self._writer.close()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def write_ast_diffs(
+    ast_diffs: Iterable[ASTDiffInput],
+    path: str,
+    output_format: Optional[str] = None,
+    batch_size: int = 1024,
+) -> int:
+    """Writes processed query pairs into a Parquet or Arrow IPC file.
+
+    Args:
+        ast_diffs: The processed query pairs.
+        path: The file path.
+        output_format: "parquet" or "arrow", inferred from the extension
+            by default.
+        batch_size: The number of records per record batch.
+
+    Returns:
+        The number of written records.
+    """
+    with ColumnarWriter(
+        path=path, output_format=output_format, batch_size=batch_size
+    ) as writer:
+        for ast_diff in ast_diffs:
+            writer.write_row(ast_diff_to_row(ast_diff))
+    return writer.count
+
+
+def read_table(path: str, memory_map: bool = True) -> Any:
+    """Reads a Parquet or Arrow IPC file as an Arrow table.
+
+    Args:
+        path: The file path.
+        memory_map: If set, the file is memory-mapped. For Arrow IPC files
+            the columns are then read without copying.
+
+    Returns:
+        A pyarrow.Table.
+    """
+    _require_pyarrow()
+    if infer_columnar_format(path) == "parquet":
+        return pq.read_table(path, memory_map=memory_map)
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+    return pa.ipc.open_file(source).read_all()
+
+
+def table_to_ast_diffs(table: Any) -> Iterator[ASTDiffInput]:
+    """Recreates the processed query pairs of a table.
+
+    The query subwords are SlimQueryASTWord records, since the expressions
+    and edits are not stored.
+
+    Args:
+        table: A pyarrow.Table with the columns of ast_diff_schema.
+
+    Returns:
+        An iterator over ASTDiffInput instances.
+    """
+    for batch in table.to_batches():
+        for row in batch.to_pylist():
+            query_subwords: List[AnyQueryASTWord] = [
+                SlimQueryASTWord(
+                    expr_name=expr_name,
+                    label=label,
+                    expr_depth=expr_depth,
+                    char_index_list=CharSpans.from_bytes(
+                        array("i", flat_spans).tobytes()
+                    ),
+                )
+                for expr_name, label, expr_depth, flat_spans in zip(
+                    row["expr_names"],
+                    row["labels"],
+                    row["expr_depths"],
+                    row["char_spans"],
+                )
+            ]
+            yield ASTDiffInput(
+                gold_query=row["gold_query"],
+                query=row["query"],
+                label=row["label"],
+                processed_query=row["processed_query"],
+                query_subwords=query_subwords,
+                metadata={"index": row["index"], "question": row["question"]},
+            )
+
+
+def load_ast_diffs(path: str, memory_map: bool = True) -> List[ASTDiffInput]:
+    """Loads the processed query pairs of a Parquet or Arrow IPC file.
+
+    Args:
+        path: The file path.
+        memory_map: See read_table.
+
+    Returns:
+        The ASTDiffInput instances, without expr and edit.
+    """
+    return list(table_to_ast_diffs(read_table(path, memory_map=memory_map)))
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.dataset.arrow_io import (
+    load_ast_diffs,
+    read_table,
+    write_ast_diffs,
+)
+from sql_ast_dataset.dataset.cli import main
+
+
+class TestArrowIO(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.instance = Factory().build("QueryProcessor", config_dict={})
+        self.ast_diffs = [
+            self.instance.process(
+                "SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0
+            ),
+            self.instance.process(
+                "SELECT a, a FROM t WHERE a = 1", "SELECT a FROM t", 0
+            ),
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_round_trip(self):
+        for name in ("out.parquet", "out.arrow"):
+            path = self._path(name)
+            self.assertEqual(write_ast_diffs(self.ast_diffs, path, batch_size=1), 2)
+            loaded = load_ast_diffs(path)
+            self.assertEqual(len(loaded), len(self.ast_diffs))
+            for result, expected in zip(loaded, self.ast_diffs):
+                self.assertEqual(result.query, expected.query)
+                self.assertEqual(result.gold_query, expected.gold_query)
+                self.assertEqual(result.label, expected.label)
+                self.assertEqual(result.get_labels(), expected.get_labels())
+                self.assertEqual(
+                    [qs.expr_name for qs in result.query_subwords],
+                    [qs.expr_name for qs in expected.query_subwords],
+                )
+                self.assertEqual(
+                    result.query_subword_indices_as_list(),
+                    expected.query_subword_indices_as_list(),
+                )
+                self.assertIsNone(result.query_subwords[0].expr)
+
+    def test_cli(self):
+        input_path = self._path("in.jsonl")
+        output_path = self._path("out.parquet")
+        with open(input_path, "w", encoding="utf-8") as stream:
+            for record in (
+                {
+                    "question": 7,
+                    "query": "SELECT Name FROM singer",
+                    "gold_query": "SELECT 1",
+                },
+                {"query": "SELECT 1"},
+            ):
+                stream.write(json.dumps(dict(record, label=0)) + "\n")
+
+        rc = main(["build", input_path, output_path, "--num-workers", "0"])
+        self.assertEqual(rc, 0)
+        table = read_table(output_path)
+        self.assertEqual(table.num_rows, 1)
+        self.assertEqual(table.column("index").to_pylist(), [0])
+        self.assertEqual(table.column("question").to_pylist(), ["7"])
+        # "SELECT Name FROM singer", the spans are flattened (start, end) pairs
+        self.assertEqual(
+            table.column("char_spans").to_pylist(),
+            [[[0, 7, 11, 12], [7, 11], [12, 17], [17, 23]]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+"""Streaming dataset builder on top of the AST processing methods."""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure
+from sql_ast_dataset.ast_processing.base_ast_processor import BaseMethod
+from sql_ast_dataset.ast_processing.batch_processing import BatchItem
+from sql_ast_dataset.dataset.dataset_io import (
+    MalformedRecord,
+    RecordWriter,
+    ast_diff_failure_to_record,
+    ast_diff_to_record,
+)
+from sql_ast_dataset.dataset.sharding import shard_of
+
+
+@dataclass
+class FieldNames:
+    """Class for keeping track of the input field names of a record."""
+
+    query: str = "query"
+    gold_query: str = "gold_query"
+    label: str = "label"
+    question: Optional[str] = "question"
+
+
+@dataclass
+class BuildSummary:
+    """Class for keeping track of the outcome of a dataset build."""
+
+    num_read: int = 0
+    num_written: int = 0
+    num_failed: int = 0
+    num_skipped: int = 0  # Already committed by an earlier run
+
+
+class DatasetBuilder:
+    """Labels a stream of records and writes them out incrementally."""
+
+    def __init__(
+        self,
+        method: BaseMethod,
+        field_names: Optional[FieldNames] = None,
+        num_workers: Optional[int] = None,
+        chunk_size: int = 64,
+        num_shards: int = 1,
+        shard_id: int = 0,
+    ):
+        """Initializes the builder.
+
+        Args:
+            method: The configured AST processing method.
+            field_names: The names of the input fields.
+            num_workers: The number of worker processes, see
+                BaseMethod.iter_process_batch.
+            chunk_size: The number of pairs sent to a worker at once.
+            num_shards: The number of shards the input is split into,
+                see sharding.shard_of.
+            shard_id: The shard that is labeled, the other records are
+                skipped.
+        """
+        if not 0 <= shard_id < num_shards:
+            raise ValueError(
+                f"shard_id has to be in [0, {num_shards}), got {shard_id}."
+            )
+        self.method = method
+        self.field_names = field_names if field_names is not None else FieldNames()
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+
+    def record_to_item(self, record: Dict[str, Any]) -> BatchItem:
+        """Extracts the query pair of a record.
+
+        Args:
+            record: The input record.
+
+        Returns:
+            The (sql_query_1, sql_query_2, label) triple.
+
+        Raises:
+            ValueError: If the record is a MalformedRecord.
+        """
+        if isinstance(record, MalformedRecord):
+            raise record.error
+        return (
+            str(record[self.field_names.query]),
+            str(record[self.field_names.gold_query]),
+            int(record[self.field_names.label]),
+        )
+
+    def in_shard(self, index: int, record: Dict[str, Any]) -> bool:
+        """Checks if a record belongs to the shard of this builder.
+
+        Records without a gold query are assigned by their input index.
+
+        Args:
+            index: The input index of the record.
+            record: The input record.
+
+        Returns:
+            True if the record is labeled by this builder.
+        """
+        if self.num_shards == 1:
+            return True
+        try:
+            gold_query = record[self.field_names.gold_query]
+        except (KeyError, TypeError):
+            return index % self.num_shards == self.shard_id
+        return shard_of(str(gold_query), self.num_shards) == self.shard_id
+
+    def iter_labeled(
+        self, records: Iterable[Dict[str, Any]], start_index: int = 0
+    ) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+        """Labels the records lazily and in input order.
+
+        Only the records that are currently processed are kept in memory.
+        Records of other shards are skipped, the output keeps the input
+        index of all records.
+
+        Args:
+            records: The input records.
+            start_index: The input index of the first record, e.g. when
+                resuming a build.
+
+        Returns:
+            An iterator over (success, output_record). The output record
+            contains the input index and question next to the labels, or
+            the error if the record could not be processed.
+        """
+        in_flight: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        invalid: Deque[Tuple[int, Dict[str, Any], Exception]] = deque()
+
+        def items() -> Iterator[BatchItem]:
+            for index, record in enumerate(records, start_index):
+                if not self.in_shard(index, record):
+                    continue
+                try:
+                    item = self.record_to_item(record)
+                except (KeyError, TypeError, ValueError) as ex:
+                    invalid.append((index, record, ex))
+                    continue
+                in_flight.append((index, record))
+                yield item
+
+        for result in self.method.iter_process_batch(
+            items=items(), num_workers=self.num_workers, chunk_size=self.chunk_size
+        ):
+            index, record = in_flight.popleft()
+            # The items are read ahead, keep the invalid records in order
+            while invalid and invalid[0][0] < index:
+                yield False, self._invalid_record(*invalid.popleft())
+            if isinstance(result, ASTDiffFailure):
+                output = ast_diff_failure_to_record(result)
+            else:
+                output = ast_diff_to_record(result)
+            yield not isinstance(result, ASTDiffFailure), self._with_input_fields(
+                output, index, record
+            )
+        while invalid:
+            yield False, self._invalid_record(*invalid.popleft())
+
+    def build(
+        self,
+        records: Iterable[Dict[str, Any]],
+        writer: RecordWriter,
+        failure_writer: Optional[RecordWriter] = None,
+    ) -> BuildSummary:
+        """Labels the records and writes them out incrementally.
+
+        Args:
+            records: The input records.
+            writer: The writer for the labeled records.
+            failure_writer: An optional writer for records that could
+                not be processed.
+
+        Returns:
+            A summary of the build.
+        """
+        summary = BuildSummary()
+        for success, output in self.iter_labeled(records=records):
+            summary.num_read += 1
+            if success:
+                writer.write(output)
+                summary.num_written += 1
+            else:
+                summary.num_failed += 1
+                if failure_writer is not None:
+                    failure_writer.write(output)
+        writer.flush()
+        if failure_writer is not None:
+            failure_writer.flush()
+        return summary
+
+    def _with_input_fields(
+        self, output: Dict[str, Any], index: int, record: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Adds the input index and question to an output record."""
+        ret: Dict[str, Any] = {"index": index}
+        question_field = self.field_names.question
+        if (
+            question_field is not None
+            and isinstance(record, dict)
+            and question_field in record
+        ):
+            ret["question"] = record[question_field]
+        ret.update(output)
+        return ret
+
+    def _invalid_record(
+        self, index: int, record: Dict[str, Any], ex: Exception
+    ) -> Dict[str, Any]:
+        """Creates the failure record for an invalid input record."""
+        return self._with_input_fields(
+            {
+                "error_type": "InvalidRecord",
+                "error_message": f"{type(ex).__name__}: {ex}",
+            },
+            index,
+            record,
+        )
@@ -0,0 +1,150 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.dataset.builder import DatasetBuilder
+from sql_ast_dataset.dataset.cli import main
+from sql_ast_dataset.dataset.dataset_io import JsonlWriter, read_records
+
+
+class TestDatasetBuilder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.records = [
+            {
+                "question": "How many singers?",
+                "query": "SELECT Name, COUNT(*) FROM singer",
+                "gold_query": "SELECT COUNT(*) FROM singer",
+                "label": 0,
+            },
+            {
+                "question": "How many singers?",
+                "query": "SELECT COUNT(Name) FROM singer",
+                "gold_query": "SELECT COUNT(*) FROM singer",
+                "label": 1,
+            },
+            {"question": "Missing gold query", "query": "SELECT 1", "label": 1},
+            {
+                "question": "Names",
+                "query": "SELECT a, b FROM c",
+                "gold_query": "SELECT b, a FROM c",
+                "label": 1,
+            },
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_build(self):
+        builder = DatasetBuilder(
+            method=Factory().build("QueryProcessor", config_dict={}), num_workers=0
+        )
+        output_path = self._path("out.jsonl")
+        failure_path = self._path("failures.jsonl")
+        with JsonlWriter(output_path) as writer, JsonlWriter(
+            failure_path
+        ) as failure_writer:
+            summary = builder.build(self.records, writer, failure_writer)
+
+        self.assertEqual(summary.num_read, 4)
+        self.assertEqual(summary.num_written, 2)
+        self.assertEqual(summary.num_failed, 2)
+
+        output = list(read_records(output_path, "jsonl"))
+        self.assertEqual([record["index"] for record in output], [0, 3])
+        self.assertEqual(output[0]["question"], "How many singers?")
+        self.assertEqual(output[0]["labels"], [1, 0, 1, 1, 1, 1])
+        self.assertEqual(len(output[0]["char_index_lists"]), 6)
+
+        failures = list(read_records(failure_path, "jsonl"))
+        self.assertEqual(
+            [(record["index"], record["error_type"]) for record in failures],
+            [(1, "ValueError"), (2, "InvalidRecord")],
+        )
+
+    def test_input_order(self):
+        # The pairs are read ahead by the workers
+        builder = DatasetBuilder(
+            method=Factory().build("QueryProcessor", config_dict={}),
+            num_workers=2,
+            chunk_size=2,
+        )
+        records = [self.records[0], self.records[3], self.records[2], self.records[0]]
+        outputs = list(builder.iter_labeled(records))
+        self.assertEqual([output["index"] for _, output in outputs], [0, 1, 2, 3])
+        self.assertEqual([success for success, _ in outputs], [True, True, False, True])
+
+    def test_malformed_line(self):
+        input_path = self._path("in.jsonl")
+        with open(input_path, "w", encoding="utf-8") as stream:
+            stream.write(json.dumps(self.records[0]) + "\n")
+            stream.write('{"query": "SELECT 1", \n')
+            stream.write(json.dumps(self.records[3]) + "\n")
+            for value in ("5", "null", "true", "[1]"):
+                stream.write(value + "\n")
+        output_path = self._path("out.jsonl")
+        failure_path = self._path("failures.jsonl")
+        argv = ["build", input_path, output_path, "--failures", failure_path]
+        self.assertEqual(main(argv + ["--num-workers", "0"]), 0)
+
+        output = list(read_records(output_path, "jsonl"))
+        self.assertEqual([record["index"] for record in output], [0, 2])
+        failures = list(read_records(failure_path, "jsonl"))
+        self.assertEqual([failure["index"] for failure in failures], [1, 3, 4, 5, 6])
+        self.assertEqual(failures[0]["error_type"], "InvalidRecord")
+        self.assertIn("JSONDecodeError", failures[0]["error_message"])
+        self.assertEqual(
+            failures[1]["error_message"],
+            "ValueError: Expected a JSON object, got int.",
+        )
+
+    def test_cli_invalid_config(self):
+        input_path = self._path("in.jsonl")
+        with open(input_path, "w", encoding="utf-8") as stream:
+            stream.write(json.dumps(self.records[0]) + "\n")
+        argv = ["build", input_path, self._path("out.jsonl"), "--num-workers", "0"]
+        for config in ("{sqlglot_dialect: sqlite}", "[]"):
+            with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                self.assertEqual(main(argv + ["--config", config]), 2)
+            self.assertIn("--config", stderr.getvalue())
+
+    def test_cli_csv(self):
+        input_path = self._path("in.csv.gz")
+        output_path = self._path("out.jsonl.gz")
+        # A gzipped CSV with string labels
+        with gzip.open(input_path, "wt", newline="") as stream:
+            writer = csv.DictWriter(
+                stream, fieldnames=["question", "query", "gold_query", "label"]
+            )
+            writer.writeheader()
+            writer.writerow(self.records[0])
+            writer.writerow(self.records[3])
+
+        rc = main(
+            [
+                "build",
+                input_path,
+                output_path,
+                "--num-workers",
+                "0",
+                "--config",
+                json.dumps({"sqlglot_dialect": "sqlite"}),
+            ]
+        )
+        self.assertEqual(rc, 0)
+        output = list(read_records(output_path, "jsonl"))
+        self.assertEqual(len(output), 2)
+        self.assertEqual(output[1]["labels"], [1, 1, 1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
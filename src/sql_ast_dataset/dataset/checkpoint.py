@@ -0,0 +1,272 @@
+"""Resumable dataset builds that commit their output in shards.
+
+The output directory holds the committed shards, a failure log per shard
+and manifest.json. A shard is written to a temporary file, synced and
+renamed, and only then recorded in the manifest together with the input
+offsets it covers and its SHA-256. A restarted build verifies the shards
+of the manifest and continues with the first record after the last
+committed shard. The files of an uncommitted shard are overwritten.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sql_ast_dataset.dataset.builder import BuildSummary, DatasetBuilder
+from sql_ast_dataset.dataset.dataset_io import JsonlWriter, RecordWriter
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ShardInfo:
+    """Class for keeping track of a committed shard."""
+
+    index: int
+    path: str  # Relative to the output directory
+    failures_path: str
+    start_offset: int  # The input index the shard starts reading at
+    end_offset: int  # The input index after its last labeled record
+    num_written: int
+    num_failed: int
+    sha256: str
+    failures_sha256: str
+
+
+@dataclass
+class Manifest:
+    """Class for keeping track of the progress of a build."""
+
+    fingerprint: Dict[str, Any] = field(default_factory=dict)
+    next_offset: int = 0  # The input index the next shard starts at
+    complete: bool = False
+    shards: List[ShardInfo] = field(default_factory=list)
+    version: int = MANIFEST_VERSION
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        """Reads a manifest file."""
+        with open(path, encoding="utf-8") as stream:
+            data = json.load(stream)
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {data.get('version')}.")
+        data["shards"] = [ShardInfo(**shard) for shard in data["shards"]]
+        return cls(**data)
+
+    def save(self, path: str) -> None:
+        """Replaces the manifest file atomically."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as stream:
+            json.dump(asdict(self), stream, indent=2)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(tmp_path, path)
+
+
+def file_sha256(path: str) -> str:
+    """Returns the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sync(path: str) -> None:
+    """Flushes a closed file to the disk."""
+    with open(path, "rb") as stream:
+        os.fsync(stream.fileno())
+
+
+class CheckpointedBuild:
+    """Builds a dataset into committed shards that survive a restart."""
+
+    def __init__(
+        self,
+        builder: DatasetBuilder,
+        output_dir: str,
+        shard_size: int = 10000,
+        fingerprint: Optional[Dict[str, Any]] = None,
+        writer_factory: Optional[Callable[[str], RecordWriter]] = None,
+        shard_suffix: str = ".jsonl",
+    ):
+        """Initializes the build.
+
+        Args:
+            builder: The configured dataset builder.
+            output_dir: The directory of the shards and the manifest.
+            shard_size: The number of labeled records per shard.
+            fingerprint: Describes the input and configuration, e.g. the
+                input path and method config. A build only resumes a
+                manifest with the same fingerprint.
+            writer_factory: Opens the writer of a shard, JsonlWriter by
+                default.
+            shard_suffix: The file extension of the shards.
+        """
+        if shard_size < 1:
+            raise ValueError(f"shard_size has to be positive, got {shard_size}.")
+        self.builder = builder
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.fingerprint = dict(fingerprint or {}, shard_size=shard_size)
+        self.writer_factory = writer_factory or JsonlWriter
+        self.shard_suffix = shard_suffix
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    def load_manifest(self) -> Manifest:
+        """Returns the verified manifest of an earlier run, or a new one.
+
+        Shards whose files are missing or do not match their hash are
+        dropped from the manifest together with all later shards, so they
+        are built again.
+
+        Raises:
+            ValueError: If the manifest belongs to a different build.
+        """
+        if not os.path.exists(self.manifest_path):
+            return Manifest(fingerprint=self.fingerprint)
+        manifest = Manifest.load(self.manifest_path)
+        if manifest.fingerprint != self.fingerprint:
+            raise ValueError(
+                f"{self.manifest_path} belongs to a different build: "
+                f"{manifest.fingerprint} != {self.fingerprint}."
+            )
+        for position, shard in enumerate(manifest.shards):
+            if not self._shard_is_valid(shard):
+                manifest.shards = manifest.shards[:position]
+                manifest.next_offset = shard.start_offset
+                manifest.complete = False
+                break
+        return manifest
+
+    def _shard_is_valid(self, shard: ShardInfo) -> bool:
+        """Checks that the files of a shard exist and match their hashes."""
+        for name, expected in (
+            (shard.path, shard.sha256),
+            (shard.failures_path, shard.failures_sha256),
+        ):
+            path = os.path.join(self.output_dir, name)
+            if not os.path.exists(path) or file_sha256(path) != expected:
+                return False
+        return True
+
+    def shard_paths(self, manifest: Optional[Manifest] = None) -> List[str]:
+        """Returns the paths of the committed shards in input order."""
+        manifest = manifest or self.load_manifest()
+        return [os.path.join(self.output_dir, shard.path) for shard in manifest.shards]
+
+    def build(
+        self, open_records: Callable[[int], Iterable[Dict[str, Any]]]
+    ) -> BuildSummary:
+        """Labels the records that are not committed yet.
+
+        Args:
+            open_records: Returns the input records starting at the given
+                input index, e.g. partial(read_records, path, "jsonl",
+                skip=...) or a slice of a list.
+
+        Returns:
+            A summary over all shards, num_skipped counts the records of
+            the shards committed by earlier runs.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        num_written = sum(shard.num_written for shard in manifest.shards)
+        num_failed = sum(shard.num_failed for shard in manifest.shards)
+        summary = BuildSummary(
+            num_read=num_written + num_failed,
+            num_written=num_written,
+            num_failed=num_failed,
+            num_skipped=num_written + num_failed,
+        )
+        if manifest.complete:
+            return summary
+
+        labeled = self.builder.iter_labeled(
+            records=open_records(manifest.next_offset),
+            start_index=manifest.next_offset,
+        )
+        while True:
+            shard, num_read = self._write_shard(
+                index=len(manifest.shards),
+                start_offset=manifest.next_offset,
+                labeled=labeled,
+            )
+            if shard is None:
+                break
+            manifest.shards.append(shard)
+            manifest.next_offset = shard.end_offset
+            manifest.save(self.manifest_path)
+            summary.num_read += num_read
+            summary.num_written += shard.num_written
+            summary.num_failed += shard.num_failed
+            if num_read < self.shard_size:
+                break
+
+        manifest.complete = True
+        manifest.save(self.manifest_path)
+        return summary
+
+    def _write_shard(
+        self,
+        index: int,
+        start_offset: int,
+        labeled: Iterator[Tuple[bool, Dict[str, Any]]],
+    ) -> Tuple[Optional[ShardInfo], int]:
+        """Writes and commits the next shard.
+
+        Returns:
+            The committed shard, or None if there were no records left,
+            and the number of records of the shard.
+        """
+        name = f"shard-{index:05d}{self.shard_suffix}"
+        failures_name = f"failures-{index:05d}.jsonl"
+        path = os.path.join(self.output_dir, name)
+        failures_path = os.path.join(self.output_dir, failures_name)
+
+        num_read = num_written = num_failed = 0
+        end_offset = start_offset
+        writer = self.writer_factory(path + ".tmp")
+        failure_writer = JsonlWriter(failures_path + ".tmp")
+        try:
+            for success, output in labeled:
+                num_read += 1
+                # The outputs are in input order, but records of other
+                # shards are skipped, see DatasetBuilder.in_shard
+                end_offset = output["index"] + 1
+                if success:
+                    writer.write(output)
+                    num_written += 1
+                else:
+                    failure_writer.write(output)
+                    num_failed += 1
+                if num_read == self.shard_size:
+                    break
+        finally:
+            writer.close()
+            failure_writer.close()
+
+        if num_read == 0:
+            os.remove(path + ".tmp")
+            os.remove(failures_path + ".tmp")
+            return None, 0
+        for final_path in (path, failures_path):
+            _sync(final_path + ".tmp")
+            os.replace(final_path + ".tmp", final_path)
+        return (
+            ShardInfo(
+                index=index,
+                path=name,
+                failures_path=failures_name,
+                start_offset=start_offset,
+                end_offset=end_offset,
+                num_written=num_written,
+                num_failed=num_failed,
+                sha256=file_sha256(path),
+                failures_sha256=file_sha256(failures_path),
+            ),
+            num_read,
+        )
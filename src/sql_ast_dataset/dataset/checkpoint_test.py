@@ -0,0 +1,204 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.dataset.builder import DatasetBuilder
+from sql_ast_dataset.dataset.checkpoint import (
+    MANIFEST_NAME,
+    CheckpointedBuild,
+    Manifest,
+)
+from sql_ast_dataset.dataset.cli import main
+from sql_ast_dataset.dataset.dataset_io import read_records
+
+PAIRS = [
+    ("SELECT Name, COUNT(*) FROM singer", "SELECT COUNT(*) FROM singer", 0),
+    ("SELECT COUNT(Name) FROM singer", "SELECT COUNT(*) FROM singer", 1),
+    ("SELECT a, b FROM c", "SELECT b, a FROM c", 1),
+]
+
+
+class TestCheckpointedBuild(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp_dir.name, "out")
+        self.records = [
+            {"query": query, "gold_query": gold_query, "label": label}
+            for query, gold_query, label in PAIRS * 3
+        ]
+        self.builder = DatasetBuilder(
+            method=Factory().build("QueryProcessor", config_dict={}),
+            num_workers=0,
+            chunk_size=1,
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _checkpointed(self, fingerprint=None) -> CheckpointedBuild:
+        return CheckpointedBuild(
+            self.builder,
+            self.output_dir,
+            shard_size=2,
+            fingerprint=fingerprint or {"input": "test"},
+        )
+
+    def _read_output(self, checkpointed: CheckpointedBuild):
+        return [
+            record
+            for path in checkpointed.shard_paths()
+            for record in read_records(path, "jsonl")
+        ]
+
+    def test_build(self):
+        checkpointed = self._checkpointed()
+        summary = checkpointed.build(lambda offset: self.records[offset:])
+        self.assertEqual((summary.num_read, summary.num_written), (9, 6))
+        self.assertEqual((summary.num_failed, summary.num_skipped), (3, 0))
+
+        manifest = Manifest.load(os.path.join(self.output_dir, MANIFEST_NAME))
+        self.assertTrue(manifest.complete)
+        self.assertEqual(manifest.next_offset, 9)
+        self.assertEqual(
+            [(shard.start_offset, shard.end_offset) for shard in manifest.shards],
+            [(0, 2), (2, 4), (4, 6), (6, 8), (8, 9)],
+        )
+        self.assertEqual(
+            [record["index"] for record in self._read_output(checkpointed)],
+            [0, 2, 3, 5, 6, 8],
+        )
+        failures = read_records(
+            os.path.join(self.output_dir, "failures-00000.jsonl"), "jsonl"
+        )
+        self.assertEqual([record["index"] for record in failures], [1])
+
+        # A complete build is not run again
+        summary = checkpointed.build(lambda offset: self.fail("not read"))
+        self.assertEqual((summary.num_read, summary.num_skipped), (9, 9))
+
+    def test_resume(self):
+        reference = CheckpointedBuild(
+            self.builder, os.path.join(self.tmp_dir.name, "reference"), shard_size=2
+        )
+        reference.build(lambda offset: self.records[offset:])
+
+        # The job is killed while writing the third shard
+        def crashing_records(offset):
+            for record in self.records[offset:5]:
+                yield record
+            raise KeyboardInterrupt()
+
+        checkpointed = self._checkpointed()
+        with self.assertRaises(KeyboardInterrupt):
+            checkpointed.build(crashing_records)
+        manifest = checkpointed.load_manifest()
+        self.assertFalse(manifest.complete)
+        self.assertEqual(manifest.next_offset, 4)
+
+        offsets = []
+
+        def records(offset):
+            offsets.append(offset)
+            return self.records[offset:]
+
+        summary = checkpointed.build(records)
+        self.assertEqual(offsets, [4])
+        self.assertEqual((summary.num_read, summary.num_skipped), (9, 4))
+        self.assertEqual(
+            self._read_output(checkpointed),
+            [
+                record
+                for path in reference.shard_paths()
+                for record in read_records(path, "jsonl")
+            ],
+        )
+
+    def test_offsets_with_workers(self):
+        # The pairs are read ahead, invalid records are found early
+        self.builder.num_workers = 2
+        self.builder.chunk_size = 2
+        records = list(self.records)
+        records[1] = {"query": "SELECT 1"}
+        records[4] = {"query": "SELECT 1"}
+
+        def crashing_records(offset):
+            yield from records[offset:6]
+            raise KeyboardInterrupt()
+
+        checkpointed = self._checkpointed()
+        with self.assertRaises(KeyboardInterrupt):
+            checkpointed.build(crashing_records)
+        checkpointed.build(lambda offset: records[offset:])
+
+        indices = []
+        for shard in checkpointed.load_manifest().shards:
+            shard_indices = sorted(
+                record["index"]
+                for name in (shard.path, shard.failures_path)
+                for record in read_records(os.path.join(self.output_dir, name), "jsonl")
+            )
+            self.assertEqual(
+                shard_indices, list(range(shard.start_offset, shard.end_offset))
+            )
+            indices.extend(shard_indices)
+        self.assertEqual(indices, list(range(len(records))))
+
+    def test_corrupted_shard(self):
+        checkpointed = self._checkpointed()
+        checkpointed.build(lambda offset: self.records[offset:])
+        with open(os.path.join(self.output_dir, "shard-00001.jsonl"), "a") as stream:
+            stream.write("{}\n")
+        manifest = checkpointed.load_manifest()
+        self.assertEqual(len(manifest.shards), 1)
+        self.assertEqual(manifest.next_offset, 2)
+
+        summary = checkpointed.build(lambda offset: self.records[offset:])
+        self.assertEqual((summary.num_read, summary.num_skipped), (9, 2))
+        self.assertEqual(len(self._read_output(checkpointed)), 6)
+
+    def test_fingerprint_mismatch(self):
+        self._checkpointed().build(lambda offset: self.records[offset:])
+        with self.assertRaises(ValueError):
+            self._checkpointed({"input": "other"}).load_manifest()
+
+    def test_read_records_skip(self):
+        path = os.path.join(self.tmp_dir.name, "input.jsonl")
+        with open(path, "w") as stream:
+            for record in self.records:
+                stream.write(json.dumps(record) + "\n\n")
+        with mock.patch("json.loads", wraps=json.loads) as loads:
+            self.assertEqual(
+                list(read_records(path, "jsonl", skip=7)), self.records[7:]
+            )
+        self.assertEqual(loads.call_count, 2)
+
+    def test_cli(self):
+        input_path = os.path.join(self.tmp_dir.name, "input.jsonl")
+        with open(input_path, "w") as stream:
+            for record in self.records:
+                stream.write(json.dumps(record) + "\n")
+        argv = ["build", input_path, self.output_dir, "--shard-size", "4"]
+        argv += ["--num-workers", "0"]
+        self.assertEqual(main(argv), 0)
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            [
+                "failures-00000.jsonl",
+                "failures-00001.jsonl",
+                "failures-00002.jsonl",
+                MANIFEST_NAME,
+                "shard-00000.jsonl",
+                "shard-00001.jsonl",
+                "shard-00002.jsonl",
+            ],
+        )
+        # A complete build is a no-op, another configuration is refused
+        self.assertEqual(main(argv), 0)
+        self.assertEqual(main(argv + ["--config", '{"max_nodes": 10}']), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,411 @@
+"""Command line interface to build AST classification datasets.
+
+Example:
+    python -m sql_ast_dataset build predictions.jsonl labeled.jsonl \
+        --config '{"sqlglot_dialect": "sqlite"}' --num-workers 8
+    python -m sql_ast_dataset build predictions.jsonl shard-0.jsonl \
+        --num-shards 4 --shard-id 0
+    python -m sql_ast_dataset merge shard-*.jsonl --output labeled.jsonl \
+        --input predictions.jsonl
+    python -m sql_ast_dataset serve --port 8000 --num-workers 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.dataset.arrow_io import (
+    COLUMNAR_OUTPUT_FORMATS,
+    ColumnarWriter,
+    infer_columnar_format,
+)
+from sql_ast_dataset.dataset.builder import DatasetBuilder, FieldNames
+from sql_ast_dataset.dataset.checkpoint import CheckpointedBuild
+from sql_ast_dataset.dataset.dataset_io import (
+    SUPPORTED_INPUT_FORMATS,
+    JsonlWriter,
+    RecordWriter,
+    infer_input_format,
+    read_records,
+)
+from sql_ast_dataset.dataset.sharding import merge_shards
+
+OUTPUT_FORMATS = ("jsonl",) + COLUMNAR_OUTPUT_FORMATS
+
+
+def open_output(path: str, output_format: Optional[str] = None) -> RecordWriter:
+    """Opens the writer for the labeled records.
+
+    Args:
+        path: The output file path.
+        output_format: "jsonl", "parquet" or "arrow". By default Parquet
+            and Arrow IPC are inferred from the extension, otherwise JSONL
+            is written.
+
+    Returns:
+        The record writer.
+    """
+    output_format = output_format or infer_columnar_format(path) or "jsonl"
+    if output_format == "jsonl":
+        return JsonlWriter(path)
+    return ColumnarWriter(path, output_format=output_format)
+
+
+def _parse_config(config: str) -> Optional[Dict[str, Any]]:
+    """Parses the --config argument, prints the error if it is invalid."""
+    try:
+        config_dict = json.loads(config)
+    except json.JSONDecodeError as ex:
+        print(f"--config is not valid JSON: {ex}", file=sys.stderr)
+        return None
+    if not isinstance(config_dict, dict):
+        print("--config has to be a JSON object.", file=sys.stderr)
+        return None
+    return config_dict
+
+
+def _add_build_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Adds the build command."""
+    parser = subparsers.add_parser(
+        "build", help="Label query pairs from a JSONL/CSV file."
+    )
+    parser.add_argument("input", help="The JSONL or CSV input file (optionally .gz).")
+    parser.add_argument(
+        "output",
+        help="The JSONL (optionally .gz), Parquet or Arrow IPC output file, "
+        "or the output directory with --shard-size.",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=SUPPORTED_INPUT_FORMATS,
+        default=None,
+        help="The input format, inferred from the extension by default.",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=None,
+        help="The output format, inferred from the extension by default.",
+    )
+    parser.add_argument(
+        "--failures", default=None, help="JSONL file for records that failed."
+    )
+    parser.add_argument("--method", default="QueryProcessor")
+    parser.add_argument(
+        "--config", default="{}", help="The method configuration as JSON."
+    )
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument("--gold-field", default="gold_query")
+    parser.add_argument("--label-field", default="label")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=None,
+        help="Number of worker processes, all cores by default.",
+    )
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the input into this many shards by a hash of the gold query.",
+    )
+    parser.add_argument(
+        "--shard-id", type=int, default=0, help="The shard labeled by this run."
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=None,
+        help="Write committed shards of this many labeled records (written "
+        "and failed) and a manifest into the output directory. Running the "
+        "command again resumes after the last committed shard.",
+    )
+
+
+def build(args: argparse.Namespace) -> int:
+    """Runs the build command.
+
+    Args:
+        args: The parsed arguments.
+
+    Returns:
+        The exit code.
+    """
+    input_format = args.input_format or infer_input_format(args.input)
+    if input_format is None:
+        print(
+            f"Unable to infer the format of {args.input}, use --input-format.",
+            file=sys.stderr,
+        )
+        return 2
+
+    config = _parse_config(args.config)
+    if config is None:
+        return 2
+    method = Factory().build(args.method, config)
+    if method is None:
+        print(f"Unable to build the method {args.method}.", file=sys.stderr)
+        return 2
+
+    if not 0 <= args.shard_id < args.num_shards:
+        print(f"--shard-id has to be in [0, {args.num_shards}).", file=sys.stderr)
+        return 2
+
+    builder = DatasetBuilder(
+        method=method,
+        field_names=FieldNames(
+            query=args.query_field,
+            gold_query=args.gold_field,
+            label=args.label_field,
+            question=args.question_field,
+        ),
+        num_workers=args.num_workers,
+        chunk_size=args.chunk_size,
+        num_shards=args.num_shards,
+        shard_id=args.shard_id,
+    )
+    if args.shard_size is not None:
+        return _build_checkpointed(args, builder, input_format, config)
+
+    failure_writer = JsonlWriter(args.failures) if args.failures else None
+    try:
+        writer = open_output(args.output, args.output_format)
+        try:
+            summary = builder.build(
+                records=read_records(args.input, input_format),
+                writer=writer,
+                failure_writer=failure_writer,
+            )
+        finally:
+            writer.close()
+    finally:
+        if failure_writer is not None:
+            failure_writer.close()
+
+    print(json.dumps(asdict(summary)), file=sys.stderr)
+    return 0
+
+
+def _build_checkpointed(
+    args: argparse.Namespace,
+    builder: DatasetBuilder,
+    input_format: str,
+    config: Dict[str, Any],
+) -> int:
+    """Runs the build command into committed shards."""
+    if args.failures:
+        print(
+            "--failures can not be used with --shard-size, the failures are "
+            "written next to each shard.",
+            file=sys.stderr,
+        )
+        return 2
+    output_format = args.output_format or "jsonl"
+    checkpointed = CheckpointedBuild(
+        builder=builder,
+        output_dir=args.output,
+        shard_size=args.shard_size,
+        fingerprint={
+            "input": os.path.abspath(args.input),
+            "input_format": input_format,
+            "output_format": output_format,
+            "method": args.method,
+            "config": config,
+            "field_names": asdict(builder.field_names),
+            "num_shards": args.num_shards,
+            "shard_id": args.shard_id,
+        },
+        writer_factory=lambda path: open_output(path, output_format),
+        shard_suffix="." + output_format,
+    )
+    try:
+        summary = checkpointed.build(
+            lambda offset: read_records(args.input, input_format, skip=offset)
+        )
+    except ValueError as ex:
+        print(str(ex), file=sys.stderr)
+        return 2
+    print(json.dumps(asdict(summary)), file=sys.stderr)
+    return 0
+
+
+def _add_merge_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Adds the merge command."""
+    parser = subparsers.add_parser(
+        "merge", help="Merge the JSONL outputs of sharded builds in input order."
+    )
+    parser.add_argument(
+        "shards",
+        nargs="+",
+        help="The JSONL outputs of the shards or their --shard-size directories.",
+    )
+    parser.add_argument("--output", required=True, help="The merged JSONL file.")
+    parser.add_argument(
+        "--shard-failures",
+        nargs="*",
+        default=[],
+        help="The --failures files of the shards.",
+    )
+    parser.add_argument(
+        "--failures", default=None, help="JSONL file for the merged failures."
+    )
+    parser.add_argument(
+        "--input",
+        default=None,
+        help="The input of the build, to check that no trailing record is missing.",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=SUPPORTED_INPUT_FORMATS,
+        default=None,
+        help="The input format, inferred from the extension by default.",
+    )
+
+
+def merge(args: argparse.Namespace) -> int:
+    """Runs the merge command.
+
+    Args:
+        args: The parsed arguments.
+
+    Returns:
+        The exit code, 1 if a record is missing or duplicated.
+    """
+    num_records = None
+    if args.input is not None:
+        input_format = args.input_format or infer_input_format(args.input)
+        if input_format is None:
+            print(
+                f"Unable to infer the format of {args.input}, use --input-format.",
+                file=sys.stderr,
+            )
+            return 2
+        num_records = sum(1 for _ in read_records(args.input, input_format))
+
+    try:
+        summary = merge_shards(
+            outputs=args.shards,
+            output_path=args.output,
+            failures=args.shard_failures,
+            failures_path=args.failures,
+            num_records=num_records,
+        )
+    except ValueError as ex:
+        print(str(ex), file=sys.stderr)
+        return 2
+    print(json.dumps(asdict(summary)), file=sys.stderr)
+    return 0 if summary.is_exactly_once() else 1
+
+
+def _add_serve_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Adds the serve command."""
+    parser = subparsers.add_parser(
+        "serve", help="Serve the labeling of query pairs over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--method", default="QueryProcessor")
+    parser.add_argument(
+        "--config", default="{}", help="The method configuration as JSON."
+    )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=None,
+        help="Number of worker processes, all cores by default.",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=16,
+        help="The maximal number of pairs sent to a worker at once.",
+    )
+    parser.add_argument(
+        "--max-batch-delay",
+        type=float,
+        default=0.002,
+        help="The seconds a batch waits for concurrent requests.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Record per-stage statistics and report them in /metrics.",
+    )
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Runs the serve command until interrupted.
+
+    Args:
+        args: The parsed arguments.
+
+    Returns:
+        The exit code.
+    """
+    # Imported here, the build command does not need the server
+    from sql_ast_dataset.ast_processing.async_processing import AsyncQueryProcessor
+    from sql_ast_dataset.serving.labeling_server import LabelingServer
+
+    config = _parse_config(args.config)
+    if config is None:
+        return 2
+    method = Factory().build(args.method, config)
+    if method is None:
+        print(f"Unable to build the method {args.method}.", file=sys.stderr)
+        return 2
+    if args.stats:
+        method.enable_stats()
+
+    server = LabelingServer(
+        labeler=AsyncQueryProcessor(
+            method=method,
+            num_workers=args.num_workers,
+            max_batch_size=args.max_batch_size,
+            max_batch_delay=args.max_batch_delay,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+
+    async def run() -> None:
+        await server.start()
+        print(f"Serving on http://{server.host}:{server.port}", file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """The entry point of the command line interface.
+
+    Args:
+        argv: The arguments, sys.argv by default.
+
+    Returns:
+        The exit code.
+    """
+    parser = argparse.ArgumentParser(prog="sql_ast_dataset")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    _add_build_parser(subparsers)
+    _add_merge_parser(subparsers)
+    _add_serve_parser(subparsers)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        return build(args)
+    if args.command == "merge":
+        return merge(args)
+    if args.command == "serve":
+        return serve(args)
+    return 2
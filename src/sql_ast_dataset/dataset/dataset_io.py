@@ -0,0 +1,191 @@
+"""Streaming readers and writers for query pair datasets."""
+
+import csv
+import gzip
+import json
+from itertools import islice
+from typing import IO, Any, Dict, Iterator, Optional, Protocol
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure, ASTDiffInput
+
+SUPPORTED_INPUT_FORMATS = ("jsonl", "csv")
+
+
+def open_text(path: str, mode: str = "r") -> IO[str]:
+    """Opens a text file, transparently handling gzip compression.
+
+    Args:
+        path: The file path, a ".gz" suffix enables gzip.
+        mode: "r", "w" or "a".
+
+    Returns:
+        The opened text stream.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def infer_input_format(path: str) -> Optional[str]:
+    """Infers the input format from the file extension.
+
+    Args:
+        path: The file path.
+
+    Returns:
+        "jsonl", "csv" or None if the extension is unknown.
+    """
+    if path.endswith(".gz"):
+        path = path[: -len(".gz")]
+    if path.endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    return None
+
+
+class MalformedRecord(dict):
+    """An input line that is not a valid JSON object.
+
+    It is yielded in place of the record, so a single broken line is
+    reported as a failure instead of stopping the whole build.
+    """
+
+    def __init__(self, error: ValueError):
+        super().__init__()
+        self.error = error
+
+
+def read_records(
+    path: str, input_format: str, skip: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """Streams the records of a JSONL or CSV file one by one.
+
+    Args:
+        path: The file path.
+        input_format: "jsonl" or "csv".
+        skip: The number of leading records to skip, JSONL lines are
+            skipped without parsing them.
+
+    Returns:
+        An iterator over the records as dictionaries, a MalformedRecord
+        for every JSONL line that is not a JSON object.
+    """
+    if input_format not in SUPPORTED_INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format {input_format}.")
+
+    with open_text(path) as stream:
+        if input_format == "csv":
+            yield from islice(csv.DictReader(stream), skip, None)
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as ex:
+                yield MalformedRecord(ex)
+                continue
+            if isinstance(record, dict):
+                yield record
+            else:
+                yield MalformedRecord(
+                    ValueError(f"Expected a JSON object, got {type(record).__name__}.")
+                )
+
+
+def ast_diff_to_record(ast_diff: ASTDiffInput) -> Dict[str, Any]:
+    """Converts an ASTDiffInput into a JSON serializable record.
+
+    Args:
+        ast_diff: The processed query pair.
+
+    Returns:
+        A dict with the queries and the per node names, labels, depths
+        and char indices. Live sqlglot objects are left out.
+    """
+    query_subwords = ast_diff.query_subwords or []
+    return {
+        "query": ast_diff.query,
+        "gold_query": ast_diff.gold_query,
+        "label": ast_diff.label,
+        "processed_query": ast_diff.processed_query,
+        "expr_names": [qs.expr_name for qs in query_subwords],
+        "labels": ast_diff.get_labels(),
+        "expr_depths": [qs.expr_depth for qs in query_subwords],
+        "char_index_lists": ast_diff.query_subword_indices_as_list(),
+    }
+
+
+def ast_diff_failure_to_record(failure: ASTDiffFailure) -> Dict[str, Any]:
+    """Converts an ASTDiffFailure into a JSON serializable record.
+
+    Args:
+        failure: The failed query pair.
+
+    Returns:
+        A dict with the queries, the error and the skip reason of pairs
+        over a limit.
+    """
+    return {
+        "query": failure.query,
+        "gold_query": failure.gold_query,
+        "label": failure.label,
+        "error_type": failure.error_type,
+        "error_message": failure.error_message,
+        "skip_reason": failure.skip_reason,
+    }
+
+
+class RecordWriter(Protocol):
+    """The interface of the writers for output records."""
+
+    count: int
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Writes a single record."""
+
+    def flush(self) -> None:
+        """Flushes the written records to the file."""
+
+    def close(self) -> None:
+        """Closes the output file."""
+
+
+class JsonlWriter:
+    """Writes records incrementally as JSON lines."""
+
+    def __init__(self, path: str, append: bool = False):
+        """Opens the output file.
+
+        Args:
+            path: The file path, a ".gz" suffix enables gzip.
+            append: If set, records are appended to an existing file.
+        """
+        self.path = path
+        self.stream = open_text(path, "a" if append else "w")
+        self.count = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Writes a single record."""
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write("\n")
+        self.count += 1
+
+    def flush(self) -> None:
+        """Flushes the written records to the file."""
+        self.stream.flush()
+
+    def close(self) -> None:
+        """Closes the output file."""
+        self.stream.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -0,0 +1,172 @@
+"""Deterministic sharding of a build over machines and merging the shards.
+
+Every machine reads the whole input and labels only the records of its
+shard. A record belongs to the shard of a stable hash of its gold query,
+so all candidates of a gold query end up on the same machine and share
+its gold parse cache. The outputs keep the global input index, the merge
+interleaves them back into input order and checks that every record was
+processed exactly once.
+"""
+
+import hashlib
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sql_ast_dataset.dataset.dataset_io import JsonlWriter, read_records
+
+# The number of reported missing or duplicated indices
+MAX_REPORTED_INDICES = 10
+
+
+def shard_of(gold_query: str, num_shards: int) -> int:
+    """Returns the shard of a gold query.
+
+    The hash does not depend on the process or platform, unlike hash().
+
+    Args:
+        gold_query: The gold query of a record.
+        num_shards: The total number of shards.
+
+    Returns:
+        The shard id in [0, num_shards).
+    """
+    digest = hashlib.blake2b(gold_query.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+class MergeError(ValueError):
+    """Raised if the shards do not hold every input record exactly once."""
+
+
+@dataclass
+class MergeSummary:
+    """Class for keeping track of the outcome of a merge."""
+
+    num_records: int = 0
+    num_written: int = 0
+    num_failed: int = 0
+    missing: List[int] = field(default_factory=list)
+    duplicated: List[int] = field(default_factory=list)
+    num_missing: int = 0
+    num_duplicated: int = 0
+
+    def is_exactly_once(self) -> bool:
+        """Returns True if no index is missing or duplicated."""
+        return self.num_missing == 0 and self.num_duplicated == 0
+
+
+def shard_files(path: str) -> Tuple[List[str], List[str]]:
+    """Returns the output and failure files of a shard output.
+
+    Args:
+        path: A JSONL output file, or the directory of a checkpointed
+            build, whose committed shards are returned.
+
+    Returns:
+        The output files and the failure files.
+    """
+    # Imported here, the checkpoints depend on the builder and sharding
+    from sql_ast_dataset.dataset.checkpoint import MANIFEST_NAME, Manifest
+
+    if not os.path.isdir(path):
+        return [path], []
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise MergeError(f"{path} is a directory without {MANIFEST_NAME}.")
+    manifest = Manifest.load(manifest_path)
+    if not manifest.complete:
+        raise MergeError(f"The build in {path} is not complete.")
+    return (
+        [os.path.join(path, shard.path) for shard in manifest.shards],
+        [os.path.join(path, shard.failures_path) for shard in manifest.shards],
+    )
+
+
+def _iter_indexed(
+    paths: List[str], success: bool
+) -> Iterator[Tuple[int, bool, Dict[str, Any]]]:
+    """Reads the records of the files of one shard in index order."""
+    previous = -1
+    for path in paths:
+        for record in read_records(path, "jsonl"):
+            index = record.get("index")
+            if not isinstance(index, int):
+                raise MergeError(f"A record of {path} has no input index.")
+            if index <= previous:
+                raise MergeError(f"The records of {path} are not in input order.")
+            previous = index
+            yield index, success, record
+
+
+def merge_shards(
+    outputs: List[str],
+    output_path: str,
+    failures: Optional[List[str]] = None,
+    failures_path: Optional[str] = None,
+    num_records: Optional[int] = None,
+) -> MergeSummary:
+    """Merges the outputs of the shards into one file in input order.
+
+    The shards are read as streams, only one record per shard is kept in
+    memory.
+
+    Args:
+        outputs: The JSONL outputs of the shards, or the directories of
+            checkpointed builds.
+        output_path: The merged JSONL output.
+        failures: The failure files of the shards that were built into
+            files, the failures of directories are added automatically.
+        failures_path: An optional file for the merged failures.
+        num_records: The number of input records. Without it, only the
+            indices up to the largest index are checked.
+
+    Returns:
+        The summary, see MergeSummary.is_exactly_once.
+    """
+    streams = []
+    for path in outputs:
+        output_files, failure_files = shard_files(path)
+        streams.append(_iter_indexed(output_files, True))
+        if failure_files:
+            streams.append(_iter_indexed(failure_files, False))
+    for path in failures or []:
+        streams.append(_iter_indexed([path], False))
+
+    summary = MergeSummary()
+
+    def report(indices: List[int], start: int, end: int) -> None:
+        indices.extend(range(start, min(end, start + MAX_REPORTED_INDICES)))
+        del indices[MAX_REPORTED_INDICES:]
+
+    writer = JsonlWriter(output_path)
+    failure_writer = JsonlWriter(failures_path) if failures_path else None
+    try:
+        previous = -1
+        for index, success, record in heapq.merge(*streams, key=lambda x: x[0]):
+            if index == previous:
+                summary.num_duplicated += 1
+                report(summary.duplicated, index, index + 1)
+                continue
+            if index > previous + 1:
+                summary.num_missing += index - previous - 1
+                report(summary.missing, previous + 1, index)
+            previous = index
+            if success:
+                writer.write(record)
+                summary.num_written += 1
+            else:
+                summary.num_failed += 1
+                if failure_writer is not None:
+                    failure_writer.write(record)
+    finally:
+        writer.close()
+        if failure_writer is not None:
+            failure_writer.close()
+
+    summary.num_records = previous + 1 if num_records is None else num_records
+    if summary.num_records > previous + 1:
+        summary.num_missing += summary.num_records - previous - 1
+        report(summary.missing, previous + 1, summary.num_records)
+    return summary
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from sql_ast_dataset.ast_processing.factory import Factory
+from sql_ast_dataset.dataset.builder import DatasetBuilder
+from sql_ast_dataset.dataset.cli import main
+from sql_ast_dataset.dataset.dataset_io import JsonlWriter, read_records
+from sql_ast_dataset.dataset.sharding import merge_shards, shard_of
+
+GOLD_QUERIES = [
+    "SELECT COUNT(*) FROM singer",
+    "SELECT b, a FROM c",
+    "SELECT name FROM stadium WHERE capacity > 100",
+    "SELECT AVG(age) FROM head",
+    "SELECT 1",
+]
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.records = []
+        for gold_query in GOLD_QUERIES:
+            for label in (0, 1):
+                self.records.append(
+                    {"query": gold_query, "gold_query": gold_query, "label": label}
+                )
+        self.records.append({"query": "SELECT 1", "label": 1})
+        self.input_path = self._path("input.jsonl")
+        with JsonlWriter(self.input_path) as writer:
+            for record in self.records:
+                writer.write(record)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_shard_of(self):
+        self.assertEqual(shard_of("SELECT 1", 1), 0)
+        # Stable across processes and releases
+        self.assertEqual(
+            [shard_of(query, 4) for query in GOLD_QUERIES], [1, 1, 1, 0, 0]
+        )
+
+    def test_builder(self):
+        method = Factory().build("QueryProcessor", config_dict={})
+        indices = []
+        for shard_id in range(3):
+            builder = DatasetBuilder(
+                method, num_workers=0, num_shards=3, shard_id=shard_id
+            )
+            shard_indices = [
+                output["index"] for _, output in builder.iter_labeled(self.records)
+            ]
+            self.assertEqual(shard_indices, sorted(shard_indices))
+            # All candidates of a gold query are in the same shard
+            for index in shard_indices:
+                if "gold_query" in self.records[index]:
+                    self.assertIn(index ^ 1, shard_indices)
+            indices.extend(shard_indices)
+        self.assertEqual(sorted(indices), list(range(len(self.records))))
+
+        with self.assertRaises(ValueError):
+            DatasetBuilder(method, num_shards=2, shard_id=2)
+
+    def test_merge(self):
+        shard_paths = [self._path(f"shard-{shard_id}.jsonl") for shard_id in range(2)]
+        failure_paths = [
+            self._path(f"failures-{shard_id}.jsonl") for shard_id in (0, 1)
+        ]
+        for shard_id in range(2):
+            argv = ["build", self.input_path, shard_paths[shard_id]]
+            argv += ["--failures", failure_paths[shard_id], "--num-workers", "0"]
+            argv += ["--num-shards", "2", "--shard-id", str(shard_id)]
+            self.assertEqual(main(argv), 0)
+        # The second shard is built resumable into a directory
+        shard_dir = self._path("shard-1")
+        argv = ["build", self.input_path, shard_dir, "--shard-size", "2"]
+        argv += ["--num-workers", "0", "--num-shards", "2", "--shard-id", "1"]
+        self.assertEqual(main(argv), 0)
+
+        merged_path = self._path("merged.jsonl")
+        merged_failures_path = self._path("merged_failures.jsonl")
+        summary = merge_shards(
+            [shard_paths[0], shard_dir],
+            merged_path,
+            failures=failure_paths[:1],
+            failures_path=merged_failures_path,
+            num_records=len(self.records),
+        )
+        self.assertTrue(summary.is_exactly_once())
+        self.assertEqual((summary.num_written, summary.num_failed), (10, 1))
+        merged = list(read_records(merged_path, "jsonl"))
+        self.assertEqual([record["index"] for record in merged], list(range(10)))
+        self.assertEqual(
+            [record["gold_query"] for record in merged],
+            [record["gold_query"] for record in self.records[:10]],
+        )
+        failures = list(read_records(merged_failures_path, "jsonl"))
+        self.assertEqual(failures[0]["index"], 10)
+
+        # A shard twice and a missing failure file
+        summary = merge_shards(
+            [shard_paths[0], shard_dir, shard_paths[1]],
+            merged_path,
+            num_records=len(self.records),
+        )
+        self.assertFalse(summary.is_exactly_once())
+        self.assertEqual(summary.num_duplicated, len(shard_indices(shard_paths[1])))
+        self.assertEqual(summary.missing, [10])
+
+    def test_merge_cli(self):
+        shard_paths = [self._path(f"shard-{shard_id}.jsonl") for shard_id in range(3)]
+        for shard_id, path in enumerate(shard_paths):
+            argv = ["build", self.input_path, path, "--num-workers", "0"]
+            argv += ["--num-shards", "3", "--shard-id", str(shard_id)]
+            self.assertEqual(main(argv), 0)
+
+        argv = ["merge", *shard_paths, "--output", self._path("merged.jsonl")]
+        self.assertEqual(main(argv), 0)
+        # The invalid last record was not written to any output
+        self.assertEqual(main(argv + ["--input", self.input_path]), 1)
+        self.assertEqual(main(argv[:2] + argv[3:]), 1)
+
+
+def shard_indices(path: str):
+    return [record["index"] for record in read_records(path, "jsonl")]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1 @@
+"""A module to serve the AST labeling over HTTP."""
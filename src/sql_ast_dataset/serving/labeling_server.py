@@ -0,0 +1,285 @@
+"""A small HTTP server that labels query pairs with a warm worker pool.
+
+Several trainer processes can share one server instead of each paying
+the import and parse costs. The server only uses asyncio and the
+standard library and speaks a minimal HTTP/1.1 with keep-alive.
+
+Endpoints:
+    POST /label: A JSON object with the query pair, e.g.
+        {"query": ..., "gold_query": ..., "label": 0}, or
+        {"pairs": [{...}, ...]} for several pairs. Returns the record of
+        each pair, or {"results": [...]} for several pairs.
+    GET /metrics: The throughput, batching and latency metrics.
+    GET /health: {"status": "ok"}.
+
+Example:
+    python -m sql_ast_dataset serve --port 8000 --num-workers 8
+"""
+
+import asyncio
+import json
+import time
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+
+from sql_ast_dataset.ast_processing.ast_diff_types import ASTDiffFailure
+from sql_ast_dataset.ast_processing.async_processing import (
+    AsyncQueryProcessor,
+    LatencyTracker,
+)
+from sql_ast_dataset.ast_processing.batch_processing import BatchItem, BatchResult
+from sql_ast_dataset.dataset.builder import FieldNames
+from sql_ast_dataset.dataset.dataset_io import (
+    ast_diff_failure_to_record,
+    ast_diff_to_record,
+)
+
+
+class BadRequest(ValueError):
+    """Raised for requests that can not be served."""
+
+    def __init__(self, message: str, status: HTTPStatus = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def result_to_record(result: BatchResult) -> Dict[str, Any]:
+    """Converts a labeled pair into the response record.
+
+    Args:
+        result: The ASTDiffInput or ASTDiffFailure of a pair.
+
+    Returns:
+        The record of ast_diff_to_record with the half-open char spans of
+        each node, or the failure record. "ok" tells them apart.
+    """
+    if isinstance(result, ASTDiffFailure):
+        return dict(ast_diff_failure_to_record(result), ok=False)
+    record = ast_diff_to_record(result)
+    record["char_spans"] = [
+        qs.char_index_list.spans() if qs.char_index_list is not None else []
+        for qs in result.query_subwords or []
+    ]
+    record["ok"] = True
+    return record
+
+
+class LabelingServer:
+    """Serves the labeling of an AsyncQueryProcessor over HTTP.
+
+    The pairs of concurrent requests are micro-batched by the processor,
+    and the gold parse cache of each pool worker stays warm across
+    requests.
+    """
+
+    def __init__(
+        self,
+        labeler: AsyncQueryProcessor,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        field_names: Optional[FieldNames] = None,
+        max_body_bytes: int = 16 * 1024 * 1024,
+    ):
+        """Configures the server.
+
+        Args:
+            labeler: The processor that labels the pairs.
+            host: The interface to listen on.
+            port: The port to listen on, 0 picks a free port.
+            field_names: The names of the fields of a pair.
+            max_body_bytes: The maximal size of a request body.
+        """
+        self.labeler = labeler
+        self.host = host
+        self.port = port
+        self.field_names = field_names if field_names is not None else FieldNames()
+        self.max_body_bytes = max_body_bytes
+        self.request_latencies = LatencyTracker()
+        self.num_http_requests = 0
+        self.num_http_errors = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._start_time = time.perf_counter()
+
+    async def start(self) -> None:
+        """Starts the worker pool and listens for connections."""
+        await self.labeler.__aenter__()
+        self._server = await asyncio.start_server(
+            self._handle_connection, host=self.host, port=self.port
+        )
+        # The actual port if 0 was given
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._start_time = time.perf_counter()
+
+    async def serve_forever(self) -> None:
+        """Starts the server and serves until cancelled."""
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stops listening and shuts the worker pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.labeler.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns the server and labeler metrics.
+
+        Returns:
+            A JSON serializable dict.
+        """
+        uptime = time.perf_counter() - self._start_time
+        labeler_metrics = self.labeler.metrics()
+        metrics = {
+            "uptime_seconds": uptime,
+            "num_http_requests": self.num_http_requests,
+            "num_http_errors": self.num_http_errors,
+            "pairs_per_second": (
+                labeler_metrics["num_completed"] / uptime if uptime > 0 else 0.0
+            ),
+            "request_latency_seconds": self.request_latencies.percentiles(),
+            "labeler": labeler_metrics,
+        }
+        if self.labeler.method.stats is not None:
+            metrics["processing"] = self.labeler.method.stats.as_dict()
+        return metrics
+
+    def _record_to_item(self, record: Any) -> BatchItem:
+        """Extracts a query pair from a request."""
+        if not isinstance(record, dict):
+            raise BadRequest("A pair has to be a JSON object.")
+        try:
+            return (
+                str(record[self.field_names.query]),
+                str(record[self.field_names.gold_query]),
+                int(record[self.field_names.label]),
+            )
+        except (KeyError, TypeError, ValueError) as ex:
+            raise BadRequest(f"Invalid pair: {type(ex).__name__}: {ex}") from ex
+
+    async def _label(self, body: bytes) -> Any:
+        """Labels the pair or pairs of a request body."""
+        try:
+            request = json.loads(body)
+        except ValueError as ex:
+            raise BadRequest(f"Invalid JSON: {ex}") from ex
+        if isinstance(request, dict) and "pairs" in request:
+            if not isinstance(request["pairs"], list):
+                raise BadRequest("pairs has to be a list.")
+            items = [self._record_to_item(record) for record in request["pairs"]]
+            results = await self.labeler.aprocess_many(items)
+            return {"results": [result_to_record(result) for result in results]}
+        result = await self.labeler.aprocess(*self._record_to_item(request))
+        return result_to_record(result)
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Any:
+        """Routes a request to its endpoint and returns the response payload."""
+        path = path.split("?", 1)[0]
+        routes = {
+            "/label": "POST",
+            "/metrics": "GET",
+            "/health": "GET",
+        }
+        if path not in routes:
+            raise BadRequest(f"Unknown path {path}.", HTTPStatus.NOT_FOUND)
+        if method != routes[path]:
+            raise BadRequest(
+                f"{path} expects {routes[path]}.", HTTPStatus.METHOD_NOT_ALLOWED
+            )
+        if path == "/label":
+            return await self._label(body)
+        if path == "/metrics":
+            return self.metrics()
+        return {"status": "ok"}
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Reads a request, returns None when the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError as ex:
+            raise BadRequest("Malformed request line.") from ex
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError as ex:
+            raise BadRequest("Invalid Content-Length.") from ex
+        if length > self.max_body_bytes:
+            raise BadRequest(
+                f"The body exceeds {self.max_body_bytes} bytes.",
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), path, headers, body
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serves the requests of a connection until it is closed."""
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    start = time.perf_counter()
+                    self.num_http_requests += 1
+                    payload = await self._dispatch(method, path, body)
+                    status = HTTPStatus.OK
+                    self.request_latencies.add(time.perf_counter() - start)
+                except BadRequest as ex:
+                    self.num_http_errors += 1
+                    status, payload = ex.status, {"error": str(ex)}
+                    # The rest of a malformed request can not be skipped
+                    keep_alive = False
+                except Exception as ex:  # pylint: disable=broad-except
+                    self.num_http_errors += 1
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {"error": f"{type(ex).__name__}: {ex}"}
+                    keep_alive = False
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                # E.g. the client reset the connection
+                pass
+
+
+def _response(status: HTTPStatus, payload: Any, keep_alive: bool) -> bytes:
+    """Encodes a JSON response."""
+    body = json.dumps(payload).encode("utf-8")
+    headers: List[str] = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import unittest
+from typing import Any, Tuple
+
+from sql_ast_dataset.ast_processing.async_processing import AsyncQueryProcessor
+from sql_ast_dataset.serving.labeling_server import LabelingServer
+
+
+async def _request(
+    port: int, method: str, path: str, payload: Any = None
+) -> Tuple[int, Any]:
+    """Sends a single request and returns the status and JSON response."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, json.loads(body)
+
+
+class TestLabelingServer(unittest.TestCase):
+    def run_with_server(self, client, num_workers: int = 0):
+        async def run():
+            server = LabelingServer(
+                labeler=AsyncQueryProcessor(config_dict={}, num_workers=num_workers),
+                port=0,
+            )
+            await server.start()
+            try:
+                return await client(server)
+            finally:
+                await server.close()
+
+        return asyncio.run(run())
+
+    def test_label(self):
+        pair = {
+            "query": "SELECT Name, COUNT(*) FROM singer",
+            "gold_query": "SELECT COUNT(*) FROM singer",
+            "label": 0,
+        }
+
+        async def client(server):
+            single = await _request(server.port, "POST", "/label", pair)
+            concurrent = await asyncio.gather(
+                *(_request(server.port, "POST", "/label", pair) for _ in range(4))
+            )
+            many = await _request(
+                server.port, "POST", "/label", {"pairs": [pair, dict(pair, label=1)]}
+            )
+            metrics = await _request(server.port, "GET", "/metrics")
+            return single, concurrent, many, metrics
+
+        single, concurrent, many, metrics = self.run_with_server(client)
+        status, record = single
+        self.assertEqual(status, 200)
+        self.assertTrue(record["ok"])
+        self.assertEqual(record["labels"], [1, 0, 1, 1, 1, 1])
+        self.assertEqual(len(record["char_spans"]), len(record["labels"]))
+        # The spans are the runs of the char indices, e.g. SELECT and FROM
+        self.assertEqual(record["char_spans"][0], [[0, 7], [11, 13], [21, 22]])
+        self.assertEqual(
+            [
+                [i for start, end in spans for i in range(start, end)]
+                for spans in record["char_spans"]
+            ],
+            record["char_index_lists"],
+        )
+        self.assertEqual([r[1] for r in concurrent], [record] * 4)
+
+        status, response = many
+        self.assertEqual(status, 200)
+        self.assertEqual(response["results"][0], record)
+        self.assertFalse(response["results"][1]["ok"])
+        self.assertEqual(response["results"][1]["error_type"], "ValueError")
+
+        status, metrics = metrics
+        self.assertEqual(status, 200)
+        self.assertEqual(metrics["num_http_requests"], 7)
+        self.assertEqual(metrics["labeler"]["num_completed"], 7)
+        self.assertGreater(metrics["pairs_per_second"], 0)
+        self.assertIn("p50", metrics["request_latency_seconds"])
+
+    def test_process_pool(self):
+        async def client(server):
+            return await _request(
+                server.port,
+                "POST",
+                "/label",
+                {
+                    "query": "SELECT a, b FROM c",
+                    "gold_query": "SELECT b, a FROM c",
+                    "label": 1,
+                },
+            )
+
+        status, record = self.run_with_server(client, num_workers=1)
+        self.assertEqual(status, 200)
+        self.assertEqual(record["labels"], [1, 1, 1, 1, 1])
+
+    def test_errors(self):
+        async def client(server):
+            return await asyncio.gather(
+                _request(server.port, "POST", "/label", {"query": "SELECT 1"}),
+                _request(server.port, "GET", "/label"),
+                _request(server.port, "GET", "/unknown"),
+                _request(server.port, "GET", "/health"),
+            )
+
+        responses = self.run_with_server(client)
+        self.assertEqual([status for status, _ in responses], [400, 405, 404, 200])
+        self.assertIn("gold_query", responses[0][1]["error"])
+        self.assertEqual(responses[3][1], {"status": "ok"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,8 @@ from typing import List
 
 enabled_module_dirs: List[str] = [
     "ast_processing",
+    "dataset",
+    "benchmarks",
 ]
 
 